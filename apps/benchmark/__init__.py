@@ -0,0 +1,2 @@
+#<!-- filepath: /root/IRS/apps/benchmark/__init__.py -->
+# Retrieval benchmark module for IRS Tax Analysis System
@@ -0,0 +1,406 @@
+#!/usr/bin/env python3
+"""
+Retrieval benchmark harness for the IRS Tax Analysis System.
+Sweeps index, facet filter, graph fusion and rerank settings over a labeled query set and
+reports recall@k, MRR, latency percentiles and index memory.
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import logging
+import itertools
+from dataclasses import dataclass, asdict
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple, Any
+
+import numpy as np
+
+# Add the parent directory to the Python path
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from core.facets import FacetIndex, facets_from_query
+from core.rag import DocumentProcessor
+
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger('benchmark')
+
+QUANTIZATIONS = ("none", "float16", "int8")
+
+@dataclass
+class LabeledQuery:
+    """A benchmark query with the chunk IDs that answer it"""
+    question: str
+    relevant_ids: List[str]
+
+def load_labels(path: str) -> List[LabeledQuery]:
+    """Load a JSONL file of {"question", "relevant_ids"} records"""
+    labels = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                labels.append(LabeledQuery(record["question"], list(record["relevant_ids"])))
+    return labels
+
+def save_labels(path: str, labels: List[LabeledQuery]) -> None:
+    """Write labels as JSONL so they can be reviewed and corrected by hand"""
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        for label in labels:
+            f.write(json.dumps(asdict(label)) + "\n")
+
+@dataclass
+class Corpus:
+    """All chunks of a collection with unit-normalised float32 embeddings"""
+    ids: List[str]
+    documents: List[str]
+    metadatas: List[Dict[str, Any]]
+    embeddings: np.ndarray
+
+    @classmethod
+    def from_collection(cls, collection, page_size: int = 1000) -> "Corpus":
+        """Read a ChromaDB collection page by page"""
+        ids, documents, metadatas, embeddings = [], [], [], []
+        offset = 0
+        while True:
+            page = collection.get(include=["documents", "metadatas", "embeddings"], limit=page_size, offset=offset)
+            if not page["ids"]:
+                break
+            ids.extend(page["ids"])
+            documents.extend(page["documents"])
+            metadatas.extend(page["metadatas"])
+            embeddings.extend(page["embeddings"])
+            offset += len(page["ids"])
+        return cls(ids, documents, metadatas, _normalize(np.asarray(embeddings, dtype=np.float32)))
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+class FlatIndex:
+    """Exact inner-product search over optionally quantised vectors.
+
+    ``int8`` uses symmetric per-dimension scalar quantisation; scores are
+    computed against the dequantised matrix, so the loss measured is the
+    loss from storing vectors at reduced precision.
+    """
+
+    def __init__(self, embeddings: np.ndarray, quantization: str = "none"):
+        if quantization not in QUANTIZATIONS:
+            raise ValueError(f"Unknown quantization {quantization!r}; choose one of {', '.join(QUANTIZATIONS)}")
+        self.quantization = quantization
+        if quantization == "float16":
+            self.stored = embeddings.astype(np.float16)
+            self.scales = None
+            self.matrix = self.stored.astype(np.float32)
+        elif quantization == "int8":
+            self.scales = np.maximum(np.abs(embeddings).max(axis=0), 1e-12) / 127.0
+            self.stored = np.round(embeddings / self.scales).astype(np.int8)
+            self.matrix = self.stored.astype(np.float32) * self.scales
+        else:
+            self.stored = embeddings
+            self.scales = None
+            self.matrix = embeddings
+
+    @property
+    def memory_bytes(self) -> int:
+        """Bytes needed to hold the stored vectors"""
+        return int(self.stored.nbytes + (self.scales.nbytes if self.scales is not None else 0))
+
+    def search(self, query: np.ndarray, n: int) -> List[Tuple[int, float]]:
+        """Top-n (row, cosine) pairs"""
+        scores = self.matrix @ query
+        n = min(n, len(scores))
+        top = np.argpartition(-scores, n - 1)[:n] if n < len(scores) else np.arange(len(scores))
+        top = top[np.argsort(-scores[top])]
+        return [(int(i), float(scores[i])) for i in top]
+
+class HNSWIndex:
+    """In-memory ChromaDB HNSW index with explicit ``M`` and ``ef`` settings"""
+
+    def __init__(self, corpus: Corpus, m: int = 16, ef: int = 100, ef_construction: int = 200):
+        import chromadb
+        self.m = m
+        self.ef = ef
+        self.client = chromadb.EphemeralClient()
+        self.name = f"benchmark_m{m}_ef{ef}_{os.getpid()}"
+        try:
+            self.client.delete_collection(self.name)
+        except Exception:
+            pass
+        self.collection = self.client.create_collection(self.name, metadata={
+            "hnsw:space": "cosine", "hnsw:M": m, "hnsw:search_ef": ef, "hnsw:construction_ef": ef_construction
+        })
+        self.rows = {doc_id: i for i, doc_id in enumerate(corpus.ids)}
+        self.dim = corpus.embeddings.shape[1]
+        for start in range(0, len(corpus), 1000):
+            self.collection.add(ids=corpus.ids[start:start + 1000],
+                                embeddings=corpus.embeddings[start:start + 1000].tolist())
+
+    @property
+    def memory_bytes(self) -> int:
+        """Estimated bytes: float32 vectors plus 2*M level-0 links per node"""
+        return len(self.rows) * (self.dim * 4 + 2 * self.m * 4)
+
+    def search(self, query: np.ndarray, n: int) -> List[Tuple[int, float]]:
+        raw = self.collection.query(query_embeddings=[query.tolist()], n_results=min(n, len(self.rows)),
+                                    include=["distances"])
+        return [(self.rows[doc_id], 1.0 - distance) for doc_id, distance in zip(raw["ids"][0], raw["distances"][0])]
+
+    def close(self) -> None:
+        self.client.delete_collection(self.name)
+
+@dataclass
+class BenchmarkConfig:
+    """One retrieval configuration"""
+    index: str = "hnsw"
+    m: int = 16
+    ef: int = 100
+    quantization: str = "none"
+    k: int = 5
+    facet_filter: bool = False
+    graph_weight: float = 0.0
+    rrf_k: int = 60
+    rerank_depth: int = 0
+
+    @property
+    def index_key(self) -> Tuple:
+        """Configs with the same key share a built index"""
+        return ("hnsw", self.m, self.ef) if self.index == "hnsw" else ("flat", self.quantization)
+
+    @property
+    def label(self) -> str:
+        index = f"hnsw(M={self.m},ef={self.ef})" if self.index == "hnsw" else f"flat({self.quantization})"
+        graph = f" graph={self.graph_weight:g}/rrf{self.rrf_k}" if self.graph_weight else ""
+        return (f"{index} k={self.k} facets={'on' if self.facet_filter else 'off'}{graph} "
+                f"rerank={self.rerank_depth}")
+
+def build_grid(k_values: List[int], m_values: List[int], ef_values: List[int], quantizations: List[str],
+               graph_weights: List[float], rerank_depths: List[int], facet_filters: Iterable[bool] = (False,),
+               rrf_k_values: Iterable[int] = (60,)) -> List[BenchmarkConfig]:
+    """Cross product of index settings (HNSW M x ef, flat quantisations) with k, the
+    HybridRetriever knobs (facet filtering, graph weight, RRF k) and rerank depth.
+
+    RRF k only matters with a graph weight, so graph-free configs are not repeated per RRF k.
+    """
+    indexes = [dict(index="hnsw", m=m, ef=ef) for m, ef in itertools.product(m_values, ef_values)]
+    indexes += [dict(index="flat", quantization=q) for q in quantizations]
+    rrf_k_values = list(rrf_k_values)
+    return [BenchmarkConfig(k=k, facet_filter=f, graph_weight=w, rrf_k=rrf_k, rerank_depth=depth, **index)
+            for index in indexes
+            for k, f, w, rrf_k, depth in itertools.product(k_values, facet_filters, graph_weights,
+                                                           rrf_k_values, rerank_depths)
+            if (depth == 0 or depth >= k) and (w or rrf_k == rrf_k_values[0])]
+
+def recall_at_k(retrieved: List[str], relevant: List[str]) -> float:
+    if not relevant:
+        return 0.0
+    return len(set(retrieved) & set(relevant)) / len(set(relevant))
+
+def reciprocal_rank(retrieved: List[str], relevant: List[str]) -> float:
+    relevant = set(relevant)
+    for rank, doc_id in enumerate(retrieved, 1):
+        if doc_id in relevant:
+            return 1.0 / rank
+    return 0.0
+
+def _percentile(values: List[float], q: float) -> float:
+    return float(np.percentile(values, q)) if values else 0.0
+
+class RetrievalBenchmark:
+    """Run retrieval configurations against a labeled query set.
+
+    Configurations exercise the knobs ``HybridRetriever`` exposes: facet
+    filters parsed from the question (relaxed, then scored exactly when few
+    chunks match, as ``VectorDatabaseManager.search`` does), and weighted
+    reciprocal rank fusion with the knowledge-graph ranking.
+    """
+
+    def __init__(self, corpus: Corpus, labels: List[LabeledQuery], query_embeddings: np.ndarray,
+                 reranker=None, graph_retriever=None, exact_search_threshold: int = 2000):
+        """Initialize the benchmark.
+
+        Args:
+            corpus: Chunks and embeddings to index
+            labels: Labeled queries
+            query_embeddings: One embedding per labeled query (same model as the corpus)
+            reranker: Optional CrossEncoderReranker for configs with a rerank depth
+            graph_retriever: Optional GraphRetriever for configs with a graph weight
+            exact_search_threshold: Largest filtered candidate set scored exactly
+        """
+        self.corpus = corpus
+        self.labels = labels
+        self.queries = _normalize(query_embeddings)
+        self.reranker = reranker
+        self.graph_retriever = graph_retriever
+        self.exact_search_threshold = exact_search_threshold
+        self.rows = {doc_id: i for i, doc_id in enumerate(corpus.ids)}
+        self._facets: Optional[FacetIndex] = None
+
+    @property
+    def facets(self) -> FacetIndex:
+        if self._facets is None:
+            self._facets = FacetIndex()
+            for chunk_id, metadata in zip(self.corpus.ids, self.corpus.metadatas):
+                self._facets.add(chunk_id, metadata or {})
+        return self._facets
+
+    def build_index(self, config: BenchmarkConfig):
+        if config.index == "hnsw":
+            return HNSWIndex(self.corpus, m=config.m, ef=config.ef)
+        return FlatIndex(self.corpus.embeddings, config.quantization)
+
+    def search(self, index, query: np.ndarray, depth: int, allowed: Optional[Set[str]]) -> List[Tuple[int, float]]:
+        """Vector search restricted to ``allowed`` chunk IDs (None = whole corpus)"""
+        if allowed is None:
+            return index.search(query, depth)
+        if len(allowed) <= self.exact_search_threshold:
+            rows = np.array(sorted(self.rows[chunk_id] for chunk_id in allowed), dtype=np.int64)
+            if not len(rows):
+                return []
+            scores = self.corpus.embeddings[rows] @ query
+            order = np.argsort(-scores)[:depth]
+            return [(int(rows[i]), float(scores[i])) for i in order]
+        # Stand-in for a where-filtered ANN query: widen the search by the filter's selectivity
+        n = min(len(self.corpus), depth * math.ceil(len(self.corpus) / len(allowed)))
+        return [(row, score) for row, score in index.search(query, n) if self.corpus.ids[row] in allowed][:depth]
+
+    def retrieve(self, index, config: BenchmarkConfig, question: str, query: np.ndarray) -> List[str]:
+        """Run one query through a configuration, returning chunk IDs in rank order"""
+        depth = max(config.k, config.rerank_depth)
+        allowed = None
+        if config.facet_filter:
+            filters = facets_from_query(question)
+            if filters:
+                allowed = self.facets.match(self.facets.relax(filters, depth))
+        hits = self.search(index, query, depth, allowed)
+
+        if config.graph_weight and self.graph_retriever is not None:
+            from core.graph_retrieval import reciprocal_rank_fusion
+            ranked = self.graph_retriever.rank_chunks(question, k=depth)
+            # Graph hits outside the filters are dropped, as in HybridRetriever
+            graph_ranking = [chunk_id for chunk_id, _ in ranked
+                             if chunk_id in self.rows and (allowed is None or chunk_id in allowed)]
+            if graph_ranking:
+                fused = reciprocal_rank_fusion([[self.corpus.ids[row] for row, _ in hits], graph_ranking],
+                                               weights=[1.0 - config.graph_weight, config.graph_weight],
+                                               k=config.rrf_k)
+                hits = [(self.rows[chunk_id], score) for chunk_id, score in fused[:depth]]
+
+        if config.rerank_depth and self.reranker is not None:
+            candidates = [{"id": self.corpus.ids[row], "text": self.corpus.documents[row], "score": score}
+                          for row, score in hits[:config.rerank_depth]]
+            self.reranker.candidate_depth = config.rerank_depth
+            return [c["id"] for c in self.reranker.rerank(question, candidates, top_k=config.k)]
+
+        return [self.corpus.ids[row] for row, _ in hits[:config.k]]
+
+    def evaluate(self, index, config: BenchmarkConfig) -> Dict[str, Any]:
+        """Measure quality and per-query latency of one configuration"""
+        if self.reranker is not None:
+            self.reranker.clear_cache()  # Cached pair scores would understate rerank latency
+        recalls, ranks, latencies = [], [], []
+        for label, query in zip(self.labels, self.queries):
+            start = time.perf_counter()
+            retrieved = self.retrieve(index, config, label.question, query)
+            latencies.append((time.perf_counter() - start) * 1000)
+            recalls.append(recall_at_k(retrieved, label.relevant_ids))
+            ranks.append(reciprocal_rank(retrieved, label.relevant_ids))
+
+        return dict(
+            asdict(config),
+            config=config.label,
+            recall=float(np.mean(recalls)) if recalls else 0.0,
+            mrr=float(np.mean(ranks)) if ranks else 0.0,
+            p50_ms=_percentile(latencies, 50),
+            p99_ms=_percentile(latencies, 99),
+            index_mb=index.memory_bytes / (1024 ** 2)
+        )
+
+    def sweep(self, configs: List[BenchmarkConfig]) -> List[Dict[str, Any]]:
+        """Evaluate configurations, building each distinct index once"""
+        results = []
+        for key, group in itertools.groupby(sorted(configs, key=lambda c: c.index_key), key=lambda c: c.index_key):
+            group = list(group)
+            if any(c.rerank_depth for c in group) and self.reranker is None:
+                logger.warning("No reranker configured; rerank depths are ignored")
+            if any(c.graph_weight for c in group) and self.graph_retriever is None:
+                logger.warning("No graph retriever configured; graph weights are ignored")
+            start = time.time()
+            index = self.build_index(group[0])
+            logger.info(f"Built {group[0].label.split(' ')[0]} over {len(self.corpus)} chunks in {time.time() - start:.1f}s")
+            try:
+                for config in group:
+                    results.append(self.evaluate(index, config))
+            finally:
+                if hasattr(index, "close"):
+                    index.close()
+        return results
+
+def recommend(results: List[Dict[str, Any]], tolerance: float = 0.02) -> Optional[Dict[str, Any]]:
+    """Cheapest configuration whose recall is within ``tolerance`` of the best.
+
+    Cost is p50 latency, then index memory, then k (fewer chunks in the prompt).
+    """
+    if not results:
+        return None
+    best_recall = max(r["recall"] for r in results)
+    eligible = [r for r in results if r["recall"] >= best_recall - tolerance]
+    return min(eligible, key=lambda r: (r["p50_ms"], r["index_mb"], r["k"]))
+
+def format_report(results: List[Dict[str, Any]], recommended: Optional[Dict[str, Any]] = None) -> str:
+    """Plain-text results table, best recall first"""
+    header = f"{'configuration':<60} {'recall@k':>9} {'MRR':>6} {'p50 ms':>8} {'p99 ms':>8} {'index MB':>9}"
+    lines = [header, "-" * len(header)]
+    for r in sorted(results, key=lambda r: (-r["recall"], r["p50_ms"])):
+        marker = " *" if recommended is not None and r["config"] == recommended["config"] else ""
+        lines.append(f"{r['config']:<60} {r['recall']:>9.3f} {r['mrr']:>6.3f} {r['p50_ms']:>8.2f} "
+                     f"{r['p99_ms']:>8.2f} {r['index_mb']:>9.2f}{marker}")
+    if recommended is not None:
+        lines.append("")
+        lines.append(f"Recommended (* cheapest within tolerance of best recall): {recommended['config']}")
+    return "\n".join(lines)
+
+def derive_labels(docs_dir: Optional[str], corpus: Corpus, embed, reranker=None,
+                  depth: int = 5, pool: int = 50) -> Tuple[List[LabeledQuery], np.ndarray]:
+    """Build a labeled set from the scenarios in the docs directory.
+
+    Each question (with its scenario, as the pipeline queries it) is labeled
+    with the top ``depth`` chunks of an exact float32 search, reranked by the
+    cross-encoder over the top ``pool`` when one is given. This measures how
+    much each cheaper configuration loses against the most expensive one;
+    hand-checked labels (save them with ``save_labels`` and edit) measure
+    answer quality more faithfully.
+
+    Returns:
+        Labels and their query embeddings
+    """
+    processor = DocumentProcessor(docs_dir)
+    questions = []
+    for doc in processor.load_text_files():
+        parsed = processor.parse_scenario_and_questions(doc)
+        questions.extend(f"{parsed['scenario']}\n{question}" for question in parsed["questions"])
+    if not questions:
+        return [], np.zeros((0, corpus.embeddings.shape[1]), dtype=np.float32)
+
+    query_embeddings = _normalize(embed(questions))
+    exact = FlatIndex(corpus.embeddings)
+    labels = []
+    for question, query in zip(questions, query_embeddings):
+        hits = exact.search(query, pool if reranker is not None else depth)
+        if reranker is not None:
+            candidates = [{"id": corpus.ids[row], "text": corpus.documents[row], "score": score} for row, score in hits]
+            reranker.candidate_depth = pool
+            relevant = [c["id"] for c in reranker.rerank(question, candidates, top_k=depth)]
+        else:
+            relevant = [corpus.ids[row] for row, _ in hits]
+        labels.append(LabeledQuery(question, relevant))
+    logger.info(f"Derived {len(labels)} labeled queries from {docs_dir or 'the docs directory'}")
+    return labels, query_embeddings
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Retrieval benchmark application for the IRS Tax Analysis System.
+Sweeps k, HNSW M/ef, quantization, the HybridRetriever facet filter and
+graph fusion weights, and rerank depth.
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import logging
+from pathlib import Path
+
+# Add the parent directory to the Python path
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from apps.benchmark.harness import (Corpus, RetrievalBenchmark, build_grid, derive_labels,
+                                    format_report, load_labels, recommend, save_labels)
+from core.rag import ROOT_DIR, VectorDatabaseManager
+
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger('benchmark')
+
+BENCHMARK_DIR = ROOT_DIR / "data" / "benchmarks"
+
+def main():
+    """Main entry point for the retrieval benchmark."""
+    parser = argparse.ArgumentParser(description="Benchmark retrieval quality and latency")
+    parser.add_argument('--labels', '-l', type=str, help='JSONL file of {"question", "relevant_ids"} records')
+    parser.add_argument('--docs', type=str, help='Derive labels from the scenarios in this directory (default: data/docs)')
+    parser.add_argument('--save-labels', type=str, help='Write the derived labels to this JSONL file for review')
+    parser.add_argument('--db-dir', type=str, help='ChromaDB directory (default: data/chroma_db)')
+    parser.add_argument('--collection', type=str, default="tax_documents", help='Collection to benchmark')
+    parser.add_argument('--k', type=int, nargs='+', default=[3, 5, 8], help='Result counts to try')
+    parser.add_argument('--M', type=int, nargs='+', default=[16, 32], help='HNSW M values to try')
+    parser.add_argument('--ef', type=int, nargs='+', default=[32, 100, 200], help='HNSW search ef values to try')
+    parser.add_argument('--quantization', nargs='+', default=["none", "float16", "int8"],
+                        help='Flat index vector precisions to try')
+    parser.add_argument('--facet-filter', choices=["off", "on"], nargs='+', default=["off", "on"],
+                        help='Filter by the tax year and forms named in the question, as batch retrieval does')
+    parser.add_argument('--graph-weight', type=float, nargs='+', default=[0.0, 0.3],
+                        help='Knowledge-graph weight in reciprocal rank fusion (HybridRetriever graph_weight; 0 = vector only)')
+    parser.add_argument('--rrf-k', type=int, nargs='+', default=[60],
+                        help='Reciprocal rank fusion k values to try with a graph weight')
+    parser.add_argument('--rerank-depth', type=int, nargs='+', default=[0, 20],
+                        help='Cross-encoder rerank depths to try (0 = no rerank)')
+    parser.add_argument('--no-rerank', action='store_true', help='Do not load the cross-encoder')
+    parser.add_argument('--tolerance', type=float, default=0.02,
+                        help='Recall loss accepted when recommending the cheapest configuration')
+    parser.add_argument('--output', '-o', type=str, help='Output JSON file (default: data/benchmarks/retrieval_<time>.json)')
+
+    args = parser.parse_args()
+
+    vector_db = VectorDatabaseManager(db_dir=args.db_dir, collection_name=args.collection)
+    corpus = Corpus.from_collection(vector_db.get_collection())
+    if not len(corpus):
+        logger.error(f"Collection {args.collection} is empty; add documents with core/rag.py --add first")
+        sys.exit(1)
+    logger.info(f"Loaded {len(corpus)} chunks from {args.collection}")
+
+    reranker = None
+    if not args.no_rerank and any(args.rerank_depth):
+        from core.rerank import CrossEncoderReranker
+        reranker = CrossEncoderReranker()
+
+    graph_retriever = None
+    if any(args.graph_weight):
+        # Same knowledge graph and mention index as HybridRetriever(kg_enabled=True)
+        from core.graph_retrieval import GraphRetriever, MentionIndex
+        from core.knowledge_graph import TaxKnowledgeGraph
+        mentions = MentionIndex(os.path.join(vector_db.db_dir, f"{args.collection}_mentions.json"))
+        graph_retriever = GraphRetriever(TaxKnowledgeGraph(), mentions)
+        if not mentions.exists():
+            graph_retriever.index_chunks(zip(corpus.ids, corpus.documents))
+
+    if args.labels:
+        labels = load_labels(args.labels)
+        query_embeddings = vector_db.embed([label.question for label in labels])
+    else:
+        labels, query_embeddings = derive_labels(args.docs, corpus, vector_db.embed, reranker=reranker)
+        if args.save_labels:
+            save_labels(args.save_labels, labels)
+            logger.info(f"Saved derived labels to {args.save_labels}")
+    if not labels:
+        logger.error("No labeled queries to benchmark")
+        sys.exit(1)
+
+    grid = build_grid(args.k, args.M, args.ef, args.quantization, args.graph_weight, args.rerank_depth,
+                      facet_filters=[value == "on" for value in args.facet_filter], rrf_k_values=args.rrf_k)
+    logger.info(f"Running {len(grid)} configurations over {len(labels)} queries")
+    benchmark = RetrievalBenchmark(corpus, labels, query_embeddings, reranker=reranker,
+                                   graph_retriever=graph_retriever)
+    results = benchmark.sweep(grid)
+    best = recommend(results, args.tolerance)
+
+    print(format_report(results, best))
+
+    output = Path(args.output) if args.output else BENCHMARK_DIR / f"retrieval_{int(time.time())}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump({"chunks": len(corpus), "queries": len(labels), "results": results, "recommended": best}, f, indent=2)
+    logger.info(f"Saved benchmark results to {output}")
+
+if __name__ == "__main__":
+    main()
@@ -13,7 +13,10 @@ from pathlib import Path
 # Add the parent directory to the Python path
 sys.path.append(str(Path(__file__).parent.parent.parent))
 
-from core.rag import process_documents_sequentially, DocumentProcessor
+from core.rag import process_documents_pipelined, process_documents_sequentially, DocumentProcessor
+from core.journal import RunJournal
+from apps.bulk.workqueue import QueueWorker, WorkQueue
+from utils.system import get_optimal_worker_count
 
 logging.basicConfig(level=logging.INFO,
                     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -28,6 +31,29 @@ def main():
     parser.add_argument('--quiet', '-q', action='store_true', help='Reduce verbosity')
     parser.add_argument('--optimize', '-O', action='store_true', help='Apply hardware optimization')
     parser.add_argument('--feedback', '-f', action='store_true', default=True, help='Enable feedback generation')
+    parser.add_argument('--sequential', action='store_true',
+                        help='Process one document at a time instead of pipelining stages across documents')
+    parser.add_argument('--queue-size', type=int, default=2, help='Documents buffered between pipeline stages')
+    parser.add_argument('--parallel', '-p', type=int, metavar='N',
+                        help='Parsing workers: processes for chunking and PDF extraction with --ingest, '
+                             'threads for reading scenario files (default: optimal worker count for this machine)')
+    parser.add_argument('--ingest', type=str, metavar='PATH',
+                        help='Chunk a file or directory (text and PDF) into the vector database before processing')
+    parser.add_argument('--answer-workers', type=int, default=1, metavar='N',
+                        help='Documents answered, and reviewed, at once; each document already sends its '
+                             'questions concurrently up to the model\'s parallel slots, so raise this only '
+                             'if OLLAMA_NUM_PARALLEL leaves slots idle (default: 1)')
+    parser.add_argument('--resume', nargs='?', const='latest', metavar='RUN_ID',
+                        help='Resume a run (default: the latest unfinished one), skipping completed work')
+    parser.add_argument('--journal', type=str, help='Run journal database (default: data/runs/journal.db)')
+    parser.add_argument('--enqueue', action='store_true',
+                        help='Coordinator mode: add (document, model) tasks to the shared work queue')
+    parser.add_argument('--worker', action='store_true',
+                        help='Worker mode: pull tasks from the shared work queue until it is drained')
+    parser.add_argument('--queue', type=str,
+                        help='Work queue database on a filesystem shared by all nodes (default: data/runs/queue.db)')
+    parser.add_argument('--lease', type=float, default=300.0,
+                        help='Seconds a task stays leased to a worker without a heartbeat')
     
     args = parser.parse_args()
     
@@ -35,10 +61,34 @@ def main():
     if args.quiet:
         logging.getLogger().setLevel(logging.WARNING)
     
-    # Load documents
+    workers = args.parallel if args.parallel else get_optimal_worker_count()
+    if workers < 1:
+        parser.error("--parallel must be at least 1")
+    if args.answer_workers < 1:
+        parser.error("--answer-workers must be at least 1")
+    logger.info(f"Using {workers} parsing workers, {args.answer_workers} documents answered at once")
+    
+    # Chunking and PDF extraction are CPU-bound, so they run in a pool of worker processes
+    if args.ingest:
+        from core.shards import open_vector_db
+        vector_db = open_vector_db()
+        vector_db.initialize()
+        stored = vector_db.add_chunks(DocumentProcessor().iter_chunks(path=args.ingest, max_workers=workers))
+        logger.info(f"Ingested {stored} chunks from {args.ingest}")
+    
+    # A worker-only node needs no local document scan: tasks name the shared files
+    if args.worker and not args.enqueue:
+        queue = WorkQueue(args.queue, lease_seconds=args.lease)
+        try:
+            QueueWorker(queue).run()
+        finally:
+            queue.close()
+        return
+    
+    # Load documents (file reads are I/O-bound, so they run in worker threads)
     docs_dir = args.input if args.input else None
     processor = DocumentProcessor(docs_dir)
-    documents = processor.load_text_files()
+    documents = processor.load_text_files(max_workers=workers)
     
     if not documents:
         logger.error("No documents found to process")
@@ -55,10 +105,38 @@ def main():
         models = ["llama3:8b", "phi4", "mixtral:8x7b"]
         logger.info(f"Processing with default models: {', '.join(models)}")
     
-    # Process documents sequentially with the selected models
-    process_documents_sequentially(documents, models)
+    if args.enqueue:
+        queue = WorkQueue(args.queue, lease_seconds=args.lease)
+        try:
+            added = queue.enqueue_all([os.path.abspath(doc.metadata["source"]) for doc in documents], models)
+            logger.info(f"Enqueued {added} tasks in {queue.path}: {queue.counts()}")
+            if args.worker:
+                QueueWorker(queue).run()
+        finally:
+            queue.close()
+        return
+    
+    # Record completed units so an interrupted run can be resumed
+    journal = RunJournal(args.journal, run_id=None if args.resume in (None, 'latest') else args.resume,
+                         resume=args.resume is not None, models=models)
+    
+    # Overlap answering, feedback and file writes across documents unless asked not to
+    # Answer and feedback concurrency is bounded by the model server's slots, not the CPU count
+    try:
+        if args.sequential:
+            process_documents_sequentially(documents, models, journal=journal)
+        else:
+            metrics = process_documents_pipelined(documents, models, queue_size=args.queue_size,
+                                                  answer_workers=args.answer_workers, journal=journal)
+            for model, model_metrics in metrics.items():
+                answer_stage = model_metrics["stages"]["answer"]
+                logger.info(f"{model}: {model_metrics['processed']} documents, "
+                            f"{answer_stage['throughput_per_min']:.2f} answered/min with {args.answer_workers} documents in flight "
+                            f"({answer_stage['throughput_per_worker_per_min']:.2f}/min per answer worker)")
+    finally:
+        journal.close()
     
-    logger.info("Bulk processing completed successfully")
+    logger.info(f"Bulk processing completed (run {journal.run_id})")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
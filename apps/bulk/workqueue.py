@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+"""
+Shared work queue for multi-node bulk processing in the IRS Tax Analysis System.
+A coordinator enqueues (document, model, stage) tasks into a SQLite file on a
+shared filesystem; any number of workers lease tasks, keep their leases alive
+with heartbeats, and expired leases are handed to other workers.
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import sqlite3
+import logging
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+# Add the parent directory to the Python path
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from core.rag import (ROOT_DIR, HybridRetriever, _load_text_document, generate_answers_with_errors,
+                      generate_feedback_with_errors, prefetch_contexts, save_answers, save_feedback)
+
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger('workqueue')
+
+QUEUE_PATH = ROOT_DIR / "data" / "runs" / "queue.db"
+STAGES = ("answer", "feedback")  # Each completed stage enqueues the next one
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    document TEXT NOT NULL,
+    model TEXT NOT NULL,
+    stage TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    worker TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    result TEXT,
+    error TEXT,
+    updated_at REAL NOT NULL,
+    UNIQUE (document, model, stage)
+);
+CREATE INDEX IF NOT EXISTS tasks_status ON tasks (status, id);
+"""
+
+@dataclass
+class Task:
+    """A leased unit of work"""
+    id: int
+    document: str
+    model: str
+    stage: str
+    attempts: int
+
+class WorkQueue:
+    """Task queue in a SQLite file shared by coordinator and workers.
+
+    Claims run in ``BEGIN IMMEDIATE`` transactions, so two workers never
+    lease the same task. The database uses a rollback journal rather than
+    WAL because WAL needs shared memory, which network filesystems do not
+    provide across machines.
+    """
+
+    def __init__(self, path: Optional[str] = None, lease_seconds: float = 300.0, max_attempts: int = 3):
+        """Open (or create) the queue.
+
+        Args:
+            path: SQLite file on a filesystem every node can reach (defaults to data/runs/queue.db)
+            lease_seconds: How long a claimed task stays reserved without a heartbeat
+            max_attempts: Claims per task before it is marked failed
+        """
+        self.path = Path(path) if path else QUEUE_PATH
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), timeout=60, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=DELETE")
+        self._conn.executescript(SCHEMA)
+
+    def enqueue(self, document: str, model: str, stage: str = STAGES[0]) -> bool:
+        """Add a task; returns False if it is already queued or done"""
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT OR IGNORE INTO tasks (document, model, stage, updated_at) VALUES (?, ?, ?, ?)",
+                (document, model, stage, time.time()))
+            return cursor.rowcount > 0
+
+    def enqueue_all(self, documents: List[str], models: List[str]) -> int:
+        """Add the first stage of every (document, model) pair in one transaction"""
+        now = time.time()
+        rows = [(document, model, STAGES[0], now) for model in models for document in documents]
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                before = self._conn.total_changes
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO tasks (document, model, stage, updated_at) VALUES (?, ?, ?, ?)", rows)
+                added = self._conn.total_changes - before
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return added
+
+    def claim(self, worker: str) -> Optional[Task]:
+        """Lease the oldest pending task, first reclaiming leases that expired"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Workers that stopped heartbeating give their tasks back (or fail them for good)
+                self._conn.execute(
+                    "UPDATE tasks SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+                    "worker = NULL, error = 'lease expired', updated_at = ? "
+                    "WHERE status = 'leased' AND lease_expires < ?", (self.max_attempts, now, now))
+                row = self._conn.execute(
+                    "SELECT id, document, model, stage, attempts FROM tasks WHERE status = 'pending' ORDER BY id LIMIT 1"
+                ).fetchone()
+                if row is not None:
+                    self._conn.execute(
+                        "UPDATE tasks SET status = 'leased', worker = ?, lease_expires = ?, attempts = attempts + 1, "
+                        "updated_at = ? WHERE id = ?", (worker, now + self.lease_seconds, now, row[0]))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        if row is None:
+            return None
+        return Task(row[0], row[1], row[2], row[3], row[4] + 1)
+
+    def heartbeat(self, task: Task, worker: str) -> bool:
+        """Extend a lease; returns False if the task was reclaimed by someone else"""
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE tasks SET lease_expires = ?, updated_at = ? WHERE id = ? AND worker = ? AND status = 'leased'",
+                (now + self.lease_seconds, now, task.id, worker))
+            return cursor.rowcount > 0
+
+    def complete(self, task: Task, worker: str, result: Any = None) -> None:
+        """Mark a task done, store its result and enqueue the next stage"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                cursor = self._conn.execute(
+                    "UPDATE tasks SET status = 'done', result = ?, error = NULL, lease_expires = NULL, updated_at = ? "
+                    "WHERE id = ? AND worker = ? AND status = 'leased'", (json.dumps(result), time.time(), task.id, worker))
+                index = STAGES.index(task.stage)
+                # A task reclaimed after its lease expired is finished by its new owner instead
+                if cursor.rowcount and index + 1 < len(STAGES):
+                    self._conn.execute(
+                        "INSERT OR IGNORE INTO tasks (document, model, stage, updated_at) VALUES (?, ?, ?, ?)",
+                        (task.document, task.model, STAGES[index + 1], time.time()))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def fail(self, task: Task, worker: str, error: str) -> None:
+        """Release a failed task for retry, or fail it for good after max_attempts"""
+        status = "failed" if task.attempts >= self.max_attempts else "pending"
+        with self._lock:
+            self._conn.execute(
+                "UPDATE tasks SET status = ?, error = ?, worker = NULL, lease_expires = NULL, updated_at = ? "
+                "WHERE id = ? AND worker = ? AND status = 'leased'", (status, error, time.time(), task.id, worker))
+
+    def result(self, document: str, model: str, stage: str) -> Any:
+        """Stored result of a completed task"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT result FROM tasks WHERE document = ? AND model = ? AND stage = ? AND status = 'done'",
+                (document, model, stage)).fetchone()
+        return json.loads(row[0]) if row and row[0] is not None else None
+
+    def counts(self) -> Dict[str, int]:
+        """Number of tasks per status"""
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM tasks GROUP BY status").fetchall()
+        return dict(rows)
+
+    def drained(self) -> bool:
+        """Whether no task is pending or leased"""
+        counts = self.counts()
+        return not counts.get("pending") and not counts.get("leased")
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+class QueueWorker:
+    """Pull tasks from a WorkQueue and run them until the queue drains."""
+
+    def __init__(self, queue: WorkQueue, worker_id: Optional[str] = None, poll_interval: float = 5.0,
+                 answer_workers: Optional[int] = None):
+        """Initialize the worker.
+
+        Args:
+            queue: Shared work queue
+            worker_id: Name recorded on leases (defaults to host:pid)
+            poll_interval: Seconds to wait when no task is pending but others are still leased
+            answer_workers: Concurrent questions per document (defaults to the model's parallelism)
+        """
+        self.queue = queue
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        self.poll_interval = poll_interval
+        self.answer_workers = answer_workers
+        self.stats = {"done": 0, "failed": 0, "busy_seconds": 0.0}
+        self._retriever = None
+        self._retriever_loaded = False
+
+    def _contexts(self, doc) -> Optional[List[List[Dict[str, Any]]]]:
+        """Retrieve context for a document, opening the vector database on first use"""
+        if not self._retriever_loaded:
+            self._retriever_loaded = True
+            try:
+                from core.shards import open_vector_db
+                vector_db = open_vector_db()
+                vector_db.initialize()
+                self._retriever = HybridRetriever(vector_db)
+            except Exception as e:
+                logger.warning(f"Vector database unavailable, answering without retrieved context: {e}")
+        if self._retriever is None:
+            return None
+        return prefetch_contexts([doc], self._retriever).get(doc.metadata.get("source", doc.id))
+
+    def execute(self, task: Task) -> Any:
+        """Run one task and return its result
+
+        Model failures are reported alongside the answers rather than raised;
+        they are raised here so the task is retried instead of completed.
+        """
+        doc = _load_text_document(task.document)
+        if doc is None:
+            raise IOError(f"Cannot read {task.document}")
+        if task.stage == "answer":
+            answers, errors = generate_answers_with_errors(doc, task.model, self._contexts(doc),
+                                                           max_workers=self.answer_workers)
+            failed = sum(error is not None for error in errors)
+            if failed:
+                raise RuntimeError(f"{failed} of {len(answers)} answers failed for {task.document}")
+            if save_answers(doc, answers, task.model) is None:
+                raise IOError(f"Could not save answers for {task.document}")
+            return answers
+        if task.stage == "feedback":
+            answers = self.queue.result(task.document, task.model, "answer")
+            if answers is None:
+                raise RuntimeError(f"No answers recorded for {task.document} with {task.model}")
+            feedback, error = generate_feedback_with_errors(doc, answers, task.model)
+            if error is not None:
+                raise RuntimeError(f"Feedback failed for {task.document}: {error}")
+            if save_feedback(doc, feedback, task.model) is None:
+                raise IOError(f"Could not save feedback for {task.document}")
+            return None
+        raise ValueError(f"Unknown stage: {task.stage}")
+
+    def _keep_alive(self, task: Task, stop: threading.Event) -> None:
+        """Heartbeat at a third of the lease so a slow model call keeps its task"""
+        while not stop.wait(self.queue.lease_seconds / 3):
+            if not self.queue.heartbeat(task, self.worker_id):
+                logger.warning(f"Lost lease on task {task.id}; another worker may redo it")
+                return
+
+    def run(self, exit_when_drained: bool = True) -> Dict[str, Any]:
+        """Process tasks until the queue is drained (or forever)
+
+        Returns:
+            Task counts, busy time and throughput of this worker
+        """
+        logger.info(f"Worker {self.worker_id} started on {self.queue.path}")
+        start = time.time()
+        while True:
+            task = self.queue.claim(self.worker_id)
+            if task is None:
+                if exit_when_drained and self.queue.drained():
+                    break
+                time.sleep(self.poll_interval)
+                continue
+
+            logger.info(f"Task {task.id}: {task.stage} {os.path.basename(task.document)} with {task.model} "
+                        f"(attempt {task.attempts})")
+            stop = threading.Event()
+            heartbeat = threading.Thread(target=self._keep_alive, args=(task, stop), daemon=True)
+            heartbeat.start()
+            task_start = time.time()
+            try:
+                result = self.execute(task)
+                self.queue.complete(task, self.worker_id, result)
+                self.stats["done"] += 1
+            except Exception as e:
+                logger.error(f"Task {task.id} failed: {e}")
+                self.queue.fail(task, self.worker_id, str(e))
+                self.stats["failed"] += 1
+            finally:
+                stop.set()
+                heartbeat.join()
+                self.stats["busy_seconds"] += time.time() - task_start
+
+        elapsed = time.time() - start
+        self.stats["tasks_per_min"] = round(60 * self.stats["done"] / elapsed, 2) if elapsed else 0.0
+        logger.info(f"Worker {self.worker_id} finished: {self.stats}")
+        return self.stats
@@ -19,6 +19,7 @@ import streamlit as st
 from core.models import ModelManager
 from core.rag import DocumentProcessor, VectorDatabaseManager, HybridRetriever, Document
 from core.analysis import TaxAnalyzer, FeedbackAnalyzer
+from core.shards import open_vector_db
 from utils.memory import MemoryOptimizer
 from utils.system import clean_memory, optimize_gpu_settings
 
@@ -39,7 +40,7 @@ def init_session_state():
         st.session_state.available_models = st.session_state.model_manager.get_available_models()
     
     if 'vector_db' not in st.session_state:
-        st.session_state.vector_db = VectorDatabaseManager()
+        st.session_state.vector_db = open_vector_db()
         st.session_state.vector_db.initialize()
     
     if 'retriever' not in st.session_state:
@@ -25,5 +25,6 @@ try:
     from .analysis import TaxAnalyzer, FeedbackAnalyzer
     from .models import ModelManager
     from .knowledge_graph import TaxKnowledgeGraph, TaxEntity
+    from .rerank import CrossEncoderReranker
 except ImportError as e:
     logging.warning(f"Could not import core components: {e}")
\ No newline at end of file
@@ -12,6 +12,9 @@ from dataclasses import dataclass
 import unittest
 from pathlib import Path
 
+from core.context import CONTEXT_ENTRY_FORMAT, ContextAssembler, get_context_window
+from core.facets import facets_from_query
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -113,10 +116,24 @@ class ScenarioAnalysis:
 class TaxAnalyzer:
     """Class to perform tax analysis using LLMs"""
     
-    def __init__(self, model_manager, retriever):
-        """Initialize with model manager and retriever"""
+    def __init__(self, model_manager, retriever, context_windows: Optional[Dict[str, int]] = None,
+                 reserve_tokens: int = 1024, filter_facets: Tuple[str, ...] = ("tax_year", "forms")):
+        """Initialize with model manager and retriever
+        
+        Args:
+            model_manager: Model manager used for generation
+            retriever: Retriever providing context passages
+            context_windows: Optional per-model context window overrides (in tokens)
+            reserve_tokens: Tokens of each model's window kept free for the answer
+            filter_facets: Facets inferred from the scenario to pre-filter retrieval
+                (empty to search all documents)
+        """
         self.model_manager = model_manager
         self.retriever = retriever
+        self.context_windows = context_windows or {}
+        self.reserve_tokens = reserve_tokens
+        self.filter_facets = filter_facets
+        self._assemblers: Dict[str, ContextAssembler] = {}
     
     def analyze_scenario(self, scenario_data: Dict[str, Any], model_name: str, output_dir: str = "./data/docs") -> ScenarioAnalysis:
         """Analyze a full scenario"""
@@ -126,10 +143,13 @@ class TaxAnalyzer:
         questions = scenario_data["questions"]
         results = []
         
+        # Fetch context for every question in one batched retrieval
+        contexts = self._get_context_for_questions(scenario, questions)
+        
         # Process each question
-        for question in questions:
+        for question, context in zip(questions, contexts):
             logger.info(f"Processing question: {question[:50]}...")
-            result = self.analyze_question(scenario, question, model_name)
+            result = self.analyze_question(scenario, question, model_name, context=context)
             results.append(result)
             
             # Progressive saving - save after each question
@@ -159,18 +179,22 @@ class TaxAnalyzer:
         
         return analysis
     
-    def analyze_question(self, scenario: str, question: str, model_name: str) -> AnalysisResult:
-        """Analyze a single question"""
+    def analyze_question(self, scenario: str, question: str, model_name: str,
+                         context: Optional[List[Dict[str, Any]]] = None) -> AnalysisResult:
+        """Analyze a single question, optionally with prefetched context"""
         start_time = time.time()
         
         # Retrieve relevant information
-        context = self._get_context_for_question(scenario, question)
+        if context is None:
+            context = self._get_context_for_question(scenario, question)
         
-        # Prepare prompt
+        # Prepare prompt within the model's context budget
+        assembler = self._get_assembler(model_name)
+        context = self._fit_context(scenario, question, context, assembler)
         prompt = self._create_prompt(scenario, question, context)
         
-        # Get answer from model
-        response = self.model_manager.generate(model_name, prompt)
+        # Get answer from model, sized so Ollama does not truncate the prompt
+        response = self.model_manager.generate(model_name, prompt, options={"num_ctx": assembler.context_window})
         
         # Parse response
         answer = self._parse_response(response)
@@ -195,11 +219,39 @@ class TaxAnalyzer:
         # Combine scenario and question for retrieval
         full_query = f"{scenario}\n{question}"
         
-        # Retrieve relevant passages
-        retrieval_results = self.retriever.retrieve(full_query, n_results=5)
+        # Retrieve relevant passages, restricted to the tax year and forms the scenario names
+        retrieval_results = self.retriever.retrieve(full_query, n_results=5, filters=self._get_filters(full_query))
         
         return retrieval_results
     
+    def _get_context_for_questions(self, scenario: str, questions: List[str]) -> List[List[Dict[str, Any]]]:
+        """Retrieve context for all questions of a scenario at once"""
+        if not hasattr(self.retriever, "retrieve_many"):
+            return [self._get_context_for_question(scenario, question) for question in questions]
+        
+        queries = [f"{scenario}\n{question}" for question in questions]
+        return self.retriever.retrieve_many(queries, 5, filters=[self._get_filters(query) for query in queries])
+    
+    def _get_filters(self, query: str) -> Dict[str, Any]:
+        """Infer retrieval facet filters from a scenario and question"""
+        return facets_from_query(query, self.filter_facets) if self.filter_facets else {}
+    
+    def _get_assembler(self, model_name: str) -> ContextAssembler:
+        """Get the (cached) context assembler for a model"""
+        if model_name not in self._assemblers:
+            self._assemblers[model_name] = ContextAssembler(
+                model_name,
+                context_window=get_context_window(model_name, self.context_windows),
+                reserve_tokens=self.reserve_tokens
+            )
+        return self._assemblers[model_name]
+    
+    def _fit_context(self, scenario: str, question: str, context: List[Dict[str, Any]],
+                     assembler: ContextAssembler) -> List[Dict[str, Any]]:
+        """Select the context chunks that fit next to the rest of the prompt"""
+        fixed_text = self._create_prompt(scenario, question, [])
+        return assembler.select(context, fixed_text=fixed_text)
+    
     def _create_prompt(self, scenario: str, question: str, context: List[Dict[str, Any]]) -> str:
         """Create a prompt for the LLM"""
         prompt = "You are a tax expert assistant. Analyze the following tax scenario and question.\n\n"
@@ -208,7 +260,7 @@ class TaxAnalyzer:
         
         prompt += "RELEVANT INFORMATION:\n"
         for ctx in context:
-            prompt += f"---\n{ctx.get('text', '')}\n"
+            prompt += CONTEXT_ENTRY_FORMAT.format(text=ctx.get('text', ''))
         
         prompt += "\nBased on the scenario, question, and relevant information, provide a detailed answer. "
         prompt += "Include your reasoning process, cite specific tax rules when applicable, "
@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+# Structure-aware chunking of IRS publications for IRS Tax Analysis System
+
+import os
+import re
+import hashlib
+import logging
+from collections import deque
+from dataclasses import dataclass
+from typing import Deque, Dict, Iterable, Iterator, List, Optional, Tuple, Any
+
+from core.context import TokenCounter
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[logging.StreamHandler()]
+)
+logger = logging.getLogger("chunking")
+
+# Structural patterns found in IRS publications and form instructions
+CHAPTER_PATTERN = re.compile(r"^\s*(?:Chapter\s+\d+|CHAPTER\s+\d+|Part\s+[IVX]+\b)")
+LINE_ITEM_PATTERN = re.compile(r"^\s*Lines?\s+\d+[a-z]?\b")
+TABLE_ROW_PATTERN = re.compile(r"\S(?:\t| {2,})\S.*\S(?:\t| {2,})\S|\.{4,}\s*\$?[\d,]+|^\s*\|.*\|\s*$")
+SENTENCE_SPLIT_PATTERN = re.compile(r"(?<=[.!?;])\s+")
+WORD_SPLIT_PATTERN = re.compile(r"\s+")
+HEADING_MAX_LENGTH = 80
+
+@dataclass
+class Chunk:
+    """A window of a source document with its character offsets"""
+    text: str
+    source: str
+    start: int
+    end: int
+    index: int
+    section: str = ""
+    kind: str = "text"
+
+    @property
+    def id(self) -> str:
+        """Stable identifier derived from the source file and offsets
+
+        The file name keeps IDs readable; a short hash of the full path keeps
+        same-named files in different directories apart.
+        """
+        path_hash = hashlib.sha1(os.path.normpath(self.source).encode("utf-8")).hexdigest()[:8]
+        return f"{os.path.basename(self.source)}-{path_hash}:{self.start}-{self.end}"
+
+    def to_metadata(self) -> Dict[str, Any]:
+        """Metadata stored alongside the chunk in the vector database"""
+        return {
+            "source": self.source,
+            "start": self.start,
+            "end": self.end,
+            "chunk_index": self.index,
+            "section": self.section,
+            "kind": self.kind
+        }
+
+def _is_heading(line: str) -> bool:
+    """Short Title Case or ALL CAPS line without closing punctuation"""
+    stripped = line.strip()
+    if not stripped or len(stripped) > HEADING_MAX_LENGTH or stripped[-1] in ".,;:?!" or not stripped[0].isupper():
+        return False
+    words = [w for w in re.findall(r"[A-Za-z][A-Za-z'’-]*", stripped) if len(w) > 3]
+    if not words:
+        return False
+    capitalized = sum(1 for w in words if w[0].isupper())
+    return capitalized / len(words) >= 0.6
+
+class StructureAwareChunker:
+    """Split IRS publications into token-sized windows along their structure.
+
+    Chapters and section headings always start a new chunk, line-item
+    instructions are preferred break points, and tables are kept apart from
+    prose and never split mid-row. The input is consumed line by line, so only
+    the current window is ever held and tokenized.
+    """
+
+    def __init__(self, chunk_tokens: int = 400, overlap_tokens: int = 50,
+                 model_name: str = "llama3:8b", token_counter: Optional[TokenCounter] = None):
+        """Initialize the chunker.
+
+        Args:
+            chunk_tokens: Target maximum chunk size in tokens
+            overlap_tokens: Tokens of prose repeated at the start of the next chunk
+            model_name: Model whose tokenizer sizes the chunks
+            token_counter: Optional counter (defaults to the model's tokenizer)
+        """
+        self.chunk_tokens = chunk_tokens
+        self.overlap_tokens = overlap_tokens
+        self.counter = token_counter or TokenCounter(model_name)
+
+    def chunk_file(self, path: str) -> Iterator[Chunk]:
+        """Stream chunks from a text file"""
+        with open(path, "r", encoding="utf-8") as f:
+            yield from self.chunk_lines(f, source=path)
+
+    def chunk_text(self, text: str, source: str = "") -> Iterator[Chunk]:
+        """Chunk an in-memory string"""
+        yield from self.chunk_lines(text.splitlines(keepends=True), source=source)
+
+    def _split(self, text: str, offset: int, pattern: "re.Pattern") -> List[Tuple[str, int]]:
+        """Split text after each match of pattern, keeping separators and offsets"""
+        parts, start = [], 0
+        for match in pattern.finditer(text):
+            parts.append((text[start:match.end()], offset + start))
+            start = match.end()
+        if start < len(text):
+            parts.append((text[start:], offset + start))
+        return parts
+
+    def _pieces(self, line: str, offset: int) -> Iterator[Tuple[str, int, int]]:
+        """Break a line into (text, offset, tokens) units small enough to window and overlap.
+
+        Long lines are split into sentences, and sentences longer than a chunk
+        are split between words.
+        """
+        tokens = self.counter.count(line)
+        if tokens <= self.overlap_tokens:
+            yield line, offset, tokens
+            return
+
+        for sentence, sentence_offset in self._split(line, offset, SENTENCE_SPLIT_PATTERN):
+            sentence_tokens = self.counter.count(sentence)
+            if sentence_tokens <= self.chunk_tokens:
+                yield sentence, sentence_offset, sentence_tokens
+                continue
+
+            piece, piece_offset, piece_tokens = "", sentence_offset, 0
+            for word, word_offset in self._split(sentence, sentence_offset, WORD_SPLIT_PATTERN):
+                word_tokens = self.counter.count(word)
+                if piece and piece_tokens + word_tokens > self.chunk_tokens:
+                    yield piece, piece_offset, piece_tokens
+                    piece, piece_offset, piece_tokens = "", word_offset, 0
+                piece += word
+                piece_tokens += word_tokens
+            if piece:
+                yield piece, piece_offset, piece_tokens
+
+    def chunk_lines(self, lines: Iterable[str], source: str = "") -> Iterator[Chunk]:
+        """Chunk a stream of lines (with line endings), yielding chunks as they fill up.
+
+        Args:
+            lines: Iterable of lines, e.g. an open file
+            source: Source path recorded on every chunk
+
+        Yields:
+            Chunks with character offsets into the source text
+        """
+        window: Deque[Tuple[str, int, int, str]] = deque()  # (text, offset, tokens, role)
+        state = {"tokens": 0, "body": 0, "kind": "text", "index": 0}
+        chapter = ""
+        heading = ""
+
+        def section() -> str:
+            return " / ".join(part for part in (chapter, heading) if part)
+
+        def flush(overlap: bool) -> Optional[Chunk]:
+            """Emit the window as a chunk if it has body text, keeping an overlap tail if asked"""
+            chunk = None
+            raw = "".join(unit[0] for unit in window)
+            if state["body"] and raw.strip():
+                start = window[0][1] + (len(raw) - len(raw.lstrip()))
+                end = window[0][1] + len(raw.rstrip())
+                chunk = Chunk(
+                    text=raw.strip(), source=source, start=start, end=end,
+                    index=state["index"], section=section(), kind=state["kind"]
+                )
+                state["index"] += 1
+            state["body"] = 0
+
+            kept: List[Tuple[str, int, int, str]] = []
+            if overlap and state["kind"] == "text":
+                kept_tokens = 0
+                for unit in reversed(window):
+                    if kept_tokens + unit[2] > self.overlap_tokens:
+                        break
+                    kept.append(unit)
+                    kept_tokens += unit[2]
+            window.clear()
+            window.extend(reversed(kept))
+            state["tokens"] = sum(unit[2] for unit in window)
+            return chunk
+
+        def start_section() -> Optional[Chunk]:
+            """Close the current window before a structural boundary.
+
+            Headings seen since the last chunk stay in the window so they open
+            the next chunk; leftover overlap from the previous chunk is dropped.
+            """
+            if state["body"]:
+                return flush(overlap=False)
+            while window and window[0][3] != "heading":
+                window.popleft()
+            state["tokens"] = sum(unit[2] for unit in window)
+            return None
+
+        def append(text: str, unit_offset: int, tokens: int, role: str) -> None:
+            window.append((text, unit_offset, tokens, role))
+            state["tokens"] += tokens
+            if role == "body":
+                state["body"] += 1
+
+        offset = 0
+        for line in lines:
+            line_offset = offset
+            offset += len(line)
+
+            if not line.strip():
+                if window:
+                    append(line, line_offset, 0, "blank")
+                continue
+
+            if TABLE_ROW_PATTERN.search(line):
+                kind = "table"
+            elif CHAPTER_PATTERN.match(line):
+                kind = "chapter"
+            elif LINE_ITEM_PATTERN.match(line):
+                kind = "line_item"
+            elif _is_heading(line):
+                kind = "heading"
+            else:
+                kind = "text"
+
+            if kind == "table":
+                # Tables get their own chunks and are only split between rows
+                if state["kind"] != "table":
+                    chunk = start_section()
+                    if chunk:
+                        yield chunk
+                    state["kind"] = "table"
+                row_tokens = self.counter.count(line)
+                if state["body"] and state["tokens"] + row_tokens > self.chunk_tokens:
+                    chunk = flush(overlap=False)
+                    if chunk:
+                        yield chunk
+                append(line, line_offset, row_tokens, "body")
+                continue
+
+            if state["kind"] == "table":
+                chunk = flush(overlap=False)
+                if chunk:
+                    yield chunk
+                state["kind"] = "text"
+
+            if kind in ("chapter", "heading"):
+                chunk = start_section()
+                if chunk:
+                    yield chunk
+                if kind == "chapter":
+                    chapter, heading = line.strip(), ""
+                else:
+                    heading = line.strip()
+                append(line, line_offset, self.counter.count(line), "heading")
+                continue
+
+            if kind == "line_item" and state["body"] and state["tokens"] >= self.chunk_tokens // 2:
+                # Prefer breaking at the start of a line-item instruction
+                chunk = flush(overlap=False)
+                if chunk:
+                    yield chunk
+
+            for text, piece_offset, tokens in self._pieces(line, line_offset):
+                if state["body"] and state["tokens"] + tokens > self.chunk_tokens:
+                    chunk = flush(overlap=True)
+                    if chunk:
+                        yield chunk
+                append(text, piece_offset, tokens, "body")
+
+        chunk = flush(overlap=False)
+        if chunk:
+            yield chunk
@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+# Prompt context assembly for IRS Tax Analysis System
+
+import re
+import math
+import logging
+from typing import Dict, List, Optional, Set, Tuple, Any
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[logging.StreamHandler()]
+)
+logger = logging.getLogger("context")
+
+# Context window (in tokens) per Ollama model family, matched by name prefix
+MODEL_CONTEXT_WINDOWS = {
+    "llama3:70b": 8192,
+    "llama3": 8192,
+    "phi4": 16384,
+    "mixtral": 32768,
+    "mistral": 32768,
+    "yi": 4096,
+}
+DEFAULT_CONTEXT_WINDOW = 2048  # Ollama's default num_ctx
+
+# How each selected chunk is written into a prompt (TaxAnalyzer._create_prompt, core.rag._answer_prompt)
+CONTEXT_ENTRY_FORMAT = "---\n{text}\n"
+
+# Hugging Face tokenizer used to count tokens for each model family. Tokenizers
+# are only read from the local Hugging Face cache (several of these repos are
+# gated), so exact counts need e.g. ``huggingface-cli download <repo>`` first;
+# otherwise token counts are estimated from characters.
+MODEL_TOKENIZERS = {
+    "llama3": "meta-llama/Meta-Llama-3-8B",
+    "phi4": "microsoft/phi-4",
+    "mixtral": "mistralai/Mixtral-8x7B-v0.1",
+    "mistral": "mistralai/Mistral-7B-v0.3",
+    "yi": "01-ai/Yi-34B",
+}
+
+# Tokenizers are expensive to load, so share them across counters
+_TOKENIZER_CACHE: Dict[str, Any] = {}
+_estimate_logged = False
+
+def lookup_model_setting(table: Dict[str, Any], model_name: str) -> Optional[Any]:
+    """Find the entry whose key is the longest prefix of the model name
+
+    Args:
+        table: Per-model settings keyed by model name prefix (e.g. "llama3")
+        model_name: Ollama model name (e.g. "llama3:8b")
+
+    Returns:
+        The matching setting, or None if no key matches
+    """
+    name = model_name.lower()
+    matches = [key for key in table if name.startswith(key)]
+    return table[max(matches, key=len)] if matches else None
+
+def get_context_window(model_name: str, overrides: Optional[Dict[str, int]] = None) -> int:
+    """Get the context window for a model, honouring per-model overrides"""
+    if overrides:
+        window = lookup_model_setting(overrides, model_name)
+        if window:
+            return window
+    return lookup_model_setting(MODEL_CONTEXT_WINDOWS, model_name) or DEFAULT_CONTEXT_WINDOW
+
+class TokenCounter:
+    """Count and truncate text in the target model's tokens."""
+
+    CHARS_PER_TOKEN = 4  # Fallback estimate when no tokenizer is available
+
+    def __init__(self, model_name: str, tokenizer: Any = None):
+        """Initialize the counter.
+
+        Args:
+            model_name: Ollama model name, used to pick the tokenizer
+            tokenizer: Optional preloaded tokenizer with ``encode``/``decode``
+        """
+        self.model_name = model_name
+        self.tokenizer = tokenizer if tokenizer is not None else self._load_tokenizer(model_name)
+
+    @staticmethod
+    def _load_tokenizer(model_name: str) -> Any:
+        """Load the model's Hugging Face tokenizer from the local cache, or None if unavailable"""
+        global _estimate_logged
+        repo_id = lookup_model_setting(MODEL_TOKENIZERS, model_name)
+        if repo_id is None:
+            return None
+        if repo_id not in _TOKENIZER_CACHE:
+            try:
+                from transformers import AutoTokenizer
+                _TOKENIZER_CACHE[repo_id] = AutoTokenizer.from_pretrained(repo_id, local_files_only=True)
+            except Exception as e:
+                _TOKENIZER_CACHE[repo_id] = None
+                if not _estimate_logged:
+                    _estimate_logged = True
+                    logger.info(f"Tokenizer {repo_id} not available locally, estimating token counts "
+                                f"from characters: {e}")
+        return _TOKENIZER_CACHE[repo_id]
+
+    def count(self, text: str) -> int:
+        """Count tokens in text"""
+        if not text:
+            return 0
+        if self.tokenizer is None:
+            return math.ceil(len(text) / self.CHARS_PER_TOKEN)
+        return len(self.tokenizer.encode(text, add_special_tokens=False))
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """Cut text down to at most max_tokens tokens"""
+        if max_tokens <= 0:
+            return ""
+        if self.tokenizer is None:
+            return text[:max_tokens * self.CHARS_PER_TOKEN]
+        ids = self.tokenizer.encode(text, add_special_tokens=False)
+        if len(ids) <= max_tokens:
+            return text
+        return self.tokenizer.decode(ids[:max_tokens])
+
+def _shingles(text: str) -> Set[str]:
+    """Word bigrams used for lexical similarity"""
+    words = re.findall(r"\w+", text.lower())
+    if len(words) < 2:
+        return set(words)
+    return {f"{a} {b}" for a, b in zip(words, words[1:])}
+
+def _cosine(a: List[float], b: List[float]) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+class ContextAssembler:
+    """Pack retrieved chunks into a model's context budget.
+
+    Chunks are picked by maximal marginal relevance (MMR), near-duplicates are
+    dropped, spans overlapping an already selected chunk of the same source are
+    trimmed, and packing stops at the token budget instead of letting the model
+    silently truncate the prompt.
+    """
+
+    separator = CONTEXT_ENTRY_FORMAT.format(text="")  # Framing the prompts write around every chunk
+
+    def __init__(self, model_name: str, context_window: Optional[int] = None,
+                 reserve_tokens: int = 1024, mmr_lambda: float = 0.7,
+                 duplicate_threshold: float = 0.9, min_chunk_tokens: int = 32,
+                 token_counter: Optional[TokenCounter] = None):
+        """Initialize the assembler.
+
+        Args:
+            model_name: Target model name
+            context_window: Context window in tokens (defaults to the model's known window)
+            reserve_tokens: Tokens kept free for the generated answer
+            mmr_lambda: Trade-off between relevance (1.0) and diversity (0.0)
+            duplicate_threshold: Similarity above which a chunk counts as a duplicate
+            min_chunk_tokens: Smallest chunk remainder worth keeping after trimming
+            token_counter: Optional counter (defaults to the model's tokenizer)
+        """
+        self.model_name = model_name
+        self.context_window = context_window or get_context_window(model_name)
+        self.reserve_tokens = reserve_tokens
+        self.mmr_lambda = mmr_lambda
+        self.duplicate_threshold = duplicate_threshold
+        self.min_chunk_tokens = min_chunk_tokens
+        self.counter = token_counter or TokenCounter(model_name)
+
+    def budget(self, fixed_text: str = "") -> int:
+        """Tokens available for context once the fixed prompt text and answer are accounted for"""
+        return max(0, self.context_window - self.reserve_tokens - self.counter.count(fixed_text))
+
+    def _entry_text(self, ctx: Dict[str, Any]) -> str:
+        """Text of a context entry; unrendered tables are represented by their summary"""
+        if not ctx.get("text") and ctx.get("table") is not None:
+            return ctx["table"].summary()
+        return ctx.get("text", "")
+
+    @staticmethod
+    def _render(ctx: Dict[str, Any]) -> Dict[str, Any]:
+        """Render a selected table entry to markdown (loading its content only now)"""
+        if ctx.get("text") or ctx.get("table") is None:
+            return ctx
+        rendered = dict(ctx)
+        rendered["text"] = ctx["table"].to_markdown()
+        return rendered
+
+    def _similarity(self, a: Dict[str, Any], b: Dict[str, Any], shingles: Dict[int, Set[str]]) -> float:
+        """Embedding cosine similarity if available, else lexical Jaccard"""
+        if a.get("embedding") is not None and b.get("embedding") is not None:
+            return _cosine(a["embedding"], b["embedding"])
+        sa, sb = shingles[id(a)], shingles[id(b)]
+        if not sa or not sb:
+            return 0.0
+        return len(sa & sb) / len(sa | sb)
+
+    def _trim_overlap(self, ctx: Dict[str, Any], selected: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """Remove the part of a chunk window already covered by a selected chunk of the same source"""
+        meta = ctx.get("metadata") or {}
+        start, end = meta.get("start"), meta.get("end")
+        if start is None or end is None:
+            return ctx
+
+        text = self._entry_text(ctx)
+        for other in selected:
+            other_meta = other.get("metadata") or {}
+            if other_meta.get("source") != meta.get("source"):
+                continue
+            o_start, o_end = other_meta.get("start"), other_meta.get("end")
+            if o_start is None or o_end is None or o_end <= start or o_start >= end:
+                continue
+            if o_start <= start and o_end >= end:
+                return None  # Fully covered
+            if o_start <= start:
+                # Selected chunk covers our head: keep the tail
+                text = text[o_end - start:]
+                start = o_end
+            elif o_end >= end:
+                # Selected chunk covers our tail: keep the head
+                text = text[:o_start - start]
+                end = o_start
+            # A selected chunk strictly inside ours is left as is
+
+        if text == self._entry_text(ctx):
+            return ctx
+        trimmed = dict(ctx)
+        trimmed["text"] = text
+        trimmed["metadata"] = dict(meta, start=start, end=end)
+        return trimmed
+
+    def select(self, contexts: List[Dict[str, Any]], fixed_text: str = "") -> List[Dict[str, Any]]:
+        """Select and trim chunks to fit the budget.
+
+        Args:
+            contexts: Retrieval results (``text``, ``score``, optional ``metadata``/``embedding``);
+                an entry may instead carry a ``table`` (TableData) that is rendered only if selected
+            fixed_text: Prompt text that is always sent (instructions, scenario, question)
+
+        Returns:
+            Selected chunks in MMR order
+        """
+        remaining = self.budget(fixed_text)
+        candidates = [c for c in contexts if self._entry_text(c).strip()]
+        if not candidates or remaining <= 0:
+            return []
+
+        # Normalise retrieval scores to [0, 1] for the relevance term
+        scores = [c.get("score", 0.0) for c in candidates]
+        low, high = min(scores), max(scores)
+        relevance = {id(c): (s - low) / (high - low) if high > low else 1.0 for c, s in zip(candidates, scores)}
+        shingles = {id(c): _shingles(self._entry_text(c)) for c in candidates}
+
+        separator_tokens = self.counter.count(self.separator)
+        selected: List[Dict[str, Any]] = []
+        originals: List[Dict[str, Any]] = []
+        while candidates and remaining >= self.min_chunk_tokens:
+            best, best_value, best_sim = None, None, 0.0
+            for c in candidates:
+                max_sim = max((self._similarity(c, o, shingles) for o in originals), default=0.0)
+                value = self.mmr_lambda * relevance[id(c)] - (1 - self.mmr_lambda) * max_sim
+                if best_value is None or value > best_value:
+                    best, best_value, best_sim = c, value, max_sim
+            candidates.remove(best)
+
+            if best_sim >= self.duplicate_threshold:
+                logger.debug(f"Dropping near-duplicate chunk (similarity {best_sim:.2f})")
+                continue
+
+            chunk = self._trim_overlap(best, selected)
+            if chunk is None:
+                continue
+            chunk = self._render(chunk)
+
+            tokens = self.counter.count(self._entry_text(chunk)) + separator_tokens
+            if tokens < self.min_chunk_tokens and chunk is not best:
+                continue  # Trimming left only a sliver
+            if tokens > remaining:
+                chunk = dict(chunk)
+                chunk["text"] = self.counter.truncate(self._entry_text(chunk), remaining - separator_tokens)
+                tokens = self.counter.count(chunk["text"]) + separator_tokens
+
+            selected.append(chunk)
+            originals.append(best)
+            remaining -= tokens
+
+        return selected
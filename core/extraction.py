@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+# Entity extraction for building the IRS Tax Analysis System knowledge graph
+
+import gc
+import re
+import sys
+import time
+import logging
+import argparse
+import concurrent.futures
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# Make the core package importable when this file is run as a script
+sys.path.append(str(Path(__file__).parent.parent))
+from core.knowledge_graph import TaxEntity, TaxKnowledgeGraph, normalize_name
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[logging.StreamHandler()]
+)
+logger = logging.getLogger("extraction")
+
+# One capture group per pattern; patterns are matched case-insensitively, with
+# (?-i:...) marking the parts that must be capitalized
+_NAME = r"(?-i:[A-Z][\w'\-]*)"
+DEFAULT_PATTERNS: Dict[str, List[str]] = {
+    "form": [r"\bForm\s+((?:[A-Z]{1,3}-?)?[0-9][0-9A-Z\-]*)\b", r"\b([0-9]{3,4}[A-Z]?)(?=\s+form\b)"],
+    "deduction": [rf"\b((?:{_NAME}[ \t]+){{1,5}}deduction)\b"],
+    "credit": [rf"\b((?:{_NAME}[ \t]+){{1,5}}credit)\b"],
+    "taxpayer": [r"\btaxpayer[ \t]+((?-i:[A-Z][a-z]+(?:[ \t]+[A-Z][a-z]+){0,3}))",
+                 r"\b((?-i:[A-Z][a-z]+(?:[ \t]+[A-Z][a-z]+){0,3}))'s[ \t]+tax\b"],
+}
+
+# Names that are found wherever they appear, whatever their capitalization
+KNOWN_ENTITIES: Dict[str, List[str]] = {
+    "credit": ["Child Tax Credit", "Additional Child Tax Credit", "Credit for Other Dependents",
+               "Earned Income Tax Credit", "Earned Income Credit", "American Opportunity Credit",
+               "Lifetime Learning Credit", "Child and Dependent Care Credit", "Premium Tax Credit",
+               "Saver's Credit", "Foreign Tax Credit", "Residential Clean Energy Credit"],
+    "deduction": ["Standard Deduction", "Home Office Deduction", "Qualified Business Income Deduction",
+                  "Student Loan Interest Deduction", "Mortgage Interest Deduction"],
+}
+
+# Leading words the capitalized-phrase patterns pick up at the start of a sentence
+_LEADING_WORDS = {"the", "a", "an", "this", "that", "his", "her", "their", "your", "our", "my", "its", "each",
+                  "any", "no", "for", "and", "or"}
+
+class AhoCorasick:
+    """Aho–Corasick automaton for matching many dictionary terms in one pass.
+
+    Terms and text are compared in normalized form (case folded, whitespace
+    collapsed), and matches must start and end on word boundaries.
+    """
+
+    def __init__(self, terms: Optional[Dict[str, Any]] = None):
+        """Build the automaton.
+
+        Args:
+            terms: Mapping from term to the value reported when it matches
+        """
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[Tuple[int, Any]]] = [[]]  # state -> (term length, value)
+        self._built = True
+        for term, value in (terms or {}).items():
+            self.add(term, value)
+
+    def add(self, term: str, value: Any) -> None:
+        """Add a term; the automaton is rebuilt before the next search"""
+        term = normalize_name(term)
+        if not term:
+            return
+        state = 0
+        for char in term:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            state = next_state
+        self._out[state].append((len(term), value))
+        self._built = False
+
+    def _build(self) -> None:
+        """Compute failure links breadth first, merging the outputs they lead to"""
+        queue = list(self._goto[0].values())
+        for state in queue:
+            self._fail[state] = 0
+        for state in queue:
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(char, 0)
+                self._fail[next_state] = target if target != next_state else 0
+                self._out[next_state] = self._out[next_state] + self._out[self._fail[next_state]]
+        self._built = True
+
+    def iter(self, text: str) -> Iterator[Tuple[int, int, Any]]:
+        """Yield (start, end, value) for every whole-word match in the normalized text"""
+        if not self._built:
+            self._build()
+        text = normalize_name(text)
+        goto, fail, out = self._goto, self._fail, self._out
+        state = 0
+        for i, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if not out[state]:
+                continue
+            end = i + 1
+            if end < len(text) and text[end].isalnum():
+                continue
+            for length, value in out[state]:
+                start = end - length
+                if start == 0 or not text[start - 1].isalnum():
+                    yield start, end, value
+
+class EntityExtractor:
+    """Extract tax entities from text in a single pass per matcher.
+
+    All regex patterns are compiled once into one alternation, so the text is
+    scanned once; where two patterns match overlapping text, the leftmost
+    match wins. Dictionary terms are matched with an Aho–Corasick automaton.
+    """
+
+    def __init__(self, patterns: Optional[Dict[str, List[str]]] = None,
+                 dictionary: Optional[Dict[str, Iterable[str]]] = None):
+        """Compile the extractor.
+
+        Args:
+            patterns: Entity type -> regex patterns whose first group is the name
+                (defaults to DEFAULT_PATTERNS)
+            dictionary: Entity type -> known names (defaults to KNOWN_ENTITIES)
+        """
+        self.patterns = patterns if patterns is not None else DEFAULT_PATTERNS
+        self.dictionary = {entity_type: list(names) for entity_type, names in
+                           (dictionary if dictionary is not None else KNOWN_ENTITIES).items()}
+
+        alternatives = []
+        self._groups: Dict[str, Tuple[str, int]] = {}  # wrapper group -> (type, group of the name)
+        offset = 0
+        for entity_type, type_patterns in self.patterns.items():
+            for pattern in type_patterns:
+                name = f"p{len(self._groups)}"
+                alternatives.append(f"(?P<{name}>{pattern})")
+                self._groups[name] = (entity_type, offset + 2)
+                offset += 1 + re.compile(pattern).groups
+        self._regex = re.compile("|".join(alternatives), re.IGNORECASE) if alternatives else None
+
+        self._automaton = AhoCorasick()
+        for entity_type, names in self.dictionary.items():
+            for name in names:
+                self._automaton.add(name, (entity_type, name))
+
+    @classmethod
+    def from_graph(cls, kg: TaxKnowledgeGraph, types: Iterable[str] = ("form", "credit", "deduction"),
+                   patterns: Optional[Dict[str, List[str]]] = None) -> "EntityExtractor":
+        """Extractor whose dictionary also holds the graph's entities of the given types"""
+        dictionary = {entity_type: list(names) for entity_type, names in KNOWN_ENTITIES.items()}
+        types = set(types)
+        for _, attrs in kg.graph.nodes(data=True):
+            if attrs.get("type") in types:
+                dictionary.setdefault(attrs["type"], []).append(attrs.get("name", ""))
+        return cls(patterns, dictionary)
+
+    def extract(self, text: str) -> List[Tuple[str, str]]:
+        """Entities in the text as (type, name) pairs, deduplicated in order of first mention"""
+        found: Dict[Tuple[str, str], Tuple[str, str]] = {}
+        if self._regex is not None:
+            for match in self._regex.finditer(text):
+                entity_type, group = self._groups[match.lastgroup]
+                name = _clean_name(entity_type, match.group(group) or "")
+                if name:
+                    found.setdefault((entity_type, normalize_name(name)), (entity_type, name))
+        for _, _, (entity_type, name) in self._automaton.iter(text):
+            found.setdefault((entity_type, normalize_name(name)), (entity_type, name))
+        return list(found.values())
+
+def _clean_name(entity_type: str, name: str) -> str:
+    """Collapse whitespace and drop leading function words caught by capitalized-phrase patterns"""
+    words = name.split()
+    while len(words) > 1 and words[0].casefold() in _LEADING_WORDS:
+        words = words[1:]
+    name = " ".join(words)
+    return name.upper() if entity_type == "form" else name
+
+@lru_cache(maxsize=32)
+def _cached_extractor(patterns_key: Optional[Tuple[Tuple[str, Tuple[str, ...]], ...]]) -> EntityExtractor:
+    patterns = {entity_type: list(type_patterns) for entity_type, type_patterns in patterns_key} \
+        if patterns_key is not None else None
+    return EntityExtractor(patterns)
+
+def get_extractor(patterns: Optional[Dict[str, List[str]]] = None) -> EntityExtractor:
+    """Shared compiled extractor for a pattern set (the defaults if None)"""
+    key = tuple((entity_type, tuple(type_patterns)) for entity_type, type_patterns in patterns.items()) \
+        if patterns is not None else None
+    return _cached_extractor(key)
+
+# Extractor of each pool worker, built once by the initializer
+_worker_extractor: Optional[EntityExtractor] = None
+
+def _init_worker(patterns: Optional[Dict[str, List[str]]], dictionary: Optional[Dict[str, List[str]]]) -> None:
+    global _worker_extractor
+    _worker_extractor = EntityExtractor(patterns, dictionary)
+
+def _extract_file(path: str) -> List[Tuple[str, str]]:
+    """Extract entities from one file (runs in a worker process)"""
+    try:
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            return _worker_extractor.extract(f.read())
+    except OSError as e:
+        logger.warning(f"Skipping unreadable file {path}: {e}")
+        return []
+
+def iter_corpus(paths: Iterable[str], suffixes: Tuple[str, ...] = (".txt", ".md")) -> Iterator[str]:
+    """Files under the given files or directories, in sorted order"""
+    for path in paths:
+        path = Path(path)
+        if path.is_dir():
+            for file_path in sorted(path.rglob("*")):
+                if file_path.is_file() and file_path.suffix.lower() in suffixes:
+                    yield str(file_path)
+        elif path.is_file():
+            yield str(path)
+
+def extract_corpus(kg: TaxKnowledgeGraph, paths: Iterable[str], max_workers: Optional[int] = None,
+                   patterns: Optional[Dict[str, List[str]]] = None, use_graph_dictionary: bool = True,
+                   chunksize: int = 16) -> int:
+    """Extract entities from a corpus of files in a process pool and add them to the graph.
+
+    Workers compile the extractor once and return (type, name) pairs; the
+    parent deduplicates them across the corpus and inserts them as one batch,
+    saved once at the end.
+
+    Args:
+        kg: Graph the entities are added to
+        paths: Files or directories of text files
+        max_workers: Extraction processes (defaults to the container's CPU allowance)
+        patterns: Regex patterns (defaults to DEFAULT_PATTERNS)
+        use_graph_dictionary: Also match the names of forms, credits and deductions already in the graph
+        chunksize: Files handed to a worker at a time
+
+    Returns:
+        Number of entities added
+    """
+    files = list(iter_corpus(paths))
+    if not files:
+        return 0
+    if max_workers is None:
+        from utils.system import get_optimal_worker_count
+        max_workers = get_optimal_worker_count()
+    extractor = EntityExtractor.from_graph(kg, patterns=patterns) if use_graph_dictionary else EntityExtractor(patterns)
+
+    start = time.time()
+    if max_workers <= 1 or len(files) == 1:
+        _init_worker(extractor.patterns, extractor.dictionary)
+        results = map(_extract_file, files)
+        executor = None
+    else:
+        executor = concurrent.futures.ProcessPoolExecutor(
+            max_workers=min(max_workers, len(files)), initializer=_init_worker,
+            initargs=(extractor.patterns, extractor.dictionary))
+        results = executor.map(_extract_file, files, chunksize=chunksize)
+
+    try:
+        unique: Dict[Tuple[str, str], str] = {}
+        for pairs in results:
+            for entity_type, name in pairs:
+                unique.setdefault((entity_type, normalize_name(name)), name)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    with kg.batch():
+        added = kg.add_entities(TaxEntity(name, entity_type) for (entity_type, _), name in unique.items())
+    logger.info(f"Extracted {len(unique)} distinct entities from {len(files)} files in "
+                f"{time.time() - start:.1f}s; {added} were new")
+    return added
+
+def main():
+    """Build knowledge graph entities from a corpus"""
+    parser = argparse.ArgumentParser(description="Extract tax entities from text files into the knowledge graph")
+    parser.add_argument('paths', nargs='+', help='Files or directories to extract from (e.g. data/docs data/answers)')
+    parser.add_argument('--graph', type=str, default="./data/knowledge_graph.db", help='Knowledge graph to extend')
+    parser.add_argument('--workers', '-w', type=int, help='Extraction processes (default: available CPUs)')
+    args = parser.parse_args()
+
+    kg = TaxKnowledgeGraph(save_path=args.graph)
+    # The cyclic collector keeps rescanning the growing graph during bulk insertion;
+    # this process owns its GC settings, so pause it for the run
+    gc.disable()
+    try:
+        extract_corpus(kg, args.paths, max_workers=args.workers)
+    finally:
+        gc.enable()
+    kg.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+# Structured metadata facets for filtered retrieval in IRS Tax Analysis System
+
+import os
+import re
+import json
+import logging
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple, Any
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[logging.StreamHandler()]
+)
+logger = logging.getLogger("facets")
+
+# Facets stored on every chunk and indexed for pre-filtering
+FACETS = ("tax_year", "forms", "publication", "entity_type")
+
+# Facets relaxed first when a filtered search finds too few candidates
+RELAX_ORDER = ("entity_type", "forms", "publication", "tax_year")
+
+YEAR_PATTERN = re.compile(r"\b(20[0-4]\d)\b")
+STRONG_YEAR_PATTERN = re.compile(
+    r"(?:\btax\s+year\s+|\bPublication\s+\d+[A-Z]?\s*\(|\bfor\s+use\s+in\s+preparing\s+|\bfiscal\s+year\s+)(20[0-4]\d)"
+    r"|\b(20[0-4]\d)\s+(?:tax\s+(?:year|return)|Form\s+\d|Instructions|Returns)",
+    re.IGNORECASE
+)
+FORM_PATTERN = re.compile(
+    r"\bForms?\s+((?:W|SS|1099|1098|1095)-[A-Z0-9]+|\d{3,4}(?:-[A-Z]{1,3})?)\b"
+    r"|\bSchedule\s+([A-Z]{1,2}(?:-\d)?|[1-9])\b(?:\s*\(Form\s+(\d{3,4})\))?"
+    r"|\b((?:W|1099|1098)-[A-Z0-9]+)\b"
+)
+PUBLICATION_PATTERN = re.compile(r"\b(?:Publication|Pub\.)\s+(\d{1,4}[A-Z]?)\b")
+PUBLICATION_FILENAME_PATTERN = re.compile(r"^([pi]\d{1,4}[a-z]{0,3})(?=[^a-z]|$)", re.IGNORECASE)
+
+# Entity types in priority order, with the phrases that identify them
+ENTITY_TYPES = (
+    ("exempt_organization", re.compile(r"\b(?:tax-exempt organization|exempt organization|501\(c\)|charit(?:y|able organization))", re.IGNORECASE)),
+    ("s_corporation", re.compile(r"\bS corporations?\b|\bForm 1120-S\b")),
+    ("corporation", re.compile(r"\b(?:C )?corporations?\b|\bForm 1120\b", re.IGNORECASE)),
+    ("partnership", re.compile(r"\bpartnerships?\b|\bForm 1065\b|\bSchedule K-1\b", re.IGNORECASE)),
+    ("estate_trust", re.compile(r"\b(?:estates?|trusts?)\b|\bForm 1041\b", re.IGNORECASE)),
+    ("sole_proprietor", re.compile(r"\bsole proprietor(?:ship)?s?\b|\bself-employed\b|\bSchedule C\b", re.IGNORECASE)),
+    ("individual", re.compile(r"\b(?:individuals?|taxpayers?|filing status|dependents?|Form 1040)\b", re.IGNORECASE)),
+)
+
+def normalize_form(form: str) -> str:
+    """Normalise a form name ("Schedule C", "W-2", "1040-SR") to a metadata key suffix"""
+    return re.sub(r"[^a-z0-9]+", "_", form.lower()).strip("_")
+
+def form_key(form: str) -> str:
+    """Boolean metadata key marking a chunk that mentions a form"""
+    return f"form_{normalize_form(form)}"
+
+def extract_forms(text: str) -> List[str]:
+    """Form and schedule names mentioned in text, in order of first mention"""
+    forms: Dict[str, None] = {}
+    for match in FORM_PATTERN.finditer(text):
+        form, schedule, schedule_form, bare = match.groups()
+        if schedule:
+            forms[f"Schedule {schedule}"] = None
+            if schedule_form:
+                forms[schedule_form] = None
+        else:
+            forms[(form or bare).upper()] = None
+    return list(forms)
+
+def extract_tax_year(text: str, strong_only: bool = False) -> Optional[int]:
+    """Tax year named in text.
+
+    An explicit mention ("tax year 2023", "Publication 17 (2023)") wins;
+    otherwise the most frequent year is used unless ``strong_only`` is set.
+    """
+    strong = [int(a or b) for a, b in STRONG_YEAR_PATTERN.findall(text)]
+    if strong:
+        return Counter(strong).most_common(1)[0][0]
+    if strong_only:
+        return None
+    years = YEAR_PATTERN.findall(text)
+    return int(Counter(years).most_common(1)[0][0]) if years else None
+
+def extract_publication(text: str, source: str = "") -> Optional[str]:
+    """Publication or instructions ID ("p17", "i1040") from the file name or text"""
+    match = PUBLICATION_FILENAME_PATTERN.match(os.path.basename(source))
+    if match:
+        return match.group(1).lower()
+    match = PUBLICATION_PATTERN.search(text)
+    return f"p{match.group(1).lower()}" if match else None
+
+def extract_entity_type(text: str) -> Optional[str]:
+    """Most specific taxpayer entity type mentioned in text"""
+    for entity_type, pattern in ENTITY_TYPES:
+        if pattern.search(text):
+            return entity_type
+    return None
+
+def facets_from_query(text: str, facets: Iterable[str] = ("tax_year", "forms")) -> Dict[str, Any]:
+    """Infer retrieval filters from a scenario or question.
+
+    Args:
+        text: Scenario and/or question text
+        facets: Facets to infer; entity type and publication are off by default
+            because scenarios rarely name them reliably
+
+    Returns:
+        Filter dictionary for ``HybridRetriever.retrieve`` (empty if nothing was found)
+    """
+    filters: Dict[str, Any] = {}
+    if "tax_year" in facets:
+        year = extract_tax_year(text)
+        if year:
+            filters["tax_year"] = year
+    if "forms" in facets:
+        forms = extract_forms(text)
+        if forms:
+            filters["forms"] = forms
+    if "publication" in facets:
+        publication = extract_publication(text)
+        if publication:
+            filters["publication"] = publication
+    if "entity_type" in facets:
+        entity_type = extract_entity_type(text)
+        if entity_type:
+            filters["entity_type"] = entity_type
+    return filters
+
+class MetadataExtractor:
+    """Extract facet metadata from chunks as they are ingested.
+
+    Tax year and publication are document-level facts that usually appear
+    only in a publication's header, so they are remembered per source and
+    inherited by later chunks of the same file.
+    """
+
+    def __init__(self):
+        self._documents: Dict[str, Dict[str, Any]] = {}
+
+    def extract(self, text: str, source: str = "") -> Dict[str, Any]:
+        """Facet metadata for one chunk, flattened for ChromaDB.
+
+        Forms are stored both as a comma-separated ``forms`` string and as one
+        boolean ``form_<name>`` key per form so they can be filtered with ``where``.
+        """
+        document = self._documents.setdefault(source, {})
+        if "tax_year" not in document:
+            year = extract_tax_year(os.path.basename(source), strong_only=False) or extract_tax_year(text, strong_only=True)
+            if year:
+                document["tax_year"] = year
+        if "publication" not in document:
+            publication = extract_publication(text, source)
+            if publication:
+                document["publication"] = publication
+
+        forms = extract_forms(text)
+        metadata: Dict[str, Any] = {
+            "tax_year": document.get("tax_year", 0),
+            "publication": document.get("publication", ""),
+            "entity_type": extract_entity_type(text) or "",
+            "forms": ",".join(forms)
+        }
+        for form in forms:
+            metadata[form_key(form)] = True
+        return metadata
+
+    def document_facets(self, source: str) -> Dict[str, Any]:
+        """Document-level facets (tax year, publication) found so far for a source"""
+        return dict(self._documents.get(source, {}))
+
+def _values(filters: Dict[str, Any], facet: str) -> List[str]:
+    """Filter values for a facet as index keys"""
+    value = filters.get(facet)
+    if value is None or value == "" or value == []:
+        return []
+    values = value if isinstance(value, (list, tuple, set)) else [value]
+    if facet == "forms":
+        return [normalize_form(str(v)) for v in values]
+    return [str(v) for v in values]
+
+def build_where(filters: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Translate filters into a ChromaDB ``where`` clause.
+
+    Facets are combined with AND; several values of one facet with OR.
+    """
+    clauses = []
+    for facet in FACETS:
+        values = filters.get(facet)
+        if values is None or values == "" or values == []:
+            continue
+        values = list(values) if isinstance(values, (list, tuple, set)) else [values]
+        if facet == "forms":
+            options = [{form_key(str(v)): True} for v in values]
+        else:
+            options = [{facet: v} for v in values]
+        clauses.append(options[0] if len(options) == 1 else {"$or": options})
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+class FacetIndex:
+    """Inverted index from facet values to chunk IDs.
+
+    Built at ingestion time and persisted next to the vector database, it
+    answers "which chunks match these filters" without touching ChromaDB, so
+    the retriever can size the filtered search space before searching it.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        """Initialize the index.
+
+        Args:
+            path: JSON file the index is persisted to (None keeps it in memory)
+        """
+        self.path = Path(path) if path else None
+        self.index: Dict[str, Dict[str, Set[str]]] = {facet: {} for facet in FACETS}
+        self._postings: Dict[str, List[Tuple[str, str]]] = {}  # chunk ID -> (facet, value) entries
+        self.dirty = False
+        if self.path and self.path.exists():
+            self.load()
+
+    def load(self) -> None:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self.index = {facet: {value: set(ids) for value, ids in data.get(facet, {}).items()} for facet in FACETS}
+            self._postings = {}
+            for facet, values in self.index.items():
+                for value, ids in values.items():
+                    for chunk_id in ids:
+                        self._postings.setdefault(chunk_id, []).append((facet, value))
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable facet index {self.path}: {e}")
+
+    def save(self) -> None:
+        """Persist the index if it changed"""
+        if not self.path or not self.dirty:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({facet: {value: sorted(ids) for value, ids in values.items()}
+                       for facet, values in self.index.items()}, f)
+        os.replace(tmp_path, self.path)
+        self.dirty = False
+
+    def add(self, chunk_id: str, metadata: Dict[str, Any]) -> None:
+        """Index one chunk's facet metadata, replacing any earlier entry for the same ID"""
+        if chunk_id in self._postings:
+            self.remove([chunk_id])
+        postings = []
+        for facet in FACETS:
+            if facet == "forms":
+                values = [normalize_form(f) for f in metadata.get("forms", "").split(",") if f]
+            else:
+                values = [str(metadata[facet])] if metadata.get(facet) else []
+            for value in values:
+                self.index[facet].setdefault(value, set()).add(chunk_id)
+                postings.append((facet, value))
+        self._postings[chunk_id] = postings
+        self.dirty = True
+
+    def remove(self, chunk_ids: Iterable[str]) -> None:
+        """Drop chunks from the index"""
+        for chunk_id in chunk_ids:
+            for facet, value in self._postings.pop(chunk_id, []):
+                ids = self.index[facet].get(value)
+                if ids is not None:
+                    ids.discard(chunk_id)
+                    if not ids:
+                        del self.index[facet][value]
+        self.dirty = True
+
+    def values(self, facet: str) -> List[str]:
+        """Known values of a facet"""
+        return sorted(self.index.get(facet, {}))
+
+    def match(self, filters: Dict[str, Any]) -> Optional[Set[str]]:
+        """Chunk IDs matching all filters, or None if no filter applies"""
+        matched: Optional[Set[str]] = None
+        for facet in FACETS:
+            values = _values(filters, facet)
+            if not values:
+                continue
+            ids: Set[str] = set()
+            for value in values:
+                ids |= self.index[facet].get(value, set())
+            matched = ids if matched is None else matched & ids
+            if not matched:
+                return set()
+        return matched
+
+    def relax(self, filters: Dict[str, Any], min_matches: int) -> Dict[str, Any]:
+        """Drop the least essential facets until at least ``min_matches`` chunks match.
+
+        Returns:
+            The (possibly reduced) filters; empty if even the tax year alone matches too few
+        """
+        filters = {facet: value for facet, value in filters.items() if _values(filters, facet)}
+        for facet in RELAX_ORDER:
+            matched = self.match(filters)
+            if matched is None or len(matched) >= min_matches:
+                return filters
+            if facet in filters:
+                logger.debug(f"Relaxing {facet} filter: only {len(matched)} chunks match")
+                del filters[facet]
+        return filters
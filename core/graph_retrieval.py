@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+# Knowledge-graph retrieval for IRS Tax Analysis System
+
+import os
+import json
+import logging
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+from core.knowledge_graph import TaxKnowledgeGraph
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[logging.StreamHandler()]
+)
+logger = logging.getLogger("graph_retrieval")
+
+class MentionIndex:
+    """Inverted index from knowledge-graph node IDs to the chunks that mention them.
+
+    Persisted next to the vector database like the facet index, so graph
+    retrieval maps ranked entities to chunks without scanning the collection.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        """Initialize the index.
+
+        Args:
+            path: JSON file the index is persisted to (None keeps it in memory)
+        """
+        self.path = Path(path) if path else None
+        self.index: Dict[str, Set[str]] = {}
+        self._postings: Dict[str, List[str]] = {}  # chunk ID -> node IDs it mentions
+        self.dirty = False
+        if self.path and self.path.exists():
+            self.load()
+
+    def __len__(self) -> int:
+        return len(self._postings)
+
+    def exists(self) -> bool:
+        """Whether the index has been built and saved"""
+        return self.path is not None and self.path.exists()
+
+    def load(self) -> None:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self.index = {node_id: set(ids) for node_id, ids in data.items()}
+            self._postings = {}
+            for node_id, ids in self.index.items():
+                for chunk_id in ids:
+                    self._postings.setdefault(chunk_id, []).append(node_id)
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable mention index {self.path}: {e}")
+
+    def save(self) -> None:
+        """Persist the index if it changed"""
+        if not self.path or not self.dirty:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({node_id: sorted(ids) for node_id, ids in self.index.items()}, f)
+        os.replace(tmp_path, self.path)
+        self.dirty = False
+
+    def add(self, chunk_id: str, node_ids: Iterable[str]) -> None:
+        """Record the entities a chunk mentions, replacing any earlier entry for the same ID"""
+        if chunk_id in self._postings:
+            self.remove([chunk_id])
+        node_ids = list(dict.fromkeys(node_ids))
+        for node_id in node_ids:
+            self.index.setdefault(node_id, set()).add(chunk_id)
+        if node_ids:
+            self._postings[chunk_id] = node_ids
+        self.dirty = True
+
+    def remove(self, chunk_ids: Iterable[str]) -> None:
+        """Drop chunks from the index"""
+        for chunk_id in chunk_ids:
+            for node_id in self._postings.pop(chunk_id, []):
+                ids = self.index.get(node_id)
+                if ids is not None:
+                    ids.discard(chunk_id)
+                    if not ids:
+                        del self.index[node_id]
+        self.dirty = True
+
+    def chunks(self, node_id: str) -> Set[str]:
+        """IDs of the chunks mentioning an entity"""
+        return self.index.get(node_id, set())
+
+class GraphRetriever:
+    """Rank chunks by the personalized PageRank of the entities they mention.
+
+    Entities named in the query seed a PageRank walk over the knowledge graph's
+    sparse adjacency (see ``GraphMatrix.personalized_pagerank``). The top-ranked
+    entities are mapped to chunks through the mention index and each chunk
+    scores the sum of its entities' ranks, with entities mentioned almost
+    everywhere discounted by their document frequency.
+    """
+
+    def __init__(self, kg: TaxKnowledgeGraph, mentions: MentionIndex, alpha: float = 0.85,
+                 top_entities: int = 50):
+        """Initialize the graph retriever.
+
+        Args:
+            kg: Knowledge graph supplying entities and edges
+            mentions: Entity -> chunk index over the vector collection
+            alpha: PageRank damping (probability of following an edge rather than restarting)
+            top_entities: Highest-ranked entities mapped back to chunks per query
+        """
+        self.kg = kg
+        self.mentions = mentions
+        self.alpha = alpha
+        self.top_entities = top_entities
+
+    def index_chunks(self, chunks: Iterable[Tuple[str, str]]) -> int:
+        """Link the entities mentioned in (chunk ID, text) pairs and save the index
+
+        Returns:
+            Number of chunks that mention at least one entity
+        """
+        linked = 0
+        for chunk_id, text in chunks:
+            node_ids = self.kg.find_mentions(text or "")
+            self.mentions.add(chunk_id, node_ids)
+            linked += bool(node_ids)
+        # Saved even when nothing links, so the collection is not rescanned
+        self.mentions.dirty = True
+        self.mentions.save()
+        logger.info(f"Linked {linked} chunks to knowledge graph entities")
+        return linked
+
+    def rank_entities(self, query: str) -> List[Tuple[str, float]]:
+        """Entities ranked by personalized PageRank from those named in the query"""
+        seeds = self.kg.find_mentions(query)
+        if not seeds:
+            return []
+        matrix = self.kg.to_matrix()
+        scores = matrix.personalized_pagerank(seeds, alpha=self.alpha)
+        count = min(self.top_entities, int(np.count_nonzero(scores)))
+        if count == 0:
+            return []
+        top = np.argpartition(-scores, count - 1)[:count]
+        top = top[np.argsort(-scores[top])]
+        return [(matrix.node_ids[i], float(scores[i])) for i in top]
+
+    def rank_chunks(self, query: str, k: int = 10) -> List[Tuple[str, float]]:
+        """Top-k (chunk ID, score) pairs for a query; empty if it names no known entity"""
+        scores: Dict[str, float] = {}
+        for node_id, rank in self.rank_entities(query):
+            chunk_ids = self.mentions.chunks(node_id)
+            if not chunk_ids:
+                continue
+            weight = rank / np.log2(1 + len(chunk_ids))
+            for chunk_id in chunk_ids:
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + weight
+        return sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:k]
+
+def reciprocal_rank_fusion(rankings: List[List[str]], weights: Optional[List[float]] = None,
+                           k: int = 60) -> List[Tuple[str, float]]:
+    """Fuse ranked ID lists with weighted reciprocal rank fusion
+
+    Args:
+        rankings: ID lists, best first
+        weights: Weight of each list (equal by default)
+        k: Rank offset damping the influence of the top positions
+
+    Returns:
+        (ID, fused score) pairs, best first
+    """
+    weights = weights if weights is not None else [1.0] * len(rankings)
+    fused: Dict[str, float] = {}
+    for ranking, weight in zip(rankings, weights):
+        for rank, item in enumerate(ranking):
+            fused[item] = fused.get(item, 0.0) + weight / (k + rank + 1)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+# Static exports of knowledge graph views for IRS Tax Analysis System
+
+import os
+import json
+import html
+import logging
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+import networkx as nx
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[logging.StreamHandler()]
+)
+logger = logging.getLogger("graph_view")
+
+# Formats written without rendering (by file extension)
+EXPORT_FORMATS = (".html", ".graphml", ".gexf")
+
+HTML_TEMPLATE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>{title}</title>
+<style>
+body {{ margin: 0; font-family: sans-serif; }}
+#bar {{ padding: 6px 10px; background: #f4f4f4; border-bottom: 1px solid #ddd; font-size: 13px; }}
+svg {{ width: 100vw; height: calc(100vh - 34px); cursor: grab; }}
+line {{ stroke: #999; stroke-opacity: 0.7; }}
+line.highlight {{ stroke: red; stroke-width: 2; }}
+circle {{ stroke: #fff; stroke-width: 1; }}
+circle.highlight {{ stroke: red; stroke-width: 3; }}
+text {{ font-size: 9px; pointer-events: none; }}
+.hidden text {{ display: none; }}
+</style>
+</head>
+<body>
+<div id="bar">{title} &mdash; {nodes} entities, {edges} relations &middot; scroll to zoom, drag to pan, hover for details
+&middot; <label><input type="checkbox" id="labels" {labels_checked}> labels</label> &middot; {legend}</div>
+<svg id="view" viewBox="0 0 {size} {size}" class="{svg_class}">
+<g>
+{edge_elements}
+</g>
+<g>
+{node_elements}
+</g>
+</svg>
+<script>
+const svg = document.getElementById("view");
+let box = svg.viewBox.baseVal, drag = null;
+svg.addEventListener("wheel", e => {{
+  e.preventDefault();
+  const scale = e.deltaY > 0 ? 1.15 : 1 / 1.15, rect = svg.getBoundingClientRect();
+  const x = box.x + (e.clientX - rect.left) / rect.width * box.width;
+  const y = box.y + (e.clientY - rect.top) / rect.height * box.height;
+  box.x = x - (x - box.x) * scale; box.y = y - (y - box.y) * scale;
+  box.width *= scale; box.height *= scale;
+}});
+svg.addEventListener("mousedown", e => {{ drag = [e.clientX, e.clientY]; }});
+window.addEventListener("mouseup", () => {{ drag = null; }});
+window.addEventListener("mousemove", e => {{
+  if (!drag) return;
+  const rect = svg.getBoundingClientRect();
+  box.x -= (e.clientX - drag[0]) / rect.width * box.width;
+  box.y -= (e.clientY - drag[1]) / rect.height * box.height;
+  drag = [e.clientX, e.clientY];
+}});
+document.getElementById("labels").addEventListener("change", e => svg.classList.toggle("hidden", !e.target.checked));
+</script>
+</body>
+</html>
+"""
+
+def type_colors(types: Iterable[str]) -> Dict[str, str]:
+    """Hex colour per entity type from matplotlib's tab20 palette"""
+    import matplotlib.pyplot as plt
+    from matplotlib.colors import to_hex
+    palette = plt.cm.tab20.colors
+    return {entity_type: to_hex(palette[i % len(palette)]) for i, entity_type in enumerate(sorted(types))}
+
+def write_html(view: nx.MultiDiGraph, pos: Dict[str, Tuple[float, float]], path: str,
+               title: str = "Tax Knowledge Graph", highlight_nodes: Iterable[str] = (),
+               highlight_edges: Iterable[Tuple[str, str]] = (), show_labels: bool = True, size: int = 1000) -> None:
+    """Write a graph view as a self-contained HTML page with an SVG drawing.
+
+    The page needs no network access: zooming, panning and the label toggle
+    are a few lines of inline script, and entity details are SVG tooltips.
+    """
+    xs = [x for x, _ in pos.values()] or [0.0]
+    ys = [y for _, y in pos.values()] or [0.0]
+    span = max(max(xs) - min(xs), max(ys) - min(ys)) or 1.0
+    margin = 0.05 * size
+
+    def point(node_id: str) -> Tuple[float, float]:
+        x, y = pos[node_id]
+        return (margin + (x - min(xs)) / span * (size - 2 * margin),
+                margin + (max(ys) - y) / span * (size - 2 * margin))
+
+    highlight_nodes, highlight_edges = set(highlight_nodes), set(highlight_edges)
+    relations: Dict[Tuple[str, str], list] = {}
+    for u, v, relation in view.edges(keys=True):
+        relations.setdefault((u, v), []).append(relation)
+    edge_elements = []
+    for (u, v), names in relations.items():
+        (x1, y1), (x2, y2) = point(u), point(v)
+        css = ' class="highlight"' if (u, v) in highlight_edges else ""
+        tooltip = html.escape(f"{view.nodes[u].get('name', u)} --[{', '.join(names)}]--> {view.nodes[v].get('name', v)}")
+        edge_elements.append(f'<line x1="{x1:.1f}" y1="{y1:.1f}" x2="{x2:.1f}" y2="{y2:.1f}"{css}><title>{tooltip}</title></line>')
+
+    colors = type_colors({attrs.get("type", "unknown") for _, attrs in view.nodes(data=True)})
+    node_elements = []
+    for node_id, attrs in view.nodes(data=True):
+        x, y = point(node_id)
+        name = attrs.get("name", node_id)
+        css = ' class="highlight"' if node_id in highlight_nodes or name in highlight_nodes else ""
+        details = json.dumps(attrs.get("attributes", {}), default=str) if attrs.get("attributes") else ""
+        tooltip = html.escape(f"{name} ({attrs.get('type', 'unknown')}) {details}".strip())
+        node_elements.append(
+            f'<circle cx="{x:.1f}" cy="{y:.1f}" r="{4 + min(view.degree(node_id), 12) / 2:.1f}" '
+            f'fill="{colors[attrs.get("type", "unknown")]}"{css}><title>{tooltip}</title></circle>'
+            f'<text x="{x + 6:.1f}" y="{y + 3:.1f}">{html.escape(str(name))}</text>')
+
+    legend = " ".join(f'<span style="color:{color}">&#9679;</span> {html.escape(entity_type)}'
+                      for entity_type, color in colors.items())
+    page = HTML_TEMPLATE.format(
+        title=html.escape(title), nodes=view.number_of_nodes(), edges=view.number_of_edges(), legend=legend,
+        size=size, labels_checked="checked" if show_labels else "", svg_class="" if show_labels else "hidden",
+        edge_elements="\n".join(edge_elements), node_elements="\n".join(node_elements))
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(page)
+
+def write_graph_file(view: nx.MultiDiGraph, path: str) -> None:
+    """Write a graph view as GraphML or GEXF (for Gephi, yEd, Cytoscape)
+
+    Entity and relation attribute dicts are stored as JSON strings, since
+    both formats only hold scalar attributes.
+    """
+    export = nx.MultiDiGraph()
+    for node_id, attrs in view.nodes(data=True):
+        export.add_node(node_id, name=attrs.get("name", node_id), type=attrs.get("type", "unknown"),
+                        attributes=json.dumps(attrs.get("attributes", {}), default=str))
+    for u, v, relation, attrs in view.edges(keys=True, data=True):
+        export.add_edge(u, v, key=relation, relation=relation,
+                        attributes=json.dumps(attrs.get("attributes", {}), default=str))
+    if path.endswith(".gexf"):
+        nx.write_gexf(export, path)
+    else:
+        nx.write_graphml(export, path)
+
+def export_view(view: nx.MultiDiGraph, path: str, pos: Optional[Dict[str, Any]] = None, **kwargs) -> None:
+    """Write a view in the format its extension names (see EXPORT_FORMATS)"""
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format {extension!r}; use one of {', '.join(EXPORT_FORMATS)}")
+    if extension == ".html":
+        write_html(view, pos, path, **kwargs)
+    else:
+        write_graph_file(view, path)
+    logger.info(f"Exported {view.number_of_nodes()} entities and {view.number_of_edges()} relations to {path}")
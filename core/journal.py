@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+# Run journal for resumable bulk processing in IRS Tax Analysis System
+
+import time
+import uuid
+import sqlite3
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Any
+
+from core.rag import ROOT_DIR
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[logging.StreamHandler()]
+)
+logger = logging.getLogger("journal")
+
+JOURNAL_PATH = ROOT_DIR / "data" / "runs" / "journal.db"
+DOCUMENT_UNIT = -1  # Question index used for document-level stages (feedback, persist)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    models TEXT NOT NULL,
+    status TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS units (
+    run_id TEXT NOT NULL,
+    model TEXT NOT NULL,
+    document TEXT NOT NULL,
+    question INTEGER NOT NULL,
+    stage TEXT NOT NULL,
+    status TEXT NOT NULL,
+    input_hash TEXT,
+    output TEXT,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 1,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (run_id, model, document, question, stage)
+);
+"""
+
+def content_hash(*parts: str) -> str:
+    """Short hash identifying the input a unit was computed from"""
+    digest = hashlib.sha1()
+    for part in parts:
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+class RunJournal:
+    """Record completed (model, document, question, stage) units of a run in SQLite.
+
+    Each unit is committed as soon as it finishes, so after a crash a resumed
+    run skips everything that completed and retries only failed or missing
+    units. Units remember a hash of their input; if a document or its
+    answers changed, the stored output is not reused.
+    """
+
+    def __init__(self, path: Optional[str] = None, run_id: Optional[str] = None,
+                 resume: bool = False, models: Optional[List[str]] = None):
+        """Open the journal and start or resume a run.
+
+        Args:
+            path: SQLite file (defaults to data/runs/journal.db)
+            run_id: Run to resume or create
+            resume: Resume ``run_id``, or the latest unfinished run if no ID is given
+            models: Models of the run, recorded for new runs
+        """
+        self.path = Path(path) if path else JOURNAL_PATH
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+        if resume and run_id is None:
+            row = self._conn.execute(
+                "SELECT run_id FROM runs WHERE status != 'complete' ORDER BY updated_at DESC LIMIT 1"
+            ).fetchone()
+            run_id = row[0] if row else None
+            if run_id is None:
+                logger.info("No unfinished run to resume; starting a new run")
+
+        exists = run_id is not None and self._conn.execute(
+            "SELECT 1 FROM runs WHERE run_id = ?", (run_id,)).fetchone() is not None
+        if resume and exists:
+            self.run_id = run_id
+            done = self._conn.execute("SELECT COUNT(*) FROM units WHERE run_id = ? AND status = 'done'",
+                                      (run_id,)).fetchone()[0]
+            logger.info(f"Resuming run {run_id}: {done} units already complete")
+        else:
+            self.run_id = run_id or time.strftime("%Y%m%d-%H%M%S-") + uuid.uuid4().hex[:6]
+            now = time.time()
+            self._conn.execute("INSERT OR REPLACE INTO runs VALUES (?, ?, 'running', ?, ?)",
+                               (self.run_id, ",".join(models or []), now, now))
+            logger.info(f"Started run {self.run_id}")
+
+    def _unit(self, model: str, document: str, stage: str, question: int) -> Optional[tuple]:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT status, input_hash, output FROM units "
+                "WHERE run_id = ? AND model = ? AND document = ? AND question = ? AND stage = ?",
+                (self.run_id, model, document, question, stage)
+            ).fetchone()
+
+    def is_done(self, model: str, document: str, stage: str, question: int = DOCUMENT_UNIT,
+                input_hash: Optional[str] = None) -> bool:
+        """Whether a unit completed (for the same input, if a hash is given)"""
+        row = self._unit(model, document, stage, question)
+        return row is not None and row[0] == "done" and (input_hash is None or row[1] == input_hash)
+
+    def get_output(self, model: str, document: str, stage: str, question: int = DOCUMENT_UNIT,
+                   input_hash: Optional[str] = None) -> Optional[str]:
+        """Stored output of a completed unit, or None if it has to be (re)computed"""
+        row = self._unit(model, document, stage, question)
+        if row is None or row[0] != "done" or (input_hash is not None and row[1] != input_hash):
+            return None
+        return row[2]
+
+    def record(self, model: str, document: str, stage: str, question: int = DOCUMENT_UNIT,
+               output: Optional[str] = None, error: Optional[str] = None,
+               input_hash: Optional[str] = None) -> None:
+        """Record a unit as done (no error) or failed, committing immediately"""
+        status = "failed" if error is not None else "done"
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO units (run_id, model, document, question, stage, status, input_hash, output, error, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (run_id, model, document, question, stage) DO UPDATE SET "
+                "status = excluded.status, input_hash = excluded.input_hash, output = excluded.output, "
+                "error = excluded.error, attempts = units.attempts + 1, updated_at = excluded.updated_at",
+                (self.run_id, model, document, question, stage, status, input_hash, output, error, now)
+            )
+            self._conn.execute("UPDATE runs SET updated_at = ? WHERE run_id = ?", (now, self.run_id))
+
+    def summary(self) -> Dict[str, Any]:
+        """Unit counts per stage and status for this run"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT stage, status, COUNT(*) FROM units WHERE run_id = ? GROUP BY stage, status", (self.run_id,)
+            ).fetchall()
+        summary: Dict[str, Dict[str, int]] = {}
+        for stage, status, count in rows:
+            summary.setdefault(stage, {})[status] = count
+        return summary
+
+    def failures(self) -> List[Dict[str, Any]]:
+        """Failed units of this run"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT model, document, question, stage, error, attempts FROM units "
+                "WHERE run_id = ? AND status = 'failed' ORDER BY model, document, question", (self.run_id,)
+            ).fetchall()
+        return [dict(zip(("model", "document", "question", "stage", "error", "attempts"), row)) for row in rows]
+
+    def finish(self) -> None:
+        """Mark the run complete if nothing failed, so --resume skips it"""
+        status = "incomplete" if self.failures() else "complete"
+        with self._lock:
+            self._conn.execute("UPDATE runs SET status = ?, updated_at = ? WHERE run_id = ?",
+                               (status, time.time(), self.run_id))
+        logger.info(f"Run {self.run_id} {status}: {self.summary()}")
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
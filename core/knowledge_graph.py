@@ -3,11 +3,19 @@
 # Knowledge Graph integration for IRS Tax Analysis System
 
 import os
+import heapq
+import random
 import re
+import time
 import logging
 import json
-from typing import Dict, List, Set, Optional, Tuple, Union, Any
+import sqlite3
+import threading
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, FrozenSet, Iterable, Iterator, List, Set, Optional, Tuple, Union, Any
 from pathlib import Path
+import numpy as np
 import networkx as nx
 import matplotlib.pyplot as plt
 import unittest
@@ -20,6 +28,41 @@ logging.basicConfig(
 )
 logger = logging.getLogger("knowledge_graph")
 
+GRAPH_FORMAT_VERSION = 2  # Version 1 files keyed nodes by bare name
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS nodes (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    type TEXT NOT NULL,
+    attributes TEXT NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS edges (
+    source TEXT NOT NULL,
+    target TEXT NOT NULL,
+    relation TEXT NOT NULL,
+    attributes TEXT NOT NULL,
+    PRIMARY KEY (source, target, relation)
+) WITHOUT ROWID;
+"""
+
+def normalize_name(name: str) -> str:
+    """Normalize an entity name for lookups (case and whitespace insensitive)"""
+    return " ".join(name.split()).casefold()
+
+# Word tokens for matching entity names in free text ("1040-SR", "home office")
+MENTION_TOKEN = re.compile(r"\w[\w\-]*")
+
+def name_trigrams(normalized: str) -> FrozenSet[str]:
+    """Character trigrams of a normalized name, padded so word starts count"""
+    padded = f"  {normalized} "
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+def make_node_id(entity_type: str, name: str) -> str:
+    """Composite node ID, so equal names of different types do not collide"""
+    return f"{entity_type}:{name.strip()}"
+
 class TaxEntity:
     """Class representing a tax entity in the knowledge graph."""
     
@@ -54,22 +97,139 @@ class TaxEntity:
     def __str__(self):
         return f"{self.name} ({self.entity_type})"
 
+class SQLiteGraphStore:
+    """Incremental SQLite storage for a knowledge graph.
+    
+    Only nodes and edges changed since the last save are written, each save
+    in a single transaction. The write-ahead log acts as the append-only
+    mutation log; it is checkpointed into the main file, and the file
+    vacuumed when it has many free pages, every ``compact_every`` saves.
+    """
+    
+    def __init__(self, path: str, compact_every: int = 50):
+        self.path = path
+        self.compact_every = compact_every
+        self._saves = 0
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+    
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(SQLITE_SCHEMA)
+        return self._conn
+    
+    def read(self) -> Tuple[List[Tuple[str, str, str, str]], List[Tuple[str, str, str, str]]]:
+        """All node rows (id, name, type, attributes) and edge rows (source, target, relation, attributes)"""
+        with self._lock:
+            conn = self._connection()
+            return (conn.execute("SELECT id, name, type, attributes FROM nodes").fetchall(),
+                    conn.execute("SELECT source, target, relation, attributes FROM edges").fetchall())
+    
+    def write(self, nodes: List[Tuple[str, str, str, str]], edges: List[Tuple[str, str, str, str]]) -> None:
+        """Upsert changed rows atomically"""
+        with self._lock:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.executemany("INSERT OR REPLACE INTO nodes VALUES (?, ?, ?, ?)", nodes)
+                conn.executemany("INSERT OR REPLACE INTO edges VALUES (?, ?, ?, ?)", edges)
+                conn.execute("INSERT INTO meta VALUES ('revision', '1') "
+                             "ON CONFLICT (key) DO UPDATE SET value = CAST(value AS INTEGER) + 1")
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            self._saves += 1
+            if self._saves % self.compact_every == 0:
+                self._compact(conn)
+    
+    def compact(self) -> None:
+        """Fold the write-ahead log into the database file and reclaim free pages"""
+        with self._lock:
+            self._compact(self._connection(), force=True)
+    
+    def _compact(self, conn: sqlite3.Connection, force: bool = False) -> None:
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        pages = conn.execute("PRAGMA page_count").fetchone()[0]
+        free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        if force or (pages and free / pages > 0.25):
+            conn.execute("VACUUM")
+        logger.debug(f"Compacted {self.path} ({free} of {pages} pages were free)")
+    
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
 class TaxKnowledgeGraph:
     """Knowledge Graph for tax domain knowledge."""
     
-    def __init__(self, save_path: str = "./data/knowledge_graph.json"):
+    def __init__(self, save_path: str = "./data/knowledge_graph.db"):
         """Initialize the knowledge graph.
         
+        The graph is read from disk on first use rather than on construction.
+        Paths ending in ``.json`` use the JSON file format, rewritten on every
+        save; any other path is an incremental SQLite store. A SQLite store
+        that does not exist yet imports the ``.json`` file beside it.
+        
         Args:
             save_path: Path to save/load the knowledge graph
         """
-        self.graph = nx.DiGraph()
+        self._graph: Optional[nx.MultiDiGraph] = None
         self.save_path = save_path
-        self.entity_types = set()
-        self.relation_types = set()
-        
-        # Load existing graph if available
-        self.load()
+        self._entity_types: Set[str] = set()
+        self._relation_types: Set[str] = set()
+        self._store = None if save_path.endswith(".json") else SQLiteGraphStore(save_path)
+        # Nodes and (source, target, relation) edges changed since the last save
+        self._dirty_nodes: Set[str] = set()
+        self._dirty_edges: Set[Tuple[str, str, str]] = set()
+        # Incremented on every change, so derived structures know when to rebuild
+        self.version = 0
+        self._matrix = None
+        # (version, seed, node IDs) -> node positions of rendered views
+        self._layouts: Dict[Tuple, Dict[str, Any]] = {}
+        # (type, normalized name) -> node ID, and normalized name -> node IDs for untyped lookups
+        self._index: Dict[Tuple[str, str], str] = {}
+        self._by_name: Dict[str, List[str]] = {}
+        # Trigram -> normalized names and normalized name -> trigrams, for fuzzy lookups;
+        # built on the first fuzzy lookup and maintained on insert from then on
+        self._trigrams: Optional[Dict[str, Set[str]]] = None
+        self._name_grams: Dict[str, FrozenSet[str]] = {}
+        # relation -> node ID -> neighbour node IDs, for direct relation-typed lookups
+        self._out: Dict[str, Dict[str, List[str]]] = {}
+        self._in: Dict[str, Dict[str, List[str]]] = {}
+        # (version, longest entity name in words) for mention matching
+        self._mention_span = (-1, 0)
+    
+    def _ensure_loaded(self) -> nx.MultiDiGraph:
+        """Load the graph from disk on first use and return it"""
+        if self._graph is None:
+            # Parallel edges are keyed by relation, so a pair can hold several relations
+            self._graph = nx.MultiDiGraph()
+            self.load()
+        return self._graph
+    
+    @property
+    def graph(self) -> nx.MultiDiGraph:
+        """The graph, loaded from disk on first access"""
+        return self._ensure_loaded()
+    
+    @property
+    def entity_types(self) -> Set[str]:
+        self._ensure_loaded()
+        return self._entity_types
+    
+    @property
+    def relation_types(self) -> Set[str]:
+        self._ensure_loaded()
+        return self._relation_types
     
     def add_entity(self, entity: TaxEntity) -> bool:
         """Add an entity to the graph.
@@ -80,12 +240,210 @@ class TaxKnowledgeGraph:
         Returns:
             True if entity was added, False if it already existed
         """
-        if entity.name not in [n for n in self.graph.nodes if self.graph.nodes[n].get("type") == entity.entity_type]:
-            self.graph.add_node(entity.name, type=entity.entity_type, attributes=entity.attributes)
-            self.entity_types.add(entity.entity_type)
-            logger.debug(f"Added entity: {entity}")
-            return True
-        return False
+        graph = self.graph
+        key = (entity.entity_type, normalize_name(entity.name))
+        if key in self._index:
+            return False
+        node_id = make_node_id(entity.entity_type, entity.name)
+        graph.add_node(node_id, name=entity.name, type=entity.entity_type, attributes=entity.attributes)
+        self._index_node(node_id, entity.name, entity.entity_type)
+        self._entity_types.add(entity.entity_type)
+        self._dirty_nodes.add(node_id)
+        self.version += 1
+        logger.debug(f"Added entity: {entity}")
+        return True
+    
+    def add_entities(self, entities: Iterable[Union[TaxEntity, Tuple]]) -> int:
+        """Add many entities at once.
+        
+        The whole batch is validated before anything is inserted, duplicates
+        (within the batch or already in the graph) are skipped, and the graph
+        and its indexes are updated in one step. Nothing is saved; use
+        ``batch()`` to persist once the batch commits.
+        
+        Args:
+            entities: TaxEntity objects or (name, type[, attributes]) tuples
+            
+        Returns:
+            Number of entities added
+            
+        Raises:
+            ValueError: If any item is not a valid entity (nothing is added)
+        """
+        self._ensure_loaded()
+        pending: Dict[Tuple[str, str], Tuple[str, str, Dict[str, Any]]] = {}
+        invalid = []
+        for item in entities:
+            entity = self._coerce_entity(item)
+            if entity is None:
+                invalid.append(item)
+                continue
+            key = (entity[1], normalize_name(entity[0]))
+            if key not in self._index and key not in pending:
+                pending[key] = entity
+        if invalid:
+            raise ValueError(f"{len(invalid)} invalid entities in batch, e.g. {invalid[0]!r}")
+        return self._insert_entities(pending)
+    
+    @staticmethod
+    def _coerce_entity(item: Union[TaxEntity, Tuple]) -> Optional[Tuple[str, str, Dict[str, Any]]]:
+        """(name, type, attributes) of a batch item, or None if it is not a valid entity"""
+        if isinstance(item, TaxEntity):
+            name, entity_type, attributes = item.name, item.entity_type, item.attributes
+        elif isinstance(item, (tuple, list)) and 2 <= len(item) <= 3:
+            name, entity_type = item[0], item[1]
+            attributes = (item[2] if len(item) == 3 else None) or {}
+        else:
+            return None
+        valid = (isinstance(name, str) and name.strip() and isinstance(entity_type, str)
+                 and entity_type.strip() and isinstance(attributes, dict))
+        return (name, entity_type, attributes) if valid else None
+    
+    def _insert_entities(self, entities: Dict[Tuple[str, str], Tuple[str, str, Dict[str, Any]]]) -> int:
+        """Insert validated, new entities (keyed by type and normalized name) and index them in one step"""
+        if not entities:
+            return 0
+        nodes = []
+        for (entity_type, normalized), (name, _, attributes) in entities.items():
+            node_id = make_node_id(entity_type, name)
+            nodes.append((node_id, {"name": name, "type": entity_type, "attributes": attributes}))
+            self._index_node(node_id, name, entity_type, normalized)
+            self._dirty_nodes.add(node_id)
+            self._entity_types.add(entity_type)
+        self.graph.add_nodes_from(nodes)
+        self.version += 1
+        logger.debug(f"Added {len(nodes)} entities")
+        return len(nodes)
+    
+    def add_relations(self, relations: Iterable[Tuple]) -> int:
+        """Add many relations at once.
+        
+        Like ``add_entities``, the batch is validated first and inserted in
+        one step. Endpoints that are not in the graph are added, as with
+        ``add_relation``; relations that already exist are skipped.
+        
+        Args:
+            relations: (source, relation, target[, attributes]) tuples, with
+                endpoints given as TaxEntity objects, node IDs or names
+            
+        Returns:
+            Number of relations added
+            
+        Raises:
+            ValueError: If any item is not a valid relation (nothing is added)
+        """
+        self._ensure_loaded()
+        items = []
+        invalid = []
+        for item in relations:
+            if not isinstance(item, (tuple, list)) or not 3 <= len(item) <= 4:
+                invalid.append(item)
+                continue
+            source, relation, target = item[:3]
+            attributes = item[3] if len(item) == 4 else {}
+            endpoints_valid = all(self._coerce_entity(e if isinstance(e, TaxEntity) else (e, "unknown")) is not None
+                                  for e in (source, target))
+            if not endpoints_valid or not isinstance(relation, str) or not relation.strip() \
+                    or not isinstance(attributes, dict):
+                invalid.append(item)
+                continue
+            items.append((source, relation, target, attributes))
+        if invalid:
+            raise ValueError(f"{len(invalid)} invalid relations in batch, e.g. {invalid[0]!r}")
+        
+        # Add missing endpoints first, so names resolve to them below
+        missing: Dict[Tuple[str, str], Tuple[str, str, Dict[str, Any]]] = {}
+        for source, _, target, _ in items:
+            for endpoint in (source, target):
+                if self.resolve(endpoint) is None:
+                    entity = self._coerce_entity(endpoint if isinstance(endpoint, TaxEntity) else (endpoint, "unknown"))
+                    missing.setdefault((entity[1], normalize_name(entity[0])), entity)
+        self._insert_entities(missing)
+        
+        graph = self.graph
+        edges = {}
+        for source, relation, target, attributes in items:
+            key = (self.resolve(source), self.resolve(target), relation)
+            if key not in edges and not graph.has_edge(*key):
+                edges[key] = attributes
+        if not edges:
+            return 0
+        graph.add_edges_from((u, v, relation, {"relation": relation, "attributes": attributes})
+                             for (u, v, relation), attributes in edges.items())
+        for source_id, target_id, relation in edges:
+            self._index_edge(source_id, relation, target_id)
+        self._relation_types.update(relation for _, _, relation in edges)
+        self._dirty_edges.update(edges)
+        self.version += 1
+        logger.debug(f"Added {len(edges)} relations")
+        return len(edges)
+    
+    @contextmanager
+    def batch(self):
+        """Group changes into one commit.
+        
+        The graph is saved once when the block exits normally; if it raises,
+        nothing is saved and the changes stay pending in memory.
+        """
+        yield self
+        if not self.save():
+            raise IOError(f"Could not save knowledge graph to {self.save_path}")
+    
+    def _index_node(self, node_id: str, name: str, entity_type: str, normalized: Optional[str] = None) -> None:
+        normalized = normalized if normalized is not None else normalize_name(name)
+        self._index[(entity_type, normalized)] = node_id
+        if normalized not in self._by_name and self._trigrams is not None:
+            self._index_trigrams(normalized)
+        self._by_name.setdefault(normalized, []).append(node_id)
+    
+    def _index_trigrams(self, normalized: str) -> None:
+        grams = name_trigrams(normalized)
+        self._name_grams[normalized] = grams
+        for gram in grams:
+            self._trigrams.setdefault(gram, set()).add(normalized)
+    
+    def _index_edge(self, source_id: str, relation: str, target_id: str) -> None:
+        self._out.setdefault(relation, {}).setdefault(source_id, []).append(target_id)
+        self._in.setdefault(relation, {}).setdefault(target_id, []).append(source_id)
+    
+    def _rebuild_index(self) -> None:
+        self._index.clear()
+        self._by_name.clear()
+        self._trigrams = None
+        self._name_grams.clear()
+        self._out.clear()
+        self._in.clear()
+        for node_id, attrs in self._graph.nodes(data=True):
+            self._index_node(node_id, attrs.get("name", node_id), attrs.get("type", "unknown"))
+        for source_id, target_id, relation in self._graph.edges(keys=True):
+            self._index_edge(source_id, relation, target_id)
+    
+    def resolve(self, entity: Union[str, TaxEntity], entity_type: Optional[str] = None) -> Optional[str]:
+        """Find the node ID of an entity.
+        
+        Args:
+            entity: Entity, node ID or entity name
+            entity_type: Entity type for names shared by several types
+            
+        Returns:
+            Node ID, or None if the entity is not in the graph
+        """
+        graph = self.graph
+        if isinstance(entity, TaxEntity):
+            return self._index.get((entity.entity_type, normalize_name(entity.name)))
+        if entity_type is not None:
+            return self._index.get((entity_type, normalize_name(entity)))
+        if entity in graph:
+            return entity
+        candidates = self._by_name.get(normalize_name(entity))
+        if not candidates:
+            return None
+        if len(candidates) > 1:
+            logger.debug(f"Name {entity!r} matches {len(candidates)} entities; using {candidates[0]}")
+        return candidates[0]
+    
+    def _name(self, node_id: str) -> str:
+        return self.graph.nodes[node_id].get("name", node_id)
     
     def add_relation(self, source: Union[str, TaxEntity], relation: str, target: Union[str, TaxEntity], 
                     attributes: Dict[str, Any] = None) -> bool:
@@ -100,42 +458,155 @@ class TaxKnowledgeGraph:
         Returns:
             True if relation was added, False otherwise
         """
-        # Get entity names
-        source_name = source.name if isinstance(source, TaxEntity) else source
-        target_name = target.name if isinstance(target, TaxEntity) else target
+        # Resolve endpoints, adding entities that are not in the graph yet
+        source_id = self._resolve_or_add(source)
+        target_id = self._resolve_or_add(target)
         
         # Add relation
-        if not self.graph.has_edge(source_name, target_name) or self.graph[source_name][target_name].get("relation") != relation:
-            self.graph.add_edge(source_name, target_name, relation=relation, attributes=(attributes or {}))
-            self.relation_types.add(relation)
-            logger.debug(f"Added relation: {source_name} --[{relation}]--> {target_name}")
+        if not self.graph.has_edge(source_id, target_id, key=relation):
+            self.graph.add_edge(source_id, target_id, key=relation, relation=relation, attributes=(attributes or {}))
+            self._index_edge(source_id, relation, target_id)
+            self._relation_types.add(relation)
+            self._dirty_edges.add((source_id, target_id, relation))
+            self.version += 1
+            logger.debug(f"Added relation: {source_id} --[{relation}]--> {target_id}")
             return True
         return False
     
-    def get_entity(self, name: str, entity_type: Optional[str] = None) -> Optional[TaxEntity]:
+    def _resolve_or_add(self, entity: Union[str, TaxEntity]) -> str:
+        node_id = self.resolve(entity)
+        if node_id is None:
+            if not isinstance(entity, TaxEntity):
+                entity = TaxEntity(entity, "unknown")
+            self.add_entity(entity)
+            node_id = self.resolve(entity)
+        return node_id
+    
+    def get_entity(self, name: str, entity_type: Optional[str] = None, fuzzy: bool = False,
+                   min_score: float = 0.5) -> Optional[TaxEntity]:
         """Get an entity by name and optionally type.
         
+        Names match case and whitespace insensitively; with ``fuzzy`` the
+        closest name by trigram similarity is used when none matches exactly.
+        
         Args:
             name: Entity name
             entity_type: Optional entity type for disambiguation
+            fuzzy: Fall back to the best fuzzy match
+            min_score: Lowest similarity a fuzzy match may have
             
         Returns:
             TaxEntity if found, None otherwise
         """
-        if name not in self.graph.nodes:
+        node_id = self.resolve(name, entity_type)
+        if node_id is None and fuzzy:
+            matches = self.find_entities(name, entity_type, k=1, min_score=min_score)
+            node_id = matches[0][0] if matches else None
+        if node_id is None:
             return None
         
-        node_attrs = self.graph.nodes[name]
+        node_attrs = self.graph.nodes[node_id]
         
         if entity_type and node_attrs.get("type") != entity_type:
             return None
         
         return TaxEntity(
-            name=name,
+            name=node_attrs.get("name", node_id),
             entity_type=node_attrs.get("type", "unknown"),
             attributes=node_attrs.get("attributes", {})
         )
     
+    def find_entities(self, query: str, entity_type: Optional[str] = None, k: int = 5,
+                      min_score: float = 0.3, max_candidates: int = 64,
+                      max_postings: int = 5000) -> List[Tuple[str, float]]:
+        """Fuzzy entity lookup by character-trigram similarity.
+        
+        Candidates are the names sharing the query's rarest trigrams; only the
+        ``max_candidates`` with the most shared trigrams are scored exactly
+        (Dice coefficient), so a lookup touches a small part of the graph.
+        
+        Args:
+            query: Name to look up (e.g. "home ofice deduction")
+            entity_type: Only return entities of this type
+            k: Number of matches to return
+            min_score: Lowest similarity (0-1) returned
+            max_candidates: Names scored exactly
+            max_postings: Trigram postings counted before the rarer trigrams' candidates are used
+            
+        Returns:
+            (node ID, score) pairs, best first; an exact name match scores 1.0
+        """
+        self._ensure_loaded()
+        normalized = normalize_name(query)
+        if not normalized:
+            return []
+        if self._trigrams is None:
+            self._trigrams = {}
+            for name in self._by_name:
+                self._index_trigrams(name)
+        
+        # Rarest trigrams first; common ones add cost but hardly discriminate, so
+        # counting stops once the posting budget is spent
+        grams = name_trigrams(normalized)
+        postings = sorted((self._trigrams[gram] for gram in grams if gram in self._trigrams), key=len)
+        counts: Dict[str, int] = {}
+        visited = 0
+        for names in postings:
+            visited += len(names)
+            if visited > max_postings and counts:
+                break
+            for name in names:
+                # Filter by type before the candidate cut, so other types cannot crowd out matches
+                if entity_type is not None and (entity_type, name) not in self._index:
+                    continue
+                counts[name] = counts.get(name, 0) + 1
+        
+        scored = []
+        for name in heapq.nlargest(max_candidates, counts, key=counts.get):
+            name_grams = self._name_grams[name]
+            score = 2 * len(grams & name_grams) / (len(grams) + len(name_grams))
+            if score < min_score:
+                continue
+            for node_id in self._by_name[name]:
+                if entity_type is None or self._graph.nodes[node_id].get("type") == entity_type:
+                    scored.append((node_id, score))
+        scored.sort(key=lambda match: (-match[1], match[0]))
+        return scored[:k]
+    
+    def find_mentions(self, text: str, min_length: int = 3) -> List[str]:
+        """Find the entities named in a text.
+        
+        Word n-grams of the text are looked up in the normalized-name index,
+        longest first, so "home office deduction" links that entity rather
+        than a shorter one inside it.
+        
+        Args:
+            text: Text to scan (e.g. a question)
+            min_length: Shortest entity name, in characters, that is matched
+            
+        Returns:
+            Node IDs of the mentioned entities, in order of first mention
+        """
+        self._ensure_loaded()
+        if self._mention_span[0] != self.version:
+            longest = max((len(name.split()) for name in self._by_name), default=0)
+            self._mention_span = (self.version, longest)
+        span = self._mention_span[1]
+        
+        tokens = [token.casefold() for token in MENTION_TOKEN.findall(text)]
+        found: Dict[str, None] = {}
+        i = 0
+        while i < len(tokens):
+            for n in range(min(span, len(tokens) - i), 0, -1):
+                name = " ".join(tokens[i:i + n])
+                if len(name) >= min_length and name in self._by_name:
+                    found.update(dict.fromkeys(self._by_name[name]))
+                    i += n
+                    break
+            else:
+                i += 1
+        return list(found)
+    
     def get_relations(self, entity: Union[str, TaxEntity], relation_type: Optional[str] = None, 
                      outgoing: bool = True) -> List[Tuple[str, str, str]]:
         """Get relations for an entity.
@@ -146,166 +617,311 @@ class TaxKnowledgeGraph:
             outgoing: If True, get outgoing relations; if False, get incoming relations
             
         Returns:
-            List of (source, relation, target) tuples
+            List of (source name, relation, target name) tuples
         """
-        entity_name = entity.name if isinstance(entity, TaxEntity) else entity
+        node_id = self.resolve(entity)
         
-        if entity_name not in self.graph.nodes:
+        if node_id is None:
             return []
         
         results = []
+        entity_name = self._name(node_id)
+        
+        if relation_type is not None:
+            # Direct lookup in the relation's adjacency map
+            neighbours = (self._out if outgoing else self._in).get(relation_type, {}).get(node_id, [])
+            if outgoing:
+                return [(entity_name, relation_type, self._name(target)) for target in neighbours]
+            return [(self._name(source), relation_type, entity_name) for source in neighbours]
         
         if outgoing:
-            for _, target, data in self.graph.out_edges(entity_name, data=True):
-                rel = data.get("relation")
-                if relation_type is None or rel == relation_type:
-                    results.append((entity_name, rel, target))
+            for _, target, rel in self.graph.out_edges(node_id, keys=True):
+                results.append((entity_name, rel, self._name(target)))
         else:
-            for source, _, data in self.graph.in_edges(entity_name, data=True):
-                rel = data.get("relation")
-                if relation_type is None or rel == relation_type:
-                    results.append((source, rel, entity_name))
+            for source, _, rel in self.graph.in_edges(node_id, keys=True):
+                results.append((self._name(source), rel, entity_name))
         
         return results
     
-    def query(self, query_entity: Union[str, TaxEntity], query_relation: str, 
-             max_depth: int = 2) -> List[Dict[str, Any]]:
+    def query(self, query_entity: Union[str, TaxEntity], query_relation: Union[str, Iterable[str]], 
+             max_depth: int = 2, max_results: Optional[int] = None,
+             time_budget: Optional[float] = None, target_type: Optional[str] = None) -> List[List[Dict[str, Any]]]:
         """Query the knowledge graph.
         
         Args:
             query_entity: Starting entity or name for query
-            query_relation: Relation type to follow
+            query_relation: Relation type (or types) to follow
             max_depth: Maximum path depth to traverse
+            max_results: Stop after this many paths
+            time_budget: Stop after this many seconds
+            target_type: Only return paths ending at entities of this type
             
         Returns:
             List of result paths with entities and relations
         """
-        entity_name = query_entity.name if isinstance(query_entity, TaxEntity) else query_entity
+        return list(self.iter_query(query_entity, query_relation, max_depth, max_results, time_budget, target_type))
+    
+    def iter_query(self, query_entity: Union[str, TaxEntity], query_relation: Union[str, Iterable[str]],
+                   max_depth: int = 2, max_results: Optional[int] = None,
+                   time_budget: Optional[float] = None,
+                   target_type: Optional[str] = None) -> Iterator[List[Dict[str, Any]]]:
+        """Yield paths from an entity along the given relations, shortest first.
         
-        if entity_name not in self.graph.nodes:
-            return []
+        Paths are explored breadth-first without revisiting a node already on
+        the same path. Each explored step only stores its node and a pointer
+        to its parent step; path dictionaries are built for yielded results.
         
-        # Find all paths from entity following specified relation type up to max_depth
-        results = []
-        visited = set([entity_name])
-        self._dfs_query(entity_name, query_relation, [], results, visited, 0, max_depth)
+        Args: see ``query``
+            
+        Yields:
+            Lists of path entries (source, relation, target, types and attributes)
+        """
+        node_id = self.resolve(query_entity)
+        if node_id is None:
+            return
         
-        return results
+        relations = [query_relation] if isinstance(query_relation, str) else list(query_relation)
+        adjacency = [(relation, self._out.get(relation, {})) for relation in relations]
+        deadline = time.perf_counter() + time_budget if time_budget is not None else None
+        
+        # Steps are (node, relation, parent step, depth); step 0 is the query entity
+        steps: List[Tuple[str, Optional[str], int, int]] = [(node_id, None, -1, 0)]
+        frontier = deque([0])
+        found = 0
+        while frontier:
+            parent = frontier.popleft()
+            current, _, _, depth = steps[parent]
+            if depth >= max_depth:
+                continue
+            for relation, out in adjacency:
+                for target in out.get(current, ()):
+                    if deadline is not None and time.perf_counter() > deadline:
+                        logger.debug(f"Query from {node_id} stopped at its {time_budget}s time budget")
+                        return
+                    steps.append((target, relation, parent, depth + 1))
+                    step = len(steps) - 1
+                    if target_type is None or self.graph.nodes[target].get("type") == target_type:
+                        yield self._path(steps, step)
+                        found += 1
+                        if max_results is not None and found >= max_results:
+                            return
+                    if not self._on_path(steps, parent, target):
+                        frontier.append(step)
+    
+    @staticmethod
+    def _on_path(steps: List[Tuple[str, Optional[str], int, int]], step: int, node_id: str) -> bool:
+        """Whether a node already appears on the path ending at ``step``"""
+        while step >= 0:
+            if steps[step][0] == node_id:
+                return True
+            step = steps[step][2]
+        return False
+    
+    def _path(self, steps: List[Tuple[str, Optional[str], int, int]], step: int) -> List[Dict[str, Any]]:
+        """Materialize the path ending at ``step`` by following parent pointers"""
+        path = []
+        while steps[step][2] >= 0:
+            target, relation, parent, _ = steps[step]
+            source = steps[parent][0]
+            path.append({
+                "source": self._name(source),
+                "relation": relation,
+                "target": self._name(target),
+                "source_id": source,
+                "target_id": target,
+                "source_type": self.graph.nodes[source].get("type"),
+                "target_type": self.graph.nodes[target].get("type"),
+                "attributes": self.graph[source][target][relation].get("attributes", {})
+            })
+            step = parent
+        path.reverse()
+        return path
     
-    def _dfs_query(self, current: str, target_relation: str, current_path: List[Dict[str, Any]], 
-                  results: List[Dict[str, Any]], visited: Set[str], depth: int, max_depth: int) -> None:
-        """Recursive depth-first search for query.
+    def to_matrix(self):
+        """Per-relation CSR adjacency matrices of the graph (see core.graph_matrix).
         
-        Args:
-            current: Current entity name
-            target_relation: Relation type to follow
-            current_path: Current path being explored
-            results: List to collect result paths
-            visited: Set of visited entities
-            depth: Current depth
-            max_depth: Maximum depth to explore
+        The export is cached and rebuilt only after the graph changes.
         """
-        if depth > max_depth:
-            return
+        from core.graph_matrix import GraphMatrix
+        self._ensure_loaded()
+        if self._matrix is None or self._matrix.version != self.version:
+            self._matrix = GraphMatrix.from_graph(self)
+        return self._matrix
+    
+    def subgraph(self, center: Optional[Union[str, TaxEntity]] = None, radius: int = 1,
+                 entity_types: Optional[Iterable[str]] = None, relations: Optional[Iterable[str]] = None,
+                 max_nodes: Optional[int] = 200, seed: int = 0) -> nx.MultiDiGraph:
+        """Extract a view of the graph for inspection.
         
-        # Check outgoing edges
-        for _, target, data in self.graph.out_edges(current, data=True):
-            relation = data.get("relation")
+        Args:
+            center: Entity whose ego network (within ``radius`` hops, either
+                direction) is extracted; the whole graph if None
+            radius: Hops around the center
+            entity_types: Only keep entities of these types (the center is always kept)
+            relations: Only keep (and traverse) these relations
+            max_nodes: Node cap; nearer hops are kept first and the farthest
+                level that overflows is sampled
+            seed: Seed of the sampling
             
-            # If this is the relation we're looking for
-            if relation == target_relation:
-                # Create path entry
-                path_entry = {
-                    "source": current,
-                    "relation": relation,
-                    "target": target,
-                    "source_type": self.graph.nodes[current].get("type"),
-                    "target_type": self.graph.nodes[target].get("type"),
-                    "attributes": data.get("attributes", {})
-                }
-                
-                # Add to results
-                new_path = current_path + [path_entry]
-                results.append(new_path)
-                
-                # Continue searching if not visited and under max depth
-                if target not in visited and depth + 1 < max_depth:
-                    visited_new = visited.copy()
-                    visited_new.add(target)
-                    self._dfs_query(target, target_relation, new_path, results, visited_new, depth + 1, max_depth)
+        Returns:
+            A copy of the selected nodes and the relations between them
+        """
+        graph = self.graph
+        relations = set(relations) if relations is not None else None
+        center_id = None
+        if center is not None:
+            center_id = self.resolve(center)
+            if center_id is None:
+                raise KeyError(f"Unknown entity: {center}")
+            hops = self.to_matrix().reachable([center_id], relations, max_hops=radius, direction="both")
+        elif relations is not None:
+            matrix = self.to_matrix()
+            degree = np.asarray(matrix.operator(relations, direction="both").sum(axis=0)).ravel()
+            hops = {matrix.node_ids[i]: 0 for i in np.flatnonzero(degree)}
+        else:
+            hops = dict.fromkeys(graph, 0)
+        if entity_types is not None:
+            types = set(entity_types)
+            hops = {n: hop for n, hop in hops.items() if n == center_id or graph.nodes[n].get("type") in types}
+        
+        nodes = list(hops)
+        if max_nodes is not None and len(nodes) > max_nodes:
+            rng = random.Random(seed)
+            levels: Dict[int, List[str]] = {}
+            for node_id, hop in hops.items():
+                levels.setdefault(hop, []).append(node_id)
+            nodes = []
+            for hop in sorted(levels):
+                level = sorted(levels[hop])
+                if len(nodes) + len(level) > max_nodes:
+                    nodes.extend(rng.sample(level, max_nodes - len(nodes)))
+                    break
+                nodes.extend(level)
+            logger.info(f"View sampled to {len(nodes)} of {len(hops)} entities")
+        
+        view = nx.MultiDiGraph()
+        view.add_nodes_from((n, graph.nodes[n]) for n in nodes)
+        view.add_edges_from((u, v, relation, data) for u, v, relation, data
+                            in graph.subgraph(nodes).edges(keys=True, data=True)
+                            if relations is None or relation in relations)
+        return view
+    
+    def layout(self, view: nx.MultiDiGraph, seed: int = 0) -> Dict[str, Any]:
+        """Node positions of a view, cached until the graph changes"""
+        key = (self.version, seed, tuple(sorted(view.nodes)))
+        if key not in self._layouts:
+            if len(self._layouts) >= 16:
+                self._layouts.pop(next(iter(self._layouts)))
+            self._layouts[key] = nx.spring_layout(nx.Graph(view), iterations=50, seed=seed)
+        return self._layouts[key]
     
     def visualize(self, output_file: Optional[str] = None, 
                  highlight_entities: List[str] = None,
-                 highlight_relations: List[Tuple[str, str]] = None) -> None:
-        """Visualize the knowledge graph.
+                 highlight_relations: List[Tuple[str, str]] = None,
+                 center: Optional[Union[str, TaxEntity]] = None, radius: int = 1,
+                 entity_types: Optional[Iterable[str]] = None, relations: Optional[Iterable[str]] = None,
+                 max_nodes: Optional[int] = 200, label_limit: int = 100) -> None:
+        """Visualize the knowledge graph, or a view of it (see ``subgraph``).
+        
+        Output files ending in ``.html`` get a self-contained interactive
+        page, ``.graphml``/``.gexf`` a graph file for external tools; other
+        names are rendered with matplotlib. Layouts are cached per view and
+        graph version, so re-rendering an unchanged view skips the layout.
         
         Args:
             output_file: Optional file to save the visualization
             highlight_entities: List of entity names to highlight
             highlight_relations: List of (source, target) pairs to highlight
+            center: Entity whose ego network is shown
+            radius: Hops around the center
+            entity_types: Only show entities of these types
+            relations: Only show these relations
+            max_nodes: Node cap, with sampling (None draws everything)
+            label_limit: Largest view drawn with node and edge labels
         """
-        plt.figure(figsize=(12, 10))
+        view = self.subgraph(center, radius, entity_types, relations, max_nodes)
+        highlight_entities = highlight_entities or []
+        highlight_relations = highlight_relations or []
+        if center is not None:
+            highlight_entities = highlight_entities + [self.resolve(center)]
+        show_labels = view.number_of_nodes() <= label_limit
         
-        # Create position layout
-        pos = nx.spring_layout(self.graph, k=0.5, iterations=50)
+        if output_file and output_file.lower().endswith((".graphml", ".gexf")):
+            from core.graph_view import export_view
+            export_view(view, output_file)
+            return
+        pos = self.layout(view)
+        if output_file and output_file.lower().endswith(".html"):
+            from core.graph_view import export_view
+            export_view(view, output_file, pos, highlight_nodes=highlight_entities,
+                        highlight_edges=highlight_relations, show_labels=show_labels)
+            return
+        
+        plt.figure(figsize=(12, 10))
         
         # Prepare node colors based on entity type
-        entity_types = list(self.entity_types)
+        entity_types = sorted({attrs.get("type", "unknown") for _, attrs in view.nodes(data=True)})
         color_map = plt.cm.tab20(range(len(entity_types)))
         type_to_color = {t: color_map[i % len(color_map)] for i, t in enumerate(entity_types)}
         
         # Get node colors
-        node_colors = [type_to_color.get(self.graph.nodes[n].get("type", "unknown"), (0.7, 0.7, 0.7, 1.0)) for n in self.graph.nodes]
+        node_colors = [type_to_color.get(view.nodes[n].get("type", "unknown"), (0.7, 0.7, 0.7, 1.0)) for n in view.nodes]
         
-        # Draw nodes
+        # Draw nodes, smaller in larger views
+        node_size = 800 if show_labels else 60
         nx.draw_networkx_nodes(
-            self.graph, pos,
+            view, pos,
             node_color=node_colors,
-            node_size=800,
+            node_size=node_size,
             alpha=0.9
         )
         
         # Highlight specific entities if provided
         if highlight_entities:
-            highlight_nodes = [n for n in self.graph.nodes if n in highlight_entities]
+            highlight_nodes = [n for n in view.nodes if self._name(n) in highlight_entities or n in highlight_entities]
             nx.draw_networkx_nodes(
-                self.graph, pos,
+                view, pos,
                 nodelist=highlight_nodes,
                 node_color='red',
-                node_size=1000,
+                node_size=node_size * 1.25,
                 alpha=0.8
             )
         
-        # Draw edges
+        # Draw edges, one arrow per node pair labelled with all of its relations
+        simple = nx.DiGraph(view)
         edge_colors = []
-        for u, v, data in self.graph.edges(data=True):
-            if highlight_relations and (u, v) in highlight_relations:
+        for u, v in simple.edges():
+            if (u, v) in highlight_relations:
                 edge_colors.append('red')
             else:
                 edge_colors.append('black')
         
         nx.draw_networkx_edges(
-            self.graph, pos,
+            simple, pos,
             width=1.0,
             alpha=0.7,
             edge_color=edge_colors,
-            arrowsize=15
-        )
-        
-        # Add edge labels
-        edge_labels = {(u, v): data.get('relation', '') for u, v, data in self.graph.edges(data=True)}
-        nx.draw_networkx_edge_labels(
-            self.graph, pos,
-            edge_labels=edge_labels,
-            font_size=8
+            arrowsize=15 if show_labels else 5
         )
         
-        # Add node labels
-        nx.draw_networkx_labels(
-            self.graph, pos,
-            font_size=10,
-            font_weight='bold'
-        )
+        if show_labels:
+            # Add edge labels
+            edge_labels: Dict[Tuple[str, str], str] = {}
+            for u, v, relation in view.edges(keys=True):
+                edge_labels[(u, v)] = f"{edge_labels[(u, v)]}, {relation}" if (u, v) in edge_labels else relation
+            nx.draw_networkx_edge_labels(
+                simple, pos,
+                edge_labels=edge_labels,
+                font_size=8
+            )
+            
+            # Add node labels
+            nx.draw_networkx_labels(
+                view, pos,
+                labels={n: self._name(n) for n in view.nodes},
+                font_size=10,
+                font_weight='bold'
+            )
         
         # Add legend for entity types
         legend_elements = [plt.Line2D([0], [0], marker='o', color='w', 
@@ -315,12 +931,14 @@ class TaxKnowledgeGraph:
         
         plt.legend(handles=legend_elements, loc='upper right')
         
-        plt.title('Tax Knowledge Graph')
+        plt.title(f'Tax Knowledge Graph: {self._name(self.resolve(center))}' if center is not None
+                  else 'Tax Knowledge Graph')
         plt.axis('off')
         
         # Save or display
         if output_file:
             plt.savefig(output_file, bbox_inches='tight')
+            plt.close()
             logger.info(f"Graph visualization saved to {output_file}")
         else:
             plt.show()
@@ -328,128 +946,204 @@ class TaxKnowledgeGraph:
     def save(self) -> bool:
         """Save the knowledge graph to file.
         
+        A SQLite store only writes the entities and relations changed since
+        the last save; a JSON file is rewritten atomically.
+        
         Returns:
             True if saved successfully, False otherwise
         """
         try:
-            # Create directory if it doesn't exist
-            os.makedirs(os.path.dirname(self.save_path), exist_ok=True)
-            
-            # Convert graph to JSON-serializable format
-            data = {
-                "nodes": [],
-                "edges": [],
-                "entity_types": list(self.entity_types),
-                "relation_types": list(self.relation_types)
-            }
-            
-            # Add nodes
-            for node, attrs in self.graph.nodes(data=True):
-                node_data = {
-                    "name": node,
-                    "type": attrs.get("type", "unknown"),
-                    "attributes": attrs.get("attributes", {})
-                }
-                data["nodes"].append(node_data)
-            
-            # Add edges
-            for u, v, attrs in self.graph.edges(data=True):
-                edge_data = {
-                    "source": u,
-                    "target": v,
-                    "relation": attrs.get("relation", "unknown"),
-                    "attributes": attrs.get("attributes", {})
-                }
-                data["edges"].append(edge_data)
-            
-            # Save to file
-            with open(self.save_path, "w") as f:
-                json.dump(data, f, indent=2)
-            
-            logger.info(f"Knowledge graph saved to {self.save_path}")
+            if self._store is not None:
+                graph = self.graph
+                nodes = [(node, graph.nodes[node].get("name", node), graph.nodes[node].get("type", "unknown"),
+                          json.dumps(graph.nodes[node].get("attributes", {})))
+                         for node in self._dirty_nodes if node in graph]
+                edges = [(u, v, relation, json.dumps(graph[u][v][relation].get("attributes", {})))
+                         for u, v, relation in self._dirty_edges if graph.has_edge(u, v, key=relation)]
+                self._store.write(nodes, edges)
+                logger.info(f"Knowledge graph saved to {self.save_path} ({len(nodes)} entities, {len(edges)} relations written)")
+            else:
+                self._save_json()
+            self._dirty_nodes.clear()
+            self._dirty_edges.clear()
             return True
             
         except Exception as e:
             logger.error(f"Error saving knowledge graph: {e}")
             return False
     
+    def _save_json(self) -> None:
+        """Rewrite the whole graph as a JSON file, replacing the old file atomically"""
+        # Create directory if it doesn't exist
+        directory = os.path.dirname(self.save_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        
+        # Convert graph to JSON-serializable format
+        data = {
+            "version": GRAPH_FORMAT_VERSION,
+            "nodes": [],
+            "edges": [],
+            "entity_types": list(self.entity_types),
+            "relation_types": list(self.relation_types)
+        }
+        
+        # Add nodes
+        for node, attrs in self.graph.nodes(data=True):
+            node_data = {
+                "id": node,
+                "name": attrs.get("name", node),
+                "type": attrs.get("type", "unknown"),
+                "attributes": attrs.get("attributes", {})
+            }
+            data["nodes"].append(node_data)
+        
+        # Add edges
+        for u, v, attrs in self.graph.edges(data=True):
+            edge_data = {
+                "source": u,
+                "target": v,
+                "relation": attrs.get("relation", "unknown"),
+                "attributes": attrs.get("attributes", {})
+            }
+            data["edges"].append(edge_data)
+        
+        # Save to a temporary file and swap it in
+        tmp_path = f"{self.save_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp_path, self.save_path)
+        
+        logger.info(f"Knowledge graph saved to {self.save_path}")
+    
+    def compact(self) -> None:
+        """Compact the SQLite store now (it is also compacted periodically on save)"""
+        if self._store is not None:
+            self._store.compact()
+    
+    def close(self) -> None:
+        """Close the SQLite store"""
+        if self._store is not None:
+            self._store.close()
+    
     def load(self) -> bool:
         """Load the knowledge graph from file.
         
         Returns:
             True if loaded successfully, False otherwise
         """
-        if not os.path.exists(self.save_path):
+        if self._graph is None:
+            self._graph = nx.MultiDiGraph()
+        
+        json_path = self.save_path if self._store is None else os.path.splitext(self.save_path)[0] + ".json"
+        imported = self._store is not None and not os.path.exists(self.save_path)
+        if not os.path.exists(self.save_path) and not (imported and os.path.exists(json_path)):
             logger.info(f"Knowledge graph file {self.save_path} not found, starting with empty graph")
             return False
         
         try:
-            with open(self.save_path, "r") as f:
-                data = json.load(f)
-            
-            # Clear existing graph
-            self.graph.clear()
-            self.entity_types.clear()
-            self.relation_types.clear()
-            
-            # Load entity types and relation types
-            self.entity_types.update(data.get("entity_types", []))
-            self.relation_types.update(data.get("relation_types", []))
+            if self._store is not None and not imported:
+                node_rows, edge_rows = self._store.read()
+                data = {
+                    "version": GRAPH_FORMAT_VERSION,
+                    "nodes": [{"id": node_id, "name": name, "type": entity_type, "attributes": json.loads(attributes)}
+                              for node_id, name, entity_type, attributes in node_rows],
+                    "edges": [{"source": source, "target": target, "relation": relation,
+                               "attributes": json.loads(attributes)}
+                              for source, target, relation, attributes in edge_rows]
+                }
+            else:
+                with open(json_path, "r") as f:
+                    data = json.load(f)
             
-            # Add nodes
-            for node_data in data.get("nodes", []):
-                self.graph.add_node(
-                    node_data["name"],
-                    type=node_data.get("type", "unknown"),
-                    attributes=node_data.get("attributes", {})
-                )
+            self._populate(data)
             
-            # Add edges
-            for edge_data in data.get("edges", []):
-                self.graph.add_edge(
-                    edge_data["source"],
-                    edge_data["target"],
-                    relation=edge_data.get("relation", "unknown"),
-                    attributes=edge_data.get("attributes", {})
-                )
+            if imported:
+                # First use of the SQLite store: write everything from the JSON file
+                self._dirty_nodes.update(self._graph.nodes)
+                self._dirty_edges.update(self._graph.edges(keys=True))
+                if self.save():
+                    logger.info(f"Imported {json_path} into {self.save_path}")
+            elif data.get("version", 1) < GRAPH_FORMAT_VERSION:
+                self._migrate_legacy_file()
             
-            logger.info(f"Knowledge graph loaded from {self.save_path} with {self.graph.number_of_nodes()} nodes and {self.graph.number_of_edges()} edges")
+            logger.info(f"Knowledge graph loaded from {self.save_path} with {self._graph.number_of_nodes()} nodes and {self._graph.number_of_edges()} edges")
             return True
             
         except Exception as e:
             logger.error(f"Error loading knowledge graph: {e}")
             return False
     
+    def _populate(self, data: Dict[str, Any]) -> None:
+        """Replace the in-memory graph with the nodes and edges of a JSON-format record"""
+        # Clear existing graph
+        self._graph.clear()
+        self._entity_types.clear()
+        self._relation_types.clear()
+        self._dirty_nodes.clear()
+        self._dirty_edges.clear()
+        self.version += 1
+        
+        # Add nodes; version 1 files used the bare name as the node ID
+        legacy = data.get("version", 1) < GRAPH_FORMAT_VERSION
+        node_ids = {}
+        nodes = []
+        for node_data in data.get("nodes", []):
+            entity_type = node_data.get("type", "unknown")
+            node_id = make_node_id(entity_type, node_data["name"]) if legacy else node_data["id"]
+            node_ids[node_data.get("id", node_data["name"])] = node_id
+            nodes.append((node_id, {"name": node_data["name"], "type": entity_type,
+                                    "attributes": node_data.get("attributes", {})}))
+        self._graph.add_nodes_from(nodes)
+        
+        # Add edges; endpoints missing from the node list become untyped entities
+        edges = []
+        for edge_data in data.get("edges", []):
+            endpoints = []
+            for key in (edge_data["source"], edge_data["target"]):
+                if key not in node_ids:
+                    node_ids[key] = make_node_id("unknown", key) if legacy else key
+                    self._graph.add_node(node_ids[key], name=key.split(":", 1)[-1] if not legacy else key,
+                                         type="unknown", attributes={})
+                endpoints.append(node_ids[key])
+            relation = edge_data.get("relation", "unknown")
+            edges.append((endpoints[0], endpoints[1], relation,
+                          {"relation": relation, "attributes": edge_data.get("attributes", {})}))
+        self._graph.add_edges_from(edges)
+        self._rebuild_index()
+        
+        # Entity and relation types
+        self._entity_types.update(data.get("entity_types", []))
+        self._entity_types.update(attrs["type"] for _, attrs in nodes)
+        self._relation_types.update(data.get("relation_types", []))
+        self._relation_types.update(relation for _, _, relation, _ in edges)
+    
+    def _migrate_legacy_file(self) -> None:
+        """Rewrite a version 1 file with composite node IDs, keeping the original as a backup"""
+        backup = f"{self.save_path}.v1.bak"
+        if not os.path.exists(backup):
+            os.replace(self.save_path, backup)
+        if self.save():
+            logger.info(f"Migrated {self.save_path} to composite node IDs (original kept at {backup})")
+    
     def extract_from_text(self, text: str, entity_patterns: Dict[str, List[str]] = None) -> int:
         """Extract entities and relations from text.
         
+        Uses the shared compiled extractor of ``core.extraction``; to build
+        the graph from a whole corpus use ``core.extraction.extract_corpus``.
+        
         Args:
             text: Text to extract from
             entity_patterns: Dictionary mapping entity types to regex patterns
+                (defaults to ``core.extraction.DEFAULT_PATTERNS``)
             
         Returns:
             Number of entities and relations extracted
         """
-        if entity_patterns is None:
-            # Default patterns for tax entities
-            entity_patterns = {
-                "form": [r"Form\s+([0-9A-Z\-]+)", r"([0-9]{3,4}[A-Z]?)(?:\s+form)"],
-                "deduction": [r"([A-Za-z\s]+)\s+deduction"],
-                "credit": [r"([A-Za-z\s]+)\s+credit"],
-                "taxpayer": [r"taxpayer\s+([A-Za-z\s]+)", r"([A-Za-z\s]+)(?:'s tax)"]
-            }
+        from core.extraction import get_extractor
         
-        count = 0
-        
-        # Extract entities
-        for entity_type, patterns in entity_patterns.items():
-            for pattern in patterns:
-                matches = re.finditer(pattern, text, re.IGNORECASE)
-                for match in matches:
-                    entity_name = match.group(1).strip()
-                    entity = TaxEntity(entity_name, entity_type)
-                    if self.add_entity(entity):
-                        count += 1
+        entities = get_extractor(entity_patterns).extract(text)
+        count = self.add_entities(TaxEntity(name, entity_type) for entity_type, name in entities)
         
         # TODO: Implement relation extraction (would require NLP parsing)
         
@@ -481,7 +1175,40 @@ class TestTaxKnowledgeGraph(unittest.TestCase):
         entity = TaxEntity("1099", "form", {"description": "Miscellaneous Income"})
         result = self.graph.add_entity(entity)
         self.assertTrue(result)
-        self.assertIn("1099", self.graph.graph.nodes)
+        self.assertIn("form:1099", self.graph.graph.nodes)
+        self.assertFalse(self.graph.add_entity(TaxEntity(" 1099 ", "form")))
+    
+    def test_same_name_different_types(self):
+        self.assertTrue(self.graph.add_entity(TaxEntity("Form 1040", "form")))
+        self.assertTrue(self.graph.add_entity(TaxEntity("Form 1040", "taxpayer")))
+        self.assertFalse(self.graph.add_entity(TaxEntity("form  1040", "form")))
+        self.assertEqual(self.graph.get_entity("Form 1040", "taxpayer").entity_type, "taxpayer")
+        self.assertEqual(self.graph.resolve("FORM 1040", "form"), "form:Form 1040")
+    
+    def test_bulk_load_is_linear(self):
+        import time
+        start = time.time()
+        for i in range(20000):
+            self.graph.add_entity(TaxEntity(f"Entity {i}", "form" if i % 2 else "deduction"))
+        self.assertLess(time.time() - start, 5)
+        self.assertEqual(self.graph.graph.number_of_nodes(), 20003)
+    
+    def test_legacy_file_is_migrated(self):
+        legacy = {
+            "nodes": [{"name": "1040", "type": "form", "attributes": {}},
+                      {"name": "John Doe", "type": "taxpayer", "attributes": {}}],
+            "edges": [{"source": "John Doe", "target": "1040", "relation": "files", "attributes": {}}],
+            "entity_types": ["form", "taxpayer"],
+            "relation_types": ["files"]
+        }
+        with open("./test_knowledge_graph.json", "w") as f:
+            json.dump(legacy, f)
+        migrated = TaxKnowledgeGraph(save_path="./test_knowledge_graph.json")
+        self.assertTrue(migrated.graph.has_edge("taxpayer:John Doe", "form:1040"))
+        os.remove("./test_knowledge_graph.json.v1.bak")
+        self.assertEqual(migrated.get_relations("John Doe"), [("John Doe", "files", "1040")])
+        with open("./test_knowledge_graph.json") as f:
+            self.assertEqual(json.load(f)["version"], GRAPH_FORMAT_VERSION)
     
     def test_add_relation(self):
         entity4 = TaxEntity("Child Tax Credit", "credit")
@@ -489,7 +1216,91 @@ class TestTaxKnowledgeGraph(unittest.TestCase):
         
         result = self.graph.add_relation(self.entity3, "claims", entity4)
         self.assertTrue(result)
-        self.assertTrue(self.graph.graph.has_edge("John Doe", "Child Tax Credit"))
+        self.assertTrue(self.graph.graph.has_edge("taxpayer:John Doe", "credit:Child Tax Credit"))
+    
+    def test_parallel_relations(self):
+        self.assertTrue(self.graph.add_relation(self.entity1, "requires", self.entity2))
+        self.assertTrue(self.graph.add_relation(self.entity1, "limits", self.entity2))
+        self.assertFalse(self.graph.add_relation(self.entity1, "limits", self.entity2))
+        self.assertEqual(self.graph.graph.number_of_edges("form:1040", "deduction:Standard Deduction"), 2)
+        self.assertEqual(self.graph.get_relations("1040", "limits"), [("1040", "limits", "Standard Deduction")])
+        self.assertEqual(len(self.graph.get_relations("Standard Deduction", outgoing=False)), 3)
+        self.graph.save()
+        reloaded = TaxKnowledgeGraph(save_path="./test_knowledge_graph.json")
+        self.assertEqual(reloaded.get_relations("Standard Deduction", "requires", outgoing=False),
+                         [("1040", "requires", "Standard Deduction")])
+    
+    def test_multi_hop_query(self):
+        chain = [TaxEntity("1040", "form"), TaxEntity("Schedule 3", "form"), TaxEntity("Form 8863", "form"),
+                 TaxEntity("American Opportunity Credit", "credit")]
+        for source, target in zip(chain, chain[1:]):
+            self.graph.add_relation(source, "feeds", target)
+        self.graph.add_relation(chain[2], "feeds", chain[0])  # cycle back to the start
+        
+        paths = self.graph.query("1040", "feeds", max_depth=3)
+        self.assertEqual([len(p) for p in paths], [1, 2, 3, 3])
+        self.assertEqual({p[-1]["target"] for p in paths[2:]}, {"American Opportunity Credit", "1040"})
+        self.assertEqual([e["relation"] for e in paths[1]], ["feeds", "feeds"])
+        
+        credits = self.graph.query("1040", "feeds", max_depth=3, target_type="credit")
+        self.assertEqual(len(credits), 1)
+        self.assertEqual(len(self.graph.query("1040", "feeds", max_depth=3, max_results=2)), 2)
+        self.assertEqual(len(self.graph.query("1040", ["feeds", "files"], max_depth=4)), 4)
+    
+    def test_query_on_dense_graph_is_bounded(self):
+        for i in range(30):
+            self.graph.add_entity(TaxEntity(f"N{i}", "form"))
+        for i in range(30):
+            for j in range(30):
+                if i != j:
+                    self.graph.add_relation(TaxEntity(f"N{i}", "form"), "links", TaxEntity(f"N{j}", "form"))
+        import time
+        start = time.perf_counter()
+        paths = list(self.graph.iter_query(TaxEntity("N0", "form"), "links", max_depth=6, max_results=100))
+        self.assertEqual(len(paths), 100)
+        self.assertLess(time.perf_counter() - start, 0.05)
+        start = time.perf_counter()
+        self.graph.query(TaxEntity("N0", "form"), "links", max_depth=6, time_budget=0.01)
+        self.assertLess(time.perf_counter() - start, 0.5)
+    
+    def test_incremental_sqlite_store(self):
+        import tempfile
+        from unittest.mock import patch
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, "kg.db")
+            kg = TaxKnowledgeGraph(save_path=path)
+            for i in range(100):
+                kg.add_entity(TaxEntity(f"Form {i}", "form"))
+            kg.add_relation(TaxEntity("Form 1", "form"), "feeds", TaxEntity("Form 2", "form"))
+            self.assertTrue(kg.save())
+            
+            # Only the changes since the last save are written
+            kg.add_entity(TaxEntity("Schedule C", "form"))
+            with patch.object(kg._store, "write", wraps=kg._store.write) as write:
+                kg.save()
+            nodes, edges = write.call_args[0]
+            self.assertEqual([row[0] for row in nodes], ["form:Schedule C"])
+            self.assertEqual(edges, [])
+            kg.compact()
+            kg.close()
+            
+            reloaded = TaxKnowledgeGraph(save_path=path)
+            self.assertIsNone(reloaded._graph)  # nothing is read until first use
+            self.assertEqual(reloaded.graph.number_of_nodes(), 101)
+            self.assertEqual(reloaded.get_relations("Form 1", "feeds"), [("Form 1", "feeds", "Form 2")])
+            reloaded.close()
+    
+    def test_sqlite_store_imports_json(self):
+        self.graph.save()
+        kg = TaxKnowledgeGraph(save_path="./test_knowledge_graph.db")
+        try:
+            self.assertEqual(kg.graph.number_of_edges(), 2)
+            self.assertTrue(os.path.exists("./test_knowledge_graph.db"))
+        finally:
+            kg.close()
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(f"./test_knowledge_graph.db{suffix}"):
+                    os.remove(f"./test_knowledge_graph.db{suffix}")
     
     def test_get_entity(self):
         entity = self.graph.get_entity("1040", "form")
@@ -497,6 +1308,113 @@ class TestTaxKnowledgeGraph(unittest.TestCase):
         self.assertEqual(entity.name, "1040")
         self.assertEqual(entity.entity_type, "form")
     
+    def test_find_mentions(self):
+        """Test linking entity names in free text, longest name first"""
+        self.graph.add_entity(TaxEntity("Home Office", "expense"))
+        self.graph.add_entity(TaxEntity("Home Office Deduction", "deduction"))
+        
+        mentions = self.graph.find_mentions("Does the home office deduction apply to Form 1040?")
+        self.assertEqual(mentions, ["deduction:Home Office Deduction", "form:1040"])
+    
+    def test_bulk_mutations(self):
+        """Test batch insertion with deduplication and one version bump per batch"""
+        version = self.graph.version
+        added = self.graph.add_entities([TaxEntity("W-2", "form"), ("w-2 ", "form"), ("1040", "form"),
+                                         ("Jane Roe", "taxpayer", {"income": 50000})])
+        self.assertEqual(added, 2)
+        self.assertEqual(self.graph.version, version + 1)
+        
+        relations = [("Jane Roe", "files", "1040"), ("Jane Roe", "receives", TaxEntity("W-2", "form")),
+                     ("Jane Roe", "files", "1040"), ("W-2", "attached_to", "Schedule B", {"copy": "B"}),
+                     ("John Doe", "files", "1040")]
+        self.assertEqual(self.graph.add_relations(relations), 3)
+        self.assertEqual(self.graph.get_entity("Schedule B").entity_type, "unknown")
+        self.assertEqual(self.graph.get_relations("W-2", "attached_to"), [("W-2", "attached_to", "Schedule B")])
+        self.assertIn("attached_to", self.graph.relation_types)
+    
+    def test_invalid_batch_is_rejected(self):
+        """Test that a batch with an invalid item adds nothing"""
+        count = self.graph.graph.number_of_nodes()
+        with self.assertRaises(ValueError):
+            self.graph.add_entities([("8863", "form"), ("", "form")])
+        with self.assertRaises(ValueError):
+            self.graph.add_relations([("Jane Roe", "files", "8863"), ("Jane Roe", None, "8863")])
+        self.assertEqual(self.graph.graph.number_of_nodes(), count)
+    
+    def test_batch_saves_once_on_commit(self):
+        """Test that a batch block persists its changes when it exits"""
+        from unittest.mock import patch
+        with patch.object(self.graph, "save", return_value=True) as save:
+            with self.graph.batch() as kg:
+                kg.add_entities([("8863", "form")])
+                kg.add_relations([("John Doe", "files", "8863")])
+            with self.assertRaises(RuntimeError):
+                with self.graph.batch():
+                    raise RuntimeError("interrupted")
+        save.assert_called_once()
+    
+    def test_find_entities(self):
+        """Test fuzzy lookup, including entities added after the index was built"""
+        self.graph.add_entities([("Home Office Deduction", "deduction"), ("Home Mortgage Interest", "deduction"),
+                                 ("Child Tax Credit", "credit")])
+        
+        matches = self.graph.find_entities("home ofice deductoin")
+        self.assertEqual(matches[0][0], "deduction:Home Office Deduction")
+        self.assertEqual(self.graph.find_entities("child tax credit", k=1), [("credit:Child Tax Credit", 1.0)])
+        self.assertEqual(self.graph.find_entities("Home Office Deduction", entity_type="credit"), [])
+        
+        self.graph.add_entity(TaxEntity("Earned Income Tax Credit", "credit"))
+        self.assertEqual(self.graph.get_entity("earned incme tax credit", fuzzy=True).name, "Earned Income Tax Credit")
+        self.assertIsNone(self.graph.get_entity("earned incme tax credit"))
+        self.assertIsNone(self.graph.get_entity("unrelated words", fuzzy=True))
+    
+    def test_find_entities_filters_type_before_candidate_cap(self):
+        """Test that closer names of other types do not crowd out matches of the requested type"""
+        self.graph.add_entities([(f"Home Office Deduction {i}", "deduction") for i in range(10)]
+                                + [("Home Office Credit", "credit")])
+        
+        matches = self.graph.find_entities("home office deduction", entity_type="credit", max_candidates=5)
+        self.assertEqual([node_id for node_id, _ in matches], ["credit:Home Office Credit"])
+    
+    def test_subgraph_views(self):
+        """Test ego networks, type filters and the node cap"""
+        self.graph.add_relations([(f"W-2 #{i}", "reported_on", "1040") for i in range(30)])
+        
+        ego = self.graph.subgraph("John Doe", radius=1)
+        self.assertEqual(set(ego.nodes), {"taxpayer:John Doe", "form:1040", "deduction:Standard Deduction"})
+        self.assertEqual(ego.number_of_edges(), 2)
+        
+        capped = self.graph.subgraph("John Doe", radius=2, max_nodes=10)
+        self.assertEqual(capped.number_of_nodes(), 10)
+        self.assertTrue({"taxpayer:John Doe", "form:1040", "deduction:Standard Deduction"} <= set(capped.nodes))
+        self.assertEqual(set(self.graph.subgraph("John Doe", radius=2, max_nodes=10).nodes), set(capped.nodes))
+        
+        forms = self.graph.subgraph(entity_types=["form"])
+        self.assertEqual(list(forms.nodes), ["form:1040"])
+        self.assertEqual(set(self.graph.subgraph(relations=["claims"]).nodes),
+                         {"taxpayer:John Doe", "deduction:Standard Deduction"})
+    
+    def test_visualize_exports_and_caches_layout(self):
+        """Test HTML and GraphML exports of a view and layout reuse"""
+        import tempfile
+        from unittest.mock import patch
+        with tempfile.TemporaryDirectory() as temp_dir:
+            html_path = os.path.join(temp_dir, "view.html")
+            graphml_path = os.path.join(temp_dir, "view.graphml")
+            with patch("networkx.spring_layout", wraps=nx.spring_layout) as spring_layout:
+                self.graph.visualize(html_path, center="1040", radius=1)
+                self.graph.visualize(html_path, center="1040", radius=1)
+                self.assertEqual(spring_layout.call_count, 1)
+                self.graph.add_entity(TaxEntity("W-2", "form"))
+                self.graph.visualize(html_path, center="1040", radius=1)
+                self.assertEqual(spring_layout.call_count, 2)
+            self.graph.visualize(graphml_path)
+            
+            with open(html_path, encoding="utf-8") as f:
+                page = f.read()
+            self.assertIn("John Doe (taxpayer)", page)
+            self.assertEqual(nx.read_graphml(graphml_path).number_of_nodes(), 4)
+    
     def test_get_relations(self):
         relations = self.graph.get_relations("John Doe")
         self.assertEqual(len(relations), 2)
@@ -517,8 +1435,9 @@ class TestTaxKnowledgeGraph(unittest.TestCase):
         # Check that entities and relations were preserved
         self.assertEqual(new_graph.graph.number_of_nodes(), 3)
         self.assertEqual(new_graph.graph.number_of_edges(), 2)
-        self.assertIn("1040", new_graph.graph.nodes)
-        self.assertTrue(new_graph.graph.has_edge("John Doe", "Standard Deduction"))
+        self.assertIn("form:1040", new_graph.graph.nodes)
+        self.assertTrue(new_graph.graph.has_edge("taxpayer:John Doe", "deduction:Standard Deduction"))
+        self.assertEqual(new_graph.get_entity("john doe", "taxpayer").name, "John Doe")
     
     def test_extract_from_text(self):
         text = """
@@ -528,8 +1447,8 @@ class TestTaxKnowledgeGraph(unittest.TestCase):
         
         count = self.graph.extract_from_text(text)
         self.assertGreater(count, 0)
-        self.assertIn("John Smith", self.graph.graph.nodes)
-        self.assertIn("Child Tax Credit", self.graph.graph.nodes)
+        self.assertIsNotNone(self.graph.get_entity("John Smith", "taxpayer"))
+        self.assertIsNotNone(self.graph.get_entity("Child Tax Credit", "credit"))
 
 if __name__ == "__main__":
     # Simple demonstration
@@ -16,6 +16,7 @@ import concurrent.futures
 
 # Import custom utilities
 from utils.memory import MemoryOptimizer, memory_usage_decorator
+from core.context import lookup_model_setting
 
 # Configure logging
 logging.basicConfig(
@@ -25,6 +26,33 @@ logging.basicConfig(
 )
 logger = logging.getLogger("models")
 
+# Concurrent requests each model can serve (Ollama parallel slots), matched by name prefix.
+# Large models usually get a single slot because every slot reserves its own KV cache.
+MODEL_PARALLELISM = {
+    "llama3:70b": 1,
+    "llama3": 4,
+    "phi4": 2,
+    "mixtral": 1,
+    "mistral": 2,
+    "yi": 2,
+}
+DEFAULT_PARALLELISM = 1
+
+def get_model_parallelism(model_name: str, overrides: Optional[Dict[str, int]] = None) -> int:
+    """Number of requests to send a model concurrently.
+
+    Per-model overrides win, then the server-wide ``OLLAMA_NUM_PARALLEL``
+    setting, then the defaults above.
+    """
+    if overrides:
+        parallelism = lookup_model_setting(overrides, model_name)
+        if parallelism:
+            return parallelism
+    env_value = os.environ.get("OLLAMA_NUM_PARALLEL")
+    if env_value and env_value.isdigit() and int(env_value) > 0:
+        return int(env_value)
+    return lookup_model_setting(MODEL_PARALLELISM, model_name) or DEFAULT_PARALLELISM
+
 class ModelManager:
     """Class to manage LLM models via Ollama"""
     
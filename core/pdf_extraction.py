@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+# Parallel PDF text and table extraction for IRS Tax Analysis System
+
+import os
+import json
+import signal
+import hashlib
+import logging
+import concurrent.futures
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Any
+
+import pandas as pd
+
+from core.rag import ROOT_DIR, Document, TableData
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[logging.StreamHandler()]
+)
+logger = logging.getLogger("pdf_extraction")
+
+PDF_CACHE_DIR = ROOT_DIR / "data" / "cache" / "pdf"
+CONTEXT_CHARS = 300  # Page text kept before/after a table as context
+
+class ExtractionTimeout(Exception):
+    """Raised inside a worker when a file exceeds its time budget"""
+
+def _raise_timeout(signum, frame):
+    raise ExtractionTimeout()
+
+def file_sha256(path: str, block_size: int = 1 << 20) -> str:
+    """Hash a file's contents in blocks"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _unique_columns(header: List[str]) -> List[str]:
+    """Column names from a header row: blanks become col_<i> and repeats get a numeric suffix"""
+    columns: List[str] = []
+    used = set()
+    for i, name in enumerate(header):
+        base = name.strip() or f"col_{i}"
+        name, suffix = base, 1
+        while name in used:
+            name, suffix = f"{base}_{suffix}", suffix + 1
+        used.add(name)
+        columns.append(name)
+    return columns
+
+def _table_frame(raw: Dict[str, Any]) -> pd.DataFrame:
+    """DataFrame from one table of tabula's JSON output, using the first row as the header"""
+    rows = [[cell.get("text", "") for cell in row] for row in raw.get("data", [])]
+    rows = [row for row in rows if any(text.strip() for text in row)]
+    if not rows:
+        return pd.DataFrame()
+    return pd.DataFrame(rows[1:], columns=_unique_columns(rows[0]))
+
+def extract_pdf(path: str, timeout: Optional[float] = None) -> Dict[str, Any]:
+    """Extract page text and tables from one PDF.
+
+    Runs in a worker process. On platforms with SIGALRM the time budget is
+    enforced inside the worker so a stuck file frees its worker.
+
+    Args:
+        path: PDF file path
+        timeout: Maximum seconds to spend on this file
+
+    Returns:
+        Dictionary with ``pages`` (text per page) and ``tables`` ((page_num, DataFrame) pairs)
+    """
+    use_alarm = timeout and hasattr(signal, "SIGALRM")
+    if use_alarm:
+        previous = signal.signal(signal.SIGALRM, _raise_timeout)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+
+    try:
+        from PyPDF2 import PdfReader
+        import tabula
+
+        reader = PdfReader(path)
+        pages: List[str] = []
+        tables: List[Tuple[int, pd.DataFrame]] = []
+
+        for page in reader.pages:
+            pages.append(page.extract_text() or "")
+
+        # One tabula call per file: every call starts a JVM, which costs more than most pages.
+        # JSON output keeps each table's page number so the tables can be split by page.
+        try:
+            raw_tables = tabula.read_pdf(path, pages="all", multiple_tables=True, silent=True,
+                                         output_format="json")
+        except Exception as e:
+            logger.warning(f"Table extraction failed on {path}: {e}")
+            raw_tables = []
+        for raw in raw_tables:
+            page_num = raw.get("page_number") or raw.get("page")
+            frame = _table_frame(raw)
+            if page_num and not frame.empty:
+                tables.append((int(page_num), frame))
+
+        return {"pages": pages, "tables": tables}
+    finally:
+        if use_alarm:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, previous)
+
+class PDFExtractor:
+    """Extract PDFs into Documents in a process pool, caching results by file hash."""
+
+    def __init__(self, cache_dir: Optional[str] = None, max_workers: Optional[int] = None,
+                 timeout: float = 300.0):
+        """Initialize the extractor.
+
+        Args:
+            cache_dir: Directory for cached extractions (defaults to data/cache/pdf)
+            max_workers: Worker processes (defaults to the optimal worker count)
+            timeout: Per-file time budget in seconds
+        """
+        self.cache_dir = Path(cache_dir) if cache_dir else PDF_CACHE_DIR
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.manifest_path = self.cache_dir / "manifest.json"
+        self.manifest = self._load_manifest()
+
+    def _load_manifest(self) -> Dict[str, Dict[str, Any]]:
+        """Load the path -> (size, mtime, sha256) manifest used to skip rehashing"""
+        if not self.manifest_path.exists():
+            return {}
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable PDF cache manifest: {e}")
+            return {}
+
+    def _save_manifest(self) -> None:
+        tmp_path = self.manifest_path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.manifest, f)
+        os.replace(tmp_path, self.manifest_path)
+
+    def _file_hash(self, path: str) -> str:
+        """Get a file's hash, reusing the manifest entry when size and mtime are unchanged"""
+        stat = os.stat(path)
+        entry = self.manifest.get(os.path.abspath(path))
+        if entry and entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime:
+            return entry["sha256"]
+        sha = file_sha256(path)
+        self.manifest[os.path.abspath(path)] = {"size": stat.st_size, "mtime": stat.st_mtime, "sha256": sha}
+        return sha
+
+    def _cache_path(self, sha: str) -> Path:
+        return self.cache_dir / f"{sha}.json"
+
+    def _load_cached(self, path: str, sha: str) -> Optional[Document]:
+        cache_path = self._cache_path(sha)
+        if not cache_path.exists():
+            return None
+        try:
+            with open(cache_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            tables = [TableData.from_dict(t) for t in data["tables"]]
+            return self._build_document(path, sha, data["pages"], tables)
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable cache entry for {path}: {e}")
+            return None
+
+    def _store_cached(self, sha: str, pages: List[str], tables: List[TableData]) -> None:
+        cache_path = self._cache_path(sha)
+        tmp_path = cache_path.with_suffix(".tmp")
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"pages": pages, "tables": [t.to_dict(self.cache_dir / "tables") for t in tables]}, f)
+            os.replace(tmp_path, cache_path)
+        finally:
+            if tmp_path.exists():
+                tmp_path.unlink()
+
+    @staticmethod
+    def _build_tables(path: str, pages: List[str], raw_tables: List[Tuple[int, pd.DataFrame]]) -> List[TableData]:
+        """Wrap extracted DataFrames with their page context"""
+        tables = []
+        for page_num, frame in raw_tables:
+            page_text = pages[page_num - 1] if page_num <= len(pages) else ""
+            lines = [line.strip() for line in page_text.splitlines() if line.strip()]
+            tables.append(TableData(
+                content=frame,
+                page_num=page_num,
+                source_file=path,
+                context_before=page_text[:CONTEXT_CHARS],
+                context_after=page_text[-CONTEXT_CHARS:],
+                section_title=lines[0] if lines else ""
+            ))
+        return tables
+
+    @staticmethod
+    def _build_document(path: str, sha: str, pages: List[str], tables: List[TableData]) -> Document:
+        doc = Document(
+            content="\n\n".join(pages),
+            metadata={
+                "source": path,
+                "filename": os.path.basename(path),
+                "type": "pdf",
+                "pages": len(pages),
+                "sha256": sha
+            }
+        )
+        for table in tables:
+            doc.add_table(table)
+        return doc
+
+    def extract(self, paths: List[str]) -> List[Document]:
+        """Extract a list of PDFs, re-parsing only files whose contents changed.
+
+        Args:
+            paths: PDF file paths
+
+        Returns:
+            Documents in the order of ``paths``; files that failed or timed out are skipped
+        """
+        results: Dict[str, Document] = {}
+        pending: Dict[str, str] = {}
+
+        for path in paths:
+            try:
+                sha = self._file_hash(path)
+            except OSError as e:
+                logger.error(f"Error reading PDF {path}: {e}")
+                continue
+            cached = self._load_cached(path, sha)
+            if cached is not None:
+                results[path] = cached
+            else:
+                pending[path] = sha
+        self._save_manifest()
+
+        logger.info(f"PDF extraction: {len(results)} cached, {len(pending)} to parse")
+
+        if pending:
+            if self.max_workers is None:
+                from utils.system import get_optimal_worker_count
+                self.max_workers = get_optimal_worker_count()
+            workers = max(1, min(self.max_workers, len(pending)))
+
+            # Backstop for platforms without SIGALRM: every file gets its budget, plus slack
+            rounds = -(-len(pending) // workers)
+            overall_timeout = self.timeout * rounds + 60 if self.timeout else None
+
+            executor = concurrent.futures.ProcessPoolExecutor(max_workers=workers)
+            futures = {executor.submit(extract_pdf, path, self.timeout): path for path in pending}
+            try:
+                for future in concurrent.futures.as_completed(futures, timeout=overall_timeout):
+                    path = futures[future]
+                    try:
+                        raw = future.result()
+                    except ExtractionTimeout:
+                        logger.error(f"PDF extraction timed out after {self.timeout}s: {path}")
+                        continue
+                    except Exception as e:
+                        logger.error(f"Error extracting PDF {path}: {e}")
+                        continue
+
+                    tables = self._build_tables(path, raw["pages"], raw["tables"])
+                    try:
+                        self._store_cached(pending[path], raw["pages"], tables)
+                    except Exception as e:
+                        # The document is still usable; it is just parsed again next time
+                        logger.error(f"Could not cache extraction of {path}: {e}")
+                    results[path] = self._build_document(path, pending[path], raw["pages"], tables)
+                    logger.info(f"Extracted {path}: {len(raw['pages'])} pages, {len(tables)} tables")
+            except concurrent.futures.TimeoutError:
+                unfinished = [futures[f] for f in futures if not f.done()]
+                logger.error(f"PDF extraction timed out for {len(unfinished)} files: {', '.join(unfinished)}")
+            finally:
+                executor.shutdown(wait=False, cancel_futures=True)
+
+        return [results[path] for path in paths if path in results]
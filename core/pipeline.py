@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+# Staged processing pipeline for IRS Tax Analysis System
+
+import time
+import queue
+import logging
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[logging.StreamHandler()]
+)
+logger = logging.getLogger("pipeline")
+
+_DONE = object()  # End-of-stream marker passed between stages
+
+@dataclass
+class Stage:
+    """One pipeline stage: a function applied to every item by ``workers`` threads.
+
+    The function returns the item for the next stage, or None to drop it.
+    """
+    name: str
+    func: Callable[[Any], Any]
+    workers: int = 1
+
+@dataclass
+class StageStats:
+    """Counters for one stage"""
+    name: str
+    workers: int
+    processed: int = 0
+    errors: int = 0
+    busy_seconds: float = 0.0
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def record(self, seconds: float, failed: bool) -> None:
+        with self.lock:
+            self.busy_seconds += seconds
+            if failed:
+                self.errors += 1
+            else:
+                self.processed += 1
+
+    def to_dict(self, wall_seconds: float) -> Dict[str, Any]:
+        items = self.processed + self.errors
+        return {
+            "processed": self.processed,
+            "errors": self.errors,
+            "busy_seconds": round(self.busy_seconds, 3),
+            "seconds_per_item": round(self.busy_seconds / items, 3) if items else 0.0,
+            "throughput_per_min": round(60 * self.processed / wall_seconds, 2) if wall_seconds else 0.0,
+            "throughput_per_worker_per_min": round(60 * self.processed / (wall_seconds * self.workers), 2) if wall_seconds else 0.0,
+            # Fraction of the run this stage's workers spent working; the busiest stage is the bottleneck
+            "utilization": round(self.busy_seconds / (wall_seconds * self.workers), 3) if wall_seconds else 0.0
+        }
+
+class Pipeline:
+    """Run items through stages connected by bounded queues.
+
+    Each stage runs in its own threads, so while one item is in a slow stage
+    (e.g. answering) the next can already be in another (e.g. feedback or
+    file writes). Queue bounds stop fast stages from running far ahead and
+    holding many items in memory. An exception in a stage drops that item
+    only and is counted in the stage's error total.
+    """
+
+    def __init__(self, stages: List[Stage], queue_size: int = 2):
+        """Initialize the pipeline.
+
+        Args:
+            stages: Stages in processing order
+            queue_size: Items buffered between two stages
+        """
+        if not stages:
+            raise ValueError("A pipeline needs at least one stage")
+        self.stages = stages
+        self.queue_size = queue_size
+        self.stats = [StageStats(stage.name, stage.workers) for stage in stages]
+        self.wall_seconds = 0.0
+
+    def _worker(self, stage: Stage, stats: StageStats, inbox: "queue.Queue", outbox: Optional["queue.Queue"],
+                results: List[Any]) -> None:
+        while True:
+            item = inbox.get()
+            if item is _DONE:
+                inbox.put(_DONE)  # Let sibling workers see the end of the stream too
+                return
+            start = time.perf_counter()
+            try:
+                output = stage.func(item)
+                failed = False
+            except Exception as e:
+                logger.error(f"Stage {stage.name} failed: {e}")
+                output, failed = None, True
+            stats.record(time.perf_counter() - start, failed)
+            if output is None:
+                continue
+            if outbox is not None:
+                outbox.put(output)
+            else:
+                results.append(output)
+
+    def run(self, items: Iterable[Any]) -> List[Any]:
+        """Process items through every stage.
+
+        Returns:
+            Outputs of the last stage, in completion order
+        """
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in self.stages]
+        results: List[Any] = []
+        start = time.perf_counter()
+
+        threads: List[List[threading.Thread]] = []
+        for i, (stage, stats) in enumerate(zip(self.stages, self.stats)):
+            outbox = queues[i + 1] if i + 1 < len(self.stages) else None
+            stage_threads = [
+                threading.Thread(target=self._worker, args=(stage, stats, queues[i], outbox, results),
+                                 name=f"{stage.name}-{n}", daemon=True)
+                for n in range(max(1, stage.workers))
+            ]
+            for thread in stage_threads:
+                thread.start()
+            threads.append(stage_threads)
+
+        for item in items:
+            queues[0].put(item)
+        queues[0].put(_DONE)
+
+        # Close each stage once all of its workers have drained their input
+        for i, stage_threads in enumerate(threads):
+            for thread in stage_threads:
+                thread.join()
+            if i + 1 < len(queues):
+                queues[i + 1].put(_DONE)
+
+        self.wall_seconds = time.perf_counter() - start
+        return results
+
+    def report(self) -> Dict[str, Dict[str, Any]]:
+        """Per-stage counters, throughput and utilization of the last run"""
+        return {stats.name: stats.to_dict(self.wall_seconds) for stats in self.stats}
+
+    def log_report(self) -> None:
+        for name, stats in self.report().items():
+            logger.info(f"Stage {name}: {stats['processed']} done, {stats['errors']} failed, "
+                        f"{stats['seconds_per_item']:.2f}s/item, {stats['throughput_per_min']:.2f}/min "
+                        f"({stats['throughput_per_worker_per_min']:.2f}/min per worker), "
+                        f"utilization {stats['utilization']:.0%}")
@@ -8,12 +8,13 @@ import os
 import sys
 import logging
 import argparse
+import concurrent.futures
 from pathlib import Path
 import shutil
 import re
 import json
 import numpy as np
-from typing import Dict, List, Optional, Tuple, Union, Any, Callable
+from typing import Dict, List, Optional, Tuple, Union, Any, Callable, TYPE_CHECKING
 from dataclasses import dataclass, asdict, field
 import chromadb
 from chromadb.config import Settings
@@ -21,6 +22,16 @@ import pandas as pd
 import unittest
 import time  # new import
 
+# Make the core package importable when this file is run as a script
+sys.path.append(str(Path(__file__).parent.parent))
+from core.chunking import Chunk, StructureAwareChunker
+from core.context import CONTEXT_ENTRY_FORMAT, ContextAssembler
+from core.facets import FacetIndex, MetadataExtractor, build_where, facets_from_query
+
+if TYPE_CHECKING:
+    from core.journal import RunJournal
+    from core.knowledge_graph import TaxKnowledgeGraph
+
 # Configure logging
 logging.basicConfig(level=logging.INFO,
                     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -31,6 +42,7 @@ ROOT_DIR = Path(__file__).parent.parent.absolute()
 CHROMA_DB_PATH = ROOT_DIR / "data" / "chroma_db"
 ANSWERS_DIR = ROOT_DIR / "data" / "answers"
 FEEDBACK_DIR = ROOT_DIR / "data" / "feedback"
+TABLES_DIR = ROOT_DIR / "data" / "tables"
 
 # Create output directories
 ANSWERS_DIR.mkdir(parents=True, exist_ok=True)
@@ -38,13 +50,36 @@ FEEDBACK_DIR.mkdir(parents=True, exist_ok=True)
 
 @dataclass
 class TableData:
-    """Class for representing extracted table data"""
-    content: pd.DataFrame
+    """Class for representing extracted table data
+    
+    Tables are persisted as content-addressed Arrow IPC files, so repeated
+    tables (rate schedules, withholding tables) are stored once. Tables loaded
+    from storage keep only a reference and read their content on first use.
+    """
+    content: Optional[pd.DataFrame]
     page_num: int
     source_file: str
     context_before: str = ""
     context_after: str = ""
     section_title: str = ""
+    content_ref: Optional[str] = None
+    
+    def load_content(self) -> pd.DataFrame:
+        """Get the table content, reading it from its Arrow file if not loaded yet"""
+        if self.content is None and self.content_ref:
+            import pyarrow.feather as feather
+            self.content = feather.read_table(self.content_ref, memory_map=True).to_pandas()
+        return self.content
+    
+    def summary(self) -> str:
+        """Short description of the table that does not need its content"""
+        md = f"Table from {os.path.basename(self.source_file)}"
+        if self.section_title:
+            md += f" (Section: {self.section_title})"
+        md += f" (Page {self.page_num})"
+        if self.context_before:
+            md += f": {self.context_before[:200]}"
+        return md
     
     def to_markdown(self) -> str:
         """Convert the table to markdown format for LLM consumption"""
@@ -52,19 +87,84 @@ class TableData:
         if self.section_title:
             md += f" (Section: {self.section_title})"
         md += f" (Page {self.page_num}):\n\n"
-        md += self.content.to_markdown(index=False)
+        md += self.load_content().to_markdown(index=False)
         return md
     
-    def to_dict(self) -> Dict[str, Any]:
-        """Convert to dictionary for storage"""
+    def _write_content(self, table_dir: Path) -> Dict[str, Any]:
+        """Write the content to a content-addressed Arrow IPC file and describe it"""
+        import hashlib
+        import pyarrow as pa
+        import pyarrow.feather as feather
+        
+        frame = self.load_content().reset_index(drop=True)
+        frame.columns = [str(column) for column in frame.columns]
+        
+        sink = pa.BufferOutputStream()
+        feather.write_feather(frame, sink, compression="uncompressed")
+        data = sink.getvalue()
+        digest = hashlib.sha256(data).hexdigest()
+        
+        table_dir.mkdir(parents=True, exist_ok=True)
+        path = table_dir / f"{digest}.arrow"
+        if not path.exists():
+            tmp_path = path.with_suffix(".tmp")
+            with open(tmp_path, "wb") as f:
+                f.write(data.to_pybytes())
+            os.replace(tmp_path, path)
+        
+        self.content_ref = str(path)
+        return {"format": "arrow", "path": str(path), "rows": len(frame), "columns": list(frame.columns)}
+    
+    def to_dict(self, table_dir: Optional[Union[str, Path]] = None) -> Dict[str, Any]:
+        """Convert to dictionary for storage
+        
+        Args:
+            table_dir: Directory for the table's Arrow file (defaults to data/tables)
+        """
+        if self.content is None and self.content_ref:
+            # Already persisted and never loaded: keep pointing at the same file
+            content = {"format": "arrow", "path": self.content_ref}
+        else:
+            try:
+                content = self._write_content(Path(table_dir) if table_dir else TABLES_DIR)
+            except ImportError:
+                logger.warning("pyarrow not installed, storing table inline")
+                content = {"format": "split", **self.content.to_dict(orient="split")}
+        
         return {
-            "content": self.content.to_dict(),
+            "content": content,
             "page_num": self.page_num,
             "source_file": self.source_file,
             "context_before": self.context_before,
             "context_after": self.context_after,
             "section_title": self.section_title
         }
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "TableData":
+        """Create a table from its stored dictionary form
+        
+        Arrow-backed tables are not read until their content is needed.
+        """
+        stored = data["content"]
+        content, content_ref = None, None
+        if stored.get("format") == "arrow":
+            content_ref = stored["path"]
+        elif stored.get("format") == "split":
+            content = pd.DataFrame(stored["data"], index=stored["index"], columns=stored["columns"])
+        else:
+            # Legacy DataFrame.to_dict() form
+            content = pd.DataFrame.from_dict(stored)
+        
+        return cls(
+            content=content,
+            page_num=data["page_num"],
+            source_file=data["source_file"],
+            context_before=data.get("context_before", ""),
+            context_after=data.get("context_after", ""),
+            section_title=data.get("section_title", ""),
+            content_ref=content_ref
+        )
 
 @dataclass
 class Document:
@@ -78,6 +178,31 @@ class Document:
         """Add a table to the document"""
         self.tables.append(table)
 
+def _load_text_document(file_path: str) -> Optional[Document]:
+    """Read one text file into a Document"""
+    try:
+        with open(file_path, "r", encoding="utf-8") as f:
+            content = f.read()
+        return Document(
+            content=content,
+            metadata={
+                "source": file_path,
+                "filename": os.path.basename(file_path),
+                "type": "text"
+            }
+        )
+    except Exception as e:
+        logger.error(f"Error loading file {file_path}: {e}")
+        return None
+
+def _chunk_file(file_path: str, chunker: StructureAwareChunker) -> List[Chunk]:
+    """Chunk one text file (module-level so process pools can pickle it)"""
+    try:
+        return list(chunker.chunk_file(file_path))
+    except Exception as e:
+        logger.error(f"Error chunking file {file_path}: {e}")
+        return []
+
 class DocumentProcessor:
     """Class to process documents, extract text and tables"""
     
@@ -87,33 +212,58 @@ class DocumentProcessor:
             docs_dir = str(ROOT_DIR / "data" / "docs")
         self.docs_dir = docs_dir
     
-    def load_text_files(self) -> List[Document]:
-        """Load all text files from the docs directory"""
-        documents = []
+    def load_text_files(self, max_workers: Optional[int] = None) -> List[Document]:
+        """Load all text files from the docs directory
         
-        # Walk through the directory and load all text files
-        for root, _, files in os.walk(self.docs_dir):
-            for file in files:
-                if file.endswith(".txt"):
-                    file_path = os.path.join(root, file)
-                    try:
-                        with open(file_path, "r", encoding="utf-8") as f:
-                            content = f.read()
-                            doc = Document(
-                                content=content,
-                                metadata={
-                                    "source": file_path,
-                                    "filename": file,
-                                    "type": "text"
-                                }
-                            )
-                            documents.append(doc)
-                            logger.info(f"Loaded text file: {file_path}")
-                    except Exception as e:
-                        logger.error(f"Error loading file {file_path}: {e}")
+        Args:
+            max_workers: Threads reading files; with more than one, files are
+                read concurrently (reads are I/O-bound, so threads avoid the
+                pickling cost a process pool would add per document)
+        """
+        # Walk through the directory and collect all text files
+        paths = [
+            os.path.join(root, file)
+            for root, _, files in os.walk(self.docs_dir) for file in files if file.endswith(".txt")
+        ]
         
+        if max_workers and max_workers > 1 and len(paths) > 1:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=min(max_workers, len(paths)),
+                                                       thread_name_prefix="load") as executor:
+                loaded = list(executor.map(_load_text_document, paths))
+        else:
+            loaded = [_load_text_document(path) for path in paths]
+        
+        documents = []
+        for path, doc in zip(paths, loaded):
+            if doc is not None:
+                documents.append(doc)
+                logger.info(f"Loaded text file: {path}")
         return documents
     
+    def load_pdf_files(self, paths: Optional[List[str]] = None, max_workers: Optional[int] = None,
+                       timeout: float = 300.0) -> List[Document]:
+        """Extract text and tables from PDFs in a process pool
+        
+        Args:
+            paths: PDF files to load (defaults to every PDF in the docs directory)
+            max_workers: Number of worker processes (defaults to the optimal worker count)
+            timeout: Per-file time budget in seconds
+            
+        Returns:
+            Documents with their extracted tables attached
+        """
+        from core.pdf_extraction import PDFExtractor
+        
+        if paths is None:
+            paths = sorted(
+                os.path.join(root, file)
+                for root, _, files in os.walk(self.docs_dir) for file in files if file.lower().endswith(".pdf")
+            )
+        if not paths:
+            return []
+        
+        return PDFExtractor(max_workers=max_workers, timeout=timeout).extract(paths)
+    
     def parse_scenario_and_questions(self, document: Document) -> Dict[str, Union[str, List[str]]]:
         """Parse a document into scenario and questions"""
         content = document.content
@@ -149,22 +299,84 @@ class DocumentProcessor:
             "document": document
         }
     
+    def iter_chunks(self, chunker: Optional[StructureAwareChunker] = None, path: Optional[str] = None,
+                    max_workers: Optional[int] = None):
+        """Stream structure-aware chunks for a text file or every text file in a directory
+        
+        Args:
+            chunker: Chunker to use (defaults to StructureAwareChunker())
+            path: File or directory to chunk (defaults to the docs directory)
+            max_workers: Worker processes for chunking text files and extracting
+                PDFs; with more than one, text files are chunked per file in a
+                process pool (files are then held whole rather than streamed)
+            
+        Yields:
+            Chunk objects with character offsets into their source file
+        """
+        chunker = chunker or StructureAwareChunker()
+        path = path or self.docs_dir
+        
+        if os.path.isfile(path):
+            files = [path]
+        else:
+            files = sorted(
+                os.path.join(root, file)
+                for root, _, names in os.walk(path) for file in names
+                if file.endswith(".txt") or file.lower().endswith(".pdf")
+            )
+        
+        text_paths = [file_path for file_path in files if not file_path.lower().endswith(".pdf")]
+        if max_workers and max_workers > 1 and len(text_paths) > 1:
+            # Chunking is CPU-bound, so files are chunked in parallel and yielded in order
+            with concurrent.futures.ProcessPoolExecutor(max_workers=min(max_workers, len(text_paths))) as executor:
+                for chunks in executor.map(_chunk_file, text_paths, [chunker] * len(text_paths)):
+                    yield from chunks
+        else:
+            for file_path in text_paths:
+                try:
+                    yield from chunker.chunk_file(file_path)
+                except Exception as e:
+                    logger.error(f"Error chunking file {file_path}: {e}")
+        
+        # PDFs are extracted together so the process pool can work on them in parallel
+        pdf_paths = [file_path for file_path in files if file_path.lower().endswith(".pdf")]
+        for doc in self.load_pdf_files(pdf_paths, max_workers=max_workers):
+            yield from chunker.chunk_text(doc.content, source=doc.metadata["source"])
+    
     def process_all_documents(self) -> List[Document]:
         """Process all documents in the docs directory"""
         documents = self.load_text_files()
+        documents.extend(self.load_pdf_files())
         return documents
 
 class VectorDatabaseManager:
     """Class to manage vector database operations"""
     
-    def __init__(self, db_dir: str = None, embedding_model: str = "sentence-transformers/all-mpnet-base-v2"):
-        """Initialize vector database manager"""
+    def __init__(self, db_dir: str = None, embedding_model: str = "sentence-transformers/all-mpnet-base-v2",
+                 collection_name: str = "tax_documents", embedding_batch_size: Optional[int] = None):
+        """Initialize vector database manager
+        
+        The embedding batch size defaults to one that fits the container's memory limit.
+        """
         if db_dir is None:
             db_dir = str(CHROMA_DB_PATH)
+        if embedding_batch_size is None:
+            from utils.system import get_embedding_batch_size
+            embedding_batch_size = get_embedding_batch_size()
         self.db_dir = db_dir
         self.embedding_model = embedding_model
+        self.collection_name = collection_name
+        self.embedding_batch_size = embedding_batch_size
         self.db_client = None
         self.embeddings = None
+        self._facets = None
+    
+    @property
+    def facets(self) -> FacetIndex:
+        """Facet index of the collection, loaded on first use"""
+        if self._facets is None:
+            self._facets = FacetIndex(os.path.join(self.db_dir, f"{self.collection_name}_facets.json"))
+        return self._facets
         
     def initialize(self) -> None:
         """Initialize the vector database and embeddings"""
@@ -187,21 +399,327 @@ class VectorDatabaseManager:
             logger.error(f"Error initializing vector database: {e}")
             raise
     
+    def get_collection(self):
+        """Get (or create) the document collection"""
+        if self.db_client is None:
+            self.initialize()
+        return self.db_client.get_or_create_collection(
+            name=self.collection_name,
+            metadata={"hnsw:space": "cosine"}
+        )
+    
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        """Embed a list of texts in batches with the sentence-transformers model"""
+        if not texts:
+            return []
+        if self.embeddings is None:
+            self.initialize()
+        vectors = self.embeddings.encode(
+            texts,
+            batch_size=self.embedding_batch_size,
+            convert_to_numpy=True,
+            show_progress_bar=False
+        )
+        return vectors.tolist()
+    
+    def query(self, query_embeddings: List[List[float]], n_results: int = 5,
+              where: Optional[Dict[str, Any]] = None) -> Dict[str, List]:
+        """Run one batched nearest-neighbour search for several query embeddings
+        
+        Args:
+            query_embeddings: Query vectors
+            n_results: Results per query
+            where: Optional ChromaDB metadata filter applied during the search
+        """
+        if not query_embeddings:
+            return {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        collection = self.get_collection()
+        kwargs = {"where": where} if where else {}
+        return collection.query(
+            query_embeddings=query_embeddings,
+            n_results=n_results,
+            include=["documents", "metadatas", "distances"],
+            **kwargs
+        )
+    
+    def query_ids(self, query_embeddings: List[List[float]], ids: List[str], n_results: int = 5) -> Dict[str, List]:
+        """Exact cosine search restricted to a known set of chunk IDs
+        
+        Used when facet filters leave few enough candidates that scoring them
+        directly is cheaper and more accurate than a filtered HNSW search.
+        """
+        empty = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        if not query_embeddings:
+            return empty
+        if not ids:
+            return {key: [[] for _ in query_embeddings] for key in empty}
+        
+        stored = self.get_collection().get(ids=list(ids), include=["embeddings", "documents", "metadatas"])
+        vectors = np.asarray(stored["embeddings"], dtype=np.float32)
+        vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        queries /= np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+        distances = 1.0 - queries @ vectors.T
+        
+        result = {key: [] for key in empty}
+        for row in distances:
+            top = np.argsort(row)[:n_results]
+            result["ids"].append([stored["ids"][i] for i in top])
+            result["documents"].append([stored["documents"][i] for i in top])
+            result["metadatas"].append([stored["metadatas"][i] for i in top])
+            result["distances"].append([float(row[i]) for i in top])
+        return result
+    
+    def get_chunks(self, ids: List[str], where: Optional[Dict[str, Any]] = None) -> Dict[str, List]:
+        """Fetch stored chunks by ID, optionally restricted by a metadata filter"""
+        if not ids:
+            return {"ids": [], "documents": [], "metadatas": []}
+        kwargs = {"where": where} if where else {}
+        stored = self.get_collection().get(ids=list(ids), include=["documents", "metadatas"], **kwargs)
+        return {"ids": stored["ids"], "documents": stored["documents"], "metadatas": stored["metadatas"]}
+    
+    def iter_chunks(self, page_size: int = 1000):
+        """Yield (id, text) for every stored chunk, one page at a time"""
+        collection = self.get_collection()
+        offset = 0
+        while True:
+            page = collection.get(include=["documents"], limit=page_size, offset=offset)
+            if not page["ids"]:
+                return
+            yield from zip(page["ids"], page["documents"])
+            offset += len(page["ids"])
+    
+    def search(self, query_embeddings: List[List[float]], n_results: int = 5,
+               filters: Optional[Dict[str, Any]] = None, exact_search_threshold: int = 2000) -> Dict[str, List]:
+        """Search, narrowing the search space with the facet index first.
+        
+        Filters that would leave fewer than ``n_results`` chunks are relaxed.
+        Small candidate sets are scored exactly; larger ones are passed to
+        ChromaDB as a ``where`` clause so the HNSW search itself is filtered.
+        
+        Args:
+            query_embeddings: Query vectors
+            n_results: Results per query
+            filters: Facet filters (see ``core.facets``)
+            exact_search_threshold: Largest candidate set scored exactly
+        """
+        if not filters:
+            return self.query(query_embeddings, n_results=n_results)
+        
+        filters = self.facets.relax(filters, n_results)
+        matched = self.facets.match(filters)
+        if matched is None:
+            return self.query(query_embeddings, n_results=n_results)
+        if len(matched) <= exact_search_threshold:
+            logger.debug(f"Exact search over {len(matched)} chunks matching {filters}")
+            return self.query_ids(query_embeddings, sorted(matched), n_results=n_results)
+        return self.query(query_embeddings, n_results=n_results, where=build_where(filters))
+    
+    def upsert(self, chunks: List[Chunk], metadatas: List[Dict[str, Any]]) -> None:
+        """Embed and upsert one batch of chunks with their metadata, indexing their facets"""
+        for chunk, metadata in zip(chunks, metadatas):
+            self.facets.add(chunk.id, metadata)
+        self.get_collection().upsert(
+            ids=[chunk.id for chunk in chunks],
+            documents=[chunk.text for chunk in chunks],
+            embeddings=self.embed([chunk.text for chunk in chunks]),
+            metadatas=metadatas
+        )
+    
+    def add_chunks(self, chunks, batch_size: int = 256) -> int:
+        """Embed and upsert chunks in batches, consuming the iterable lazily
+        
+        Args:
+            chunks: Iterable of Chunk objects (e.g. from DocumentProcessor.iter_chunks)
+            batch_size: Number of chunks embedded and written per batch
+            
+        Returns:
+            Number of chunks stored
+        """
+        extractor = MetadataExtractor()
+        stored = 0
+        batch: List[Chunk] = []
+        
+        def write(batch: List[Chunk]) -> None:
+            # Facets are extracted and indexed at ingestion so queries can pre-filter
+            metadatas = [dict(chunk.to_metadata(), **extractor.extract(chunk.text, chunk.source)) for chunk in batch]
+            self.upsert(batch, metadatas)
+        
+        for chunk in chunks:
+            batch.append(chunk)
+            if len(batch) >= batch_size:
+                write(batch)
+                stored += len(batch)
+                batch = []
+        if batch:
+            write(batch)
+            stored += len(batch)
+        self.facets.save()
+        
+        logger.info(f"Stored {stored} chunks in collection {self.collection_name}")
+        return stored
+    
     # ... remaining VectorDatabaseManager methods ...
 
 class HybridRetriever:
     """Hybrid retrieval system combining RAG with knowledge graph elements"""
     
-    def __init__(self, vector_db: VectorDatabaseManager, kg_enabled: bool = False):
-        """Initialize hybrid retriever"""
+    def __init__(self, vector_db: VectorDatabaseManager, kg_enabled: bool = False,
+                 reranker: Optional["CrossEncoderReranker"] = None, exact_search_threshold: int = 2000,
+                 knowledge_graph: Optional["TaxKnowledgeGraph"] = None, graph_weight: float = 0.3,
+                 rrf_k: int = 60):
+        """Initialize hybrid retriever
+        
+        Args:
+            vector_db: Vector database manager used for candidate generation
+            kg_enabled: Whether to fuse knowledge-graph (personalized PageRank) results
+                into the vector results
+            reranker: Optional cross-encoder applied to the vector candidates
+            exact_search_threshold: Filtered candidate sets up to this size are scored
+                exactly instead of searched through the ANN index
+            knowledge_graph: Graph used when kg_enabled (defaults to data/knowledge_graph.db)
+            graph_weight: Weight of the graph ranking in reciprocal rank fusion
+            rrf_k: Rank offset of reciprocal rank fusion
+        """
         self.vector_db = vector_db
         self.kg_enabled = kg_enabled
+        self.reranker = reranker
+        self.exact_search_threshold = exact_search_threshold
+        self.graph_weight = graph_weight
+        self.rrf_k = rrf_k
         self.kg = None
+        self.graph_retriever = None
         
         # Initialize knowledge graph if enabled
         if kg_enabled:
-            import networkx as nx
-            self.kg = nx.DiGraph()
+            from core.graph_retrieval import GraphRetriever, MentionIndex
+            from core.knowledge_graph import TaxKnowledgeGraph
+            self.kg = knowledge_graph if knowledge_graph is not None else TaxKnowledgeGraph()
+            collection = getattr(vector_db, "collection_name", None) or getattr(vector_db, "base_name", "tax_documents")
+            mentions = MentionIndex(os.path.join(vector_db.db_dir, f"{collection}_mentions.json"))
+            self.graph_retriever = GraphRetriever(self.kg, mentions)
+    
+    def index_mentions(self) -> int:
+        """Link every stored chunk to the knowledge-graph entities it mentions.
+        
+        Rerun after adding documents or extending the graph; graph retrieval
+        builds the index on first use if it does not exist yet.
+        """
+        if self.graph_retriever is None:
+            raise RuntimeError("Knowledge graph retrieval is not enabled")
+        return self.graph_retriever.index_chunks(self.vector_db.iter_chunks())
+    
+    def retrieve(self, query: str, n_results: int = 5,
+                 filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """Retrieve the most relevant passages for a single query"""
+        return self.retrieve_many([query], n_results, filters=filters)[0]
+    
+    def retrieve_many(self, queries: List[str], k: int = 5,
+                      filters: Optional[Union[Dict[str, Any], List[Optional[Dict[str, Any]]]]] = None
+                      ) -> List[List[Dict[str, Any]]]:
+        """Retrieve passages for several queries with one embedding batch and one search
+        per distinct filter.
+        
+        Args:
+            queries: Query strings
+            k: Number of passages to return per query
+            filters: Facet filters (see ``core.facets``), either one dict for all
+                queries or one per query, e.g. ``{"tax_year": 2023, "forms": ["1040"]}``
+            
+        Returns:
+            One list of results per query, in the same order as ``queries``
+        """
+        if not queries:
+            return []
+        if filters is None or isinstance(filters, dict):
+            filters = [filters] * len(queries)
+        
+        # Identical queries (e.g. repeated questions) are embedded and searched once
+        unique = list(dict.fromkeys(zip(queries, (self._filter_key(f) for f in filters))))
+        filter_by_key = {self._filter_key(f): f for f in filters}
+        unique_queries = list(dict.fromkeys(query for query, _ in unique))
+        vectors = dict(zip(unique_queries, self.vector_db.embed(unique_queries)))
+        
+        # Fetch a deeper candidate list when a rerank stage follows
+        depth = max(k, self.reranker.candidate_depth) if self.reranker else k
+        
+        groups: Dict[str, List[str]] = {}
+        for query, key in unique:
+            groups.setdefault(key, []).append(query)
+        
+        by_query = {}
+        for key, group in groups.items():
+            raw = self._search([vectors[query] for query in group], depth, filter_by_key[key])
+            for i, query in enumerate(group):
+                candidates = self._format_results(raw, i)
+                if self.graph_retriever is not None:
+                    candidates = self._fuse_graph_results(query, candidates, depth, filter_by_key[key])
+                if self.reranker:
+                    candidates = self.reranker.rerank(query, candidates, top_k=k)
+                by_query[(query, key)] = candidates
+        
+        return [list(by_query[(query, self._filter_key(f))]) for query, f in zip(queries, filters)]
+    
+    def _fuse_graph_results(self, query: str, candidates: List[Dict[str, Any]], depth: int,
+                            filters: Optional[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Merge the graph ranking of a query into its vector candidates by weighted RRF"""
+        from core.graph_retrieval import reciprocal_rank_fusion
+        if not self.graph_retriever.mentions.exists() and self.kg.graph.number_of_nodes():
+            self.index_mentions()
+        ranked = self.graph_retriever.rank_chunks(query, k=depth)
+        if not ranked:
+            return candidates
+        graph_scores = dict(ranked)
+        
+        by_id = {candidate["id"]: candidate for candidate in candidates}
+        missing = [chunk_id for chunk_id in graph_scores if chunk_id not in by_id]
+        if missing:
+            stored = self.vector_db.get_chunks(missing, where=build_where(filters) if filters else None)
+            for chunk_id, text, metadata in zip(stored["ids"], stored["documents"], stored["metadatas"]):
+                by_id[chunk_id] = {"id": chunk_id, "text": text or "", "metadata": metadata or {}, "score": 0.0}
+        # Graph hits outside the filters are neither candidates nor fetched
+        graph_ranking = [chunk_id for chunk_id, _ in ranked if chunk_id in by_id]
+        
+        fused = reciprocal_rank_fusion([[c["id"] for c in candidates], graph_ranking],
+                                       weights=[1.0 - self.graph_weight, self.graph_weight], k=self.rrf_k)
+        results = []
+        for chunk_id, score in fused[:depth]:
+            result = dict(by_id[chunk_id])
+            result["vector_score"] = result["score"]
+            result["graph_score"] = graph_scores.get(chunk_id, 0.0)
+            result["score"] = score
+            results.append(result)
+        return results
+    
+    @staticmethod
+    def _filter_key(filters: Optional[Dict[str, Any]]) -> str:
+        return json.dumps(filters or {}, sort_keys=True, default=str)
+    
+    def _search(self, embeddings: List[List[float]], depth: int,
+                filters: Optional[Dict[str, Any]]) -> Dict[str, List]:
+        """Search the vector database (or its shards), pre-filtered by facets if given"""
+        if not filters:
+            return self.vector_db.query(embeddings, n_results=depth)
+        return self.vector_db.search(embeddings, n_results=depth, filters=filters,
+                                     exact_search_threshold=self.exact_search_threshold)
+    
+    def _format_results(self, raw: Dict[str, List], index: int) -> List[Dict[str, Any]]:
+        """Convert the i-th row of a batched ChromaDB result into result dicts"""
+        ids = raw["ids"][index] if raw.get("ids") else []
+        documents = raw["documents"][index] if raw.get("documents") else [None] * len(ids)
+        metadatas = raw["metadatas"][index] if raw.get("metadatas") else [None] * len(ids)
+        distances = raw["distances"][index] if raw.get("distances") else [None] * len(ids)
+        
+        results = []
+        for doc_id, text, metadata, distance in zip(ids, documents, metadatas, distances):
+            results.append({
+                "id": doc_id,
+                "text": text or "",
+                "metadata": metadata or {},
+                # Cosine distance -> similarity
+                "score": 1.0 - distance if distance is not None else 0.0
+            })
+        return results
     
     # ... remaining HybridRetriever methods ...
 
@@ -247,54 +765,180 @@ def initialize_vector_db():
         logger.error(f"Error in vector database initialization: {e}")
         return False
 
-def generate_answers(doc: Document, model: str) -> List[str]:
-    """Generate answers for the document using the specified model."""
+def prefetch_contexts(documents: List[Document], retriever: "HybridRetriever",
+                      n_results: int = 5) -> Dict[str, List[List[Dict[str, Any]]]]:
+    """Retrieve context for every question of every document in one batched call.
+    
+    Returns:
+        Mapping of document source to one list of results per question
+    """
+    processor = DocumentProcessor()
+    queries = []
+    filters = []
+    spans = {}
+    
+    for doc in documents:
+        parsed = processor.parse_scenario_and_questions(doc)
+        start = len(queries)
+        queries.extend(f"{parsed['scenario']}\n{question}" for question in parsed["questions"])
+        # Scenarios usually name the tax year and forms; search only matching chunks
+        filters.extend(facets_from_query(query) for query in queries[start:])
+        spans[doc.metadata.get("source", doc.id)] = (start, len(queries))
+    
+    if not queries:
+        return {}
+    
+    results = retriever.retrieve_many(queries, n_results, filters=filters)
+    logger.info(f"Prefetched context for {len(queries)} questions across {len(documents)} documents")
+    return {source: results[start:end] for source, (start, end) in spans.items()}
+
+# Context assemblers per model; token counting needs the model's tokenizer, so they are reused
+_ASSEMBLERS: Dict[str, ContextAssembler] = {}
+
+def _get_assembler(model: str) -> ContextAssembler:
+    """Get the (cached) context assembler for a model"""
+    if model not in _ASSEMBLERS:
+        _ASSEMBLERS[model] = ContextAssembler(model)
+    return _ASSEMBLERS[model]
+
+def _answer_prompt(scenario: str, question: str, context: List[Dict[str, Any]]) -> str:
+    """Prompt asking one question about a scenario, with any retrieved context"""
+    prompt = f"SCENARIO:\n{scenario}\n\nQUESTION:\n{question}\n\n"
+    if context:
+        prompt += "RELEVANT INFORMATION:\n"
+        prompt += "".join(CONTEXT_ENTRY_FORMAT.format(text=ctx.get('text', '')) for ctx in context)
+        prompt += "\n"
+    return prompt + "ANSWER:"
+
+def _answer_question(model: str, index: int, question: str, prompt: str, filename: str,
+                     num_ctx: Optional[int] = None) -> Tuple[str, Optional[str]]:
+    """Ask the model one question; failures become an error answer for that question only
+    
+    Args:
+        num_ctx: Context window requested from Ollama, so the prompt is not truncated
+    
+    Returns:
+        The formatted answer and, if it failed, the error message
+    """
+    import requests
     try:
-        import requests
+        # Make a request to Ollama API
+        response = requests.post(
+            "http://localhost:11434/api/generate",
+            json={
+                "model": model,
+                "prompt": prompt,
+                "stream": False,
+                **({"options": {"num_ctx": num_ctx}} if num_ctx else {})
+            },
+            timeout=60
+        )
+        
+        if response.status_code == 200:
+            answer = response.json().get("response", "No answer generated")
+            logger.info(f"Generated answer {index+1} for {filename}")
+            return f"Q{index+1}: {question}\n\nA{index+1}: {answer}\n", None
+        logger.error(f"Error from Ollama API: {response.status_code} - {response.text}")
+        return f"Q{index+1}: {question}\n\nA{index+1}: Error generating answer\n", f"HTTP {response.status_code}"
+    except Exception as e:
+        logger.error(f"Error generating answer for question {index+1}: {e}")
+        return f"Q{index+1}: {question}\n\nA{index+1}: Error: {str(e)}\n", str(e)
+
+def generate_answers(doc: Document, model: str,
+                     contexts: Optional[List[List[Dict[str, Any]]]] = None,
+                     max_workers: Optional[int] = None, journal: Optional["RunJournal"] = None) -> List[str]:
+    """Generate answers for the document using the specified model.
+    
+    Failed questions come back as error answers; use
+    ``generate_answers_with_errors`` to tell them apart. Arguments are as for
+    that function.
+    """
+    return generate_answers_with_errors(doc, model, contexts, max_workers=max_workers, journal=journal)[0]
+
+def generate_answers_with_errors(doc: Document, model: str,
+                                 contexts: Optional[List[List[Dict[str, Any]]]] = None,
+                                 max_workers: Optional[int] = None,
+                                 journal: Optional["RunJournal"] = None) -> Tuple[List[str], List[Optional[str]]]:
+    """Generate answers for the document and report which questions failed.
+    
+    Questions are sent concurrently, up to the model's parallelism (Ollama
+    parallel slots), and the answers are returned in question order. Retrieved
+    context is packed into the model's context window by a ContextAssembler,
+    and the window is passed to Ollama as ``num_ctx``.
+    
+    Args:
+        doc: Scenario document
+        model: Ollama model name
+        contexts: Optional prefetched retrieval results, one list per question
+        max_workers: Concurrent requests (defaults to ``get_model_parallelism(model)``)
+        journal: Optional run journal; answers it already holds are reused and
+            every new answer is recorded as soon as it arrives
+    
+    Returns:
+        The answers in question order, and per question the error message
+        (None where the question was answered)
+    """
+    try:
+        from core.models import get_model_parallelism
+        from core.journal import content_hash
         
         # Parse scenario and questions
         processor = DocumentProcessor()
         parsed = processor.parse_scenario_and_questions(doc)
         
-        answers = []
         scenario = parsed["scenario"]
         questions = parsed["questions"]
+        filename = doc.metadata.get('filename')
+        if not questions:
+            return [], []
         
-        logger.info(f"Generating answers for {doc.metadata.get('filename')} with {model}")
+        logger.info(f"Generating answers for {filename} with {model}")
         
-        # Process each question with the model
+        # Prepare prompts with scenario, question and the prefetched context that fits the budget
+        assembler = _get_assembler(model)
+        prompts = []
         for i, question in enumerate(questions):
-            # Prepare prompt with scenario and question
-            prompt = f"SCENARIO:\n{scenario}\n\nQUESTION:\n{question}\n\nANSWER:"
-            
-            try:
-                # Make a request to Ollama API
-                response = requests.post(
-                    "http://localhost:11434/api/generate",
-                    json={
-                        "model": model,
-                        "prompt": prompt,
-                        "stream": False
-                    },
-                    timeout=60
-                )
-                
-                if response.status_code == 200:
-                    answer = response.json().get("response", "No answer generated")
-                    answers.append(f"Q{i+1}: {question}\n\nA{i+1}: {answer}\n")
-                    logger.info(f"Generated answer {i+1} for {doc.metadata.get('filename')}")
-                else:
-                    logger.error(f"Error from Ollama API: {response.status_code} - {response.text}")
-                    answers.append(f"Q{i+1}: {question}\n\nA{i+1}: Error generating answer\n")
-            except Exception as e:
-                logger.error(f"Error generating answer for question {i+1}: {e}")
-                answers.append(f"Q{i+1}: {question}\n\nA{i+1}: Error: {str(e)}\n")
+            context = contexts[i] if contexts and i < len(contexts) and contexts[i] else []
+            if context:
+                fixed_text = _answer_prompt(scenario, question, []) + "RELEVANT INFORMATION:\n\n"
+                context = assembler.select(context, fixed_text=fixed_text)
+            prompts.append(_answer_prompt(scenario, question, context))
+        
+        # Reuse answers completed by an earlier attempt of this run
+        document = doc.metadata.get("source", doc.id)
+        hashes = [content_hash(scenario, question) for question in questions]
+        answers: List[Optional[str]] = [None] * len(questions)
+        if journal is not None:
+            answers = [journal.get_output(model, document, "answer", i, input_hash=hashes[i])
+                       for i in range(len(questions))]
+        pending = [i for i, answer in enumerate(answers) if answer is None]
+        if len(pending) < len(questions):
+            logger.info(f"Reusing {len(questions) - len(pending)} journaled answers for {filename}")
+        
+        errors: List[Optional[str]] = [None] * len(questions)
         
-        return answers
+        def ask(i: int) -> Tuple[str, Optional[str]]:
+            text, error = _answer_question(model, i, questions[i], prompts[i], filename,
+                                           num_ctx=assembler.context_window)
+            if journal is not None:
+                journal.record(model, document, "answer", i, output=None if error else text,
+                               error=error, input_hash=hashes[i])
+            return text, error
+        
+        workers = max(1, min(max_workers or get_model_parallelism(model), len(pending) or 1))
+        if workers == 1:
+            results = [ask(i) for i in pending]
+        else:
+            # Dispatch questions concurrently and reassemble the answers in question order
+            with concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"answer-{model}") as executor:
+                results = list(executor.map(ask, pending))
+        for i, (text, error) in zip(pending, results):
+            answers[i], errors[i] = text, error
+        return answers, errors
     
     except Exception as e:
         logger.error(f"Error in generate_answers: {e}")
-        return [f"Error generating answers: {str(e)}"]
+        return [f"Error generating answers: {str(e)}"], [str(e)]
 
 def save_answers(doc: Document, answers: List[str], model: str) -> None:
     """Save the generated answers to a file."""
@@ -324,6 +968,14 @@ def save_answers(doc: Document, answers: List[str], model: str) -> None:
 
 def generate_feedback(doc: Document, answers: List[str], model: str) -> List[str]:
     """Generate feedback for the answers using the specified model."""
+    return generate_feedback_with_errors(doc, answers, model)[0]
+
+def generate_feedback_with_errors(doc: Document, answers: List[str], model: str) -> Tuple[List[str], Optional[str]]:
+    """Generate feedback for the answers and report whether the request failed
+    
+    Returns:
+        The feedback items, and the error message (None on success)
+    """
     try:
         import requests
         
@@ -359,15 +1011,17 @@ def generate_feedback(doc: Document, answers: List[str], model: str) -> List[str
             else:
                 logger.error(f"Error from Ollama API: {response.status_code} - {response.text}")
                 feedback.append("Error generating feedback")
+                return feedback, f"HTTP {response.status_code}"
         except Exception as e:
             logger.error(f"Error generating feedback: {e}")
             feedback.append(f"Error: {str(e)}")
+            return feedback, str(e)
         
-        return feedback
+        return feedback, None
     
     except Exception as e:
         logger.error(f"Error in generate_feedback: {e}")
-        return [f"Error generating feedback: {str(e)}"]
+        return [f"Error generating feedback: {str(e)}"], str(e)
 
 def save_feedback(doc: Document, feedback: List[str], model: str) -> None:
     """Save the generated feedback to a file."""
@@ -390,8 +1044,45 @@ def save_feedback(doc: Document, feedback: List[str], model: str) -> None:
         logger.error(f"Error saving feedback: {e}")
         return None
 
-def process_documents_sequentially(documents: List[Document], models: List[str]) -> None:
-    """Process documents one model at a time and generate feedback sequentially."""
+def _feedback_with_journal(doc: Document, answers: List[str], model: str,
+                           journal: Optional["RunJournal"] = None) -> List[str]:
+    """Generate feedback, reusing journaled feedback for identical answers"""
+    if journal is None:
+        return generate_feedback(doc, answers, model)
+    from core.journal import content_hash
+    document = doc.metadata.get("source", doc.id)
+    answers_hash = content_hash(*answers)
+    stored = journal.get_output(model, document, "feedback", input_hash=answers_hash)
+    if stored is not None:
+        return json.loads(stored)
+    feedback = generate_feedback(doc, answers, model)
+    failed = any(item.startswith("Error") for item in feedback)
+    journal.record(model, document, "feedback", output=None if failed else json.dumps(feedback),
+                   error="feedback generation failed" if failed else None, input_hash=answers_hash)
+    return feedback
+
+def _persist_with_journal(doc: Document, answers: List[str], feedback: List[str], model: str,
+                          journal: Optional["RunJournal"] = None) -> None:
+    """Write answers and feedback; the document counts as done only if every unit succeeded"""
+    if save_answers(doc, answers, model) is None or save_feedback(doc, feedback, model) is None:
+        if journal is not None:
+            journal.record(model, doc.metadata.get("source", doc.id), "persist", error="write failed")
+        raise IOError(f"Could not save results for {doc.metadata.get('filename')}")
+    if journal is None:
+        return
+    document = doc.metadata.get("source", doc.id)
+    complete = journal.is_done(model, document, "feedback") and all(
+        journal.is_done(model, document, "answer", i) for i in range(len(answers)))
+    # Partial results stay on disk, but the document is retried on resume
+    journal.record(model, document, "persist", error=None if complete else "incomplete answers or feedback")
+
+def process_documents_sequentially(documents: List[Document], models: List[str],
+                                   journal: Optional["RunJournal"] = None) -> None:
+    """Process documents one model at a time and generate feedback sequentially.
+    
+    With a run journal, documents already persisted by the journaled run are
+    skipped and partially answered documents only redo their missing units.
+    """
     try:
         # Create necessary directories
         ANSWERS_DIR.mkdir(parents=True, exist_ok=True)
@@ -400,10 +1091,18 @@ def process_documents_sequentially(documents: List[Document], models: List[str])
         METRICS_DIR.mkdir(parents=True, exist_ok=True)
         overall_metrics = {}
         
-        # Initialize vector database
-        vector_db_manager = VectorDatabaseManager()
+        # Initialize vector database (sharded if a shard registry exists)
+        from core.shards import open_vector_db
+        vector_db_manager = open_vector_db()
         vector_db_manager.initialize()
         
+        # Retrieval does not depend on the model, so fetch context for the whole run up front
+        try:
+            contexts = prefetch_contexts(documents, HybridRetriever(vector_db_manager))
+        except Exception as e:
+            logger.warning(f"Context prefetch failed, answering without retrieved context: {e}")
+            contexts = {}
+        
         # Process each model one at a time
         for model in models:
             logger.info(f"Processing documents with model: {model}")
@@ -411,20 +1110,22 @@ def process_documents_sequentially(documents: List[Document], models: List[str])
             start_model = time.time()
             for doc in documents:
                 start_doc = time.time()
+                source = doc.metadata.get("source", doc.id)
+                if journal is not None and journal.is_done(model, source, "persist"):
+                    logger.info(f"Skipping {doc.metadata.get('filename', 'unknown')}: already completed in run {journal.run_id}")
+                    model_metrics["skipped"] = model_metrics.get("skipped", 0) + 1
+                    continue
                 try:
                     logger.info(f"Processing document: {doc.metadata.get('filename', 'unknown')} with model: {model}")
                     
                     # Generate answers
-                    answers = generate_answers(doc, model)
-                    
-                    # Save answers
-                    save_answers(doc, answers, model)
+                    answers = generate_answers(doc, model, contexts.get(source), journal=journal)
                     
                     # Generate feedback
-                    feedback = generate_feedback(doc, answers, model)
+                    feedback = _feedback_with_journal(doc, answers, model, journal)
                     
-                    # Save feedback
-                    save_feedback(doc, feedback, model)
+                    # Save answers and feedback
+                    _persist_with_journal(doc, answers, feedback, model, journal)
                     
                     model_metrics["processed"] += 1
                 except Exception as e:
@@ -439,19 +1140,151 @@ def process_documents_sequentially(documents: List[Document], models: List[str])
         with open(metrics_file, "w", encoding="utf-8") as mf:
             json.dump(overall_metrics, mf, indent=4)
         logger.info(f"Metrics saved to {metrics_file}")
+        if journal is not None:
+            journal.finish()
         
     except Exception as e:
         logger.error(f"Error in sequential processing: {e}")
 
+@dataclass
+class DocumentJob:
+    """A document moving through the processing pipeline for one model"""
+    doc: Document
+    model: str
+    contexts: Optional[List[List[Dict[str, Any]]]] = None
+    answers: Optional[List[str]] = None
+    feedback: Optional[List[str]] = None
+    started: float = field(default_factory=time.time)
+    finished: float = 0.0
+
+def process_documents_pipelined(documents: List[Document], models: List[str], queue_size: int = 2,
+                                answer_workers: int = 1,
+                                journal: Optional["RunJournal"] = None) -> Dict[str, Dict[str, Any]]:
+    """Process documents through load -> retrieve -> answer -> feedback -> persist stages.
+    
+    Stages run concurrently with bounded queues between them, so document
+    N+1 is being answered while document N gets its feedback and is written
+    out. Models are still run one after another so only one model's weights
+    need to be resident. Retrieval is model-independent, so context for every
+    document is prefetched in one batch before the first model starts.
+    
+    Args:
+        documents: Scenario documents
+        models: Ollama models, processed in order
+        queue_size: Documents buffered between two stages
+        answer_workers: Documents answered, and reviewed, at once (questions
+            within a document are already sent concurrently)
+        journal: Optional run journal; documents it records as persisted are
+            skipped and completed answers or feedback are reused
+        
+    Returns:
+        Metrics per model, including per-stage throughput
+    """
+    from core.pipeline import Pipeline, Stage
+    
+    ANSWERS_DIR.mkdir(parents=True, exist_ok=True)
+    FEEDBACK_DIR.mkdir(parents=True, exist_ok=True)
+    METRICS_DIR = ROOT_DIR / "data" / "metrics"
+    METRICS_DIR.mkdir(parents=True, exist_ok=True)
+    overall_metrics = {}
+    
+    # Retrieval does not depend on the model, so fetch context for the whole run up front
+    # in one batched call; documents every model already finished are left out
+    pending = [doc for doc in documents
+               if journal is None or not all(journal.is_done(model, doc.metadata.get("source", doc.id), "persist")
+                                             for model in models)]
+    contexts: Dict[str, List[List[Dict[str, Any]]]] = {}
+    if pending:
+        try:
+            from core.shards import open_vector_db
+            vector_db_manager = open_vector_db()
+            vector_db_manager.initialize()
+            contexts = prefetch_contexts(pending, HybridRetriever(vector_db_manager))
+        except Exception as e:
+            logger.warning(f"Context prefetch failed, answering without retrieved context: {e}")
+    processor = DocumentProcessor()
+    
+    def load(job: DocumentJob) -> Optional[DocumentJob]:
+        if journal is not None and journal.is_done(job.model, job.doc.metadata.get("source", job.doc.id), "persist"):
+            logger.info(f"Skipping {job.doc.metadata.get('filename')}: already completed in run {journal.run_id}")
+            return None
+        if not processor.parse_scenario_and_questions(job.doc)["questions"]:
+            logger.warning(f"No questions found in {job.doc.metadata.get('filename')}, skipping")
+            return None
+        return job
+    
+    def retrieve(job: DocumentJob) -> DocumentJob:
+        job.contexts = contexts.get(job.doc.metadata.get("source", job.doc.id))
+        return job
+    
+    def answer(job: DocumentJob) -> DocumentJob:
+        job.answers = generate_answers(job.doc, job.model, job.contexts, journal=journal)
+        return job
+    
+    def feedback(job: DocumentJob) -> DocumentJob:
+        job.feedback = _feedback_with_journal(job.doc, job.answers, job.model, journal)
+        return job
+    
+    def persist(job: DocumentJob) -> DocumentJob:
+        _persist_with_journal(job.doc, job.answers, job.feedback, job.model, journal)
+        job.finished = time.time()
+        return job
+    
+    for model in models:
+        logger.info(f"Processing {len(documents)} documents with model: {model}")
+        pipeline = Pipeline([
+            Stage("load", load),
+            Stage("retrieve", retrieve),
+            Stage("answer", answer, workers=answer_workers),
+            Stage("feedback", feedback, workers=answer_workers),
+            Stage("persist", persist),
+        ], queue_size=queue_size)
+        
+        finished = pipeline.run(DocumentJob(doc, model) for doc in documents)
+        pipeline.log_report()
+        
+        stages = pipeline.report()
+        errors = sum(stats["errors"] for stats in stages.values())
+        overall_metrics[model] = {
+            "processed": len(finished),
+            "errors": errors,
+            "total_time": pipeline.wall_seconds,
+            "average_time_per_doc": pipeline.wall_seconds / len(finished) if finished else 0,
+            "average_latency_per_doc": sum(job.finished - job.started for job in finished) / len(finished) if finished else 0,
+            "stages": stages
+        }
+        logger.info(f"Completed processing with model {model}: {len(finished)} documents, {errors} errors "
+                    f"in {pipeline.wall_seconds:.1f}s")
+    
+    metrics_file = METRICS_DIR / "model_metrics.json"
+    with open(metrics_file, "w", encoding="utf-8") as mf:
+        json.dump(overall_metrics, mf, indent=4)
+    logger.info(f"Metrics saved to {metrics_file}")
+    if journal is not None:
+        journal.finish()
+    return overall_metrics
+
 def main():
     """Main function to handle CLI arguments."""
     parser = argparse.ArgumentParser(description="RAG Module for IRS Tax Analysis System")
     parser.add_argument('--init', action='store_true', help='Initialize vector database')
     parser.add_argument('--query', type=str, help='Query the vector database')
-    parser.add_argument('--add', type=str, help='Add document to vector database')
+    parser.add_argument('--add', type=str, help='Chunk and add a document or directory to the vector database')
+    parser.add_argument('--workers', type=int, metavar='N',
+                        help='With --add, processes for chunking and PDF extraction (default: one process)')
+    parser.add_argument('--shard-by', choices=['tax_year', 'publication'],
+                        help='With --add, store chunks in per-tax-year or per-publication shards')
+    parser.add_argument('--rebuild-shard', type=str, metavar='KEY',
+                        help='With --add, rebuild one shard (e.g. 2024) from the given path and swap it in')
+    parser.add_argument('--link-entities', action='store_true',
+                        help='Index which knowledge graph entities each stored chunk mentions (for graph retrieval)')
     parser.add_argument('--reset', action='store_true', help='Reset the vector database')
-    parser.add_argument('--process', action='store_true', help='Process documents sequentially')
+    parser.add_argument('--process', action='store_true', help='Process documents')
+    parser.add_argument('--sequential', action='store_true',
+                        help='With --process, handle one document at a time instead of pipelining stages')
     parser.add_argument('--models', nargs='+', default=["llama3:8b"], help='Models to use for processing')
+    parser.add_argument('--resume', nargs='?', const='latest', metavar='RUN_ID',
+                        help='With --process, resume a run (default: the latest unfinished one)')
     
     args = parser.parse_args()
     
@@ -472,6 +1305,33 @@ def main():
             logger.error(f"Error resetting vector database: {e}")
             sys.exit(1)
     
+    if args.add:
+        try:
+            from core.shards import ShardedVectorDatabase, open_vector_db
+            if args.shard_by or args.rebuild_shard:
+                vector_db_manager = ShardedVectorDatabase(shard_by=args.shard_by or "tax_year")
+            else:
+                vector_db_manager = open_vector_db()
+            vector_db_manager.initialize()
+            chunks = DocumentProcessor().iter_chunks(path=args.add, max_workers=args.workers)
+            if args.rebuild_shard:
+                vector_db_manager.build_shard(args.rebuild_shard, chunks)
+            else:
+                vector_db_manager.add_chunks(chunks)
+        except Exception as e:
+            logger.error(f"Error adding documents: {e}")
+            sys.exit(1)
+    
+    if args.link_entities:
+        try:
+            from core.shards import open_vector_db
+            vector_db_manager = open_vector_db()
+            vector_db_manager.initialize()
+            HybridRetriever(vector_db_manager, kg_enabled=True).index_mentions()
+        except Exception as e:
+            logger.error(f"Error linking entities: {e}")
+            sys.exit(1)
+    
     if args.process:
         try:
             # Load documents
@@ -489,10 +1349,21 @@ def main():
             
             logger.info(f"Will process with models: {', '.join(models)}")
             
-            # Process documents sequentially
-            process_documents_sequentially(documents, models)
+            # Journal completed units so an interrupted run can be resumed
+            from core.journal import RunJournal
+            journal = RunJournal(run_id=None if args.resume in (None, 'latest') else args.resume,
+                                 resume=args.resume is not None, models=models)
+            
+            # Process documents through the staged pipeline (or one at a time)
+            try:
+                if args.sequential:
+                    process_documents_sequentially(documents, models, journal=journal)
+                else:
+                    process_documents_pipelined(documents, models, journal=journal)
+            finally:
+                journal.close()
             
-            logger.info("Sequential processing completed successfully")
+            logger.info("Processing completed successfully")
         except Exception as e:
             logger.error(f"Error in processing: {e}")
             sys.exit(1)
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# Cross-encoder reranking for IRS Tax Analysis System
+
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple, Any
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[logging.StreamHandler()]
+)
+logger = logging.getLogger("rerank")
+
+class CrossEncoderReranker:
+    """Rescore retrieval candidates with a local cross-encoder."""
+
+    def __init__(self, model_name: str = "cross-encoder/ms-marco-MiniLM-L-6-v2",
+                 candidate_depth: int = 20, batch_size: int = 16,
+                 score_threshold: Optional[float] = None, cache_size: int = 10000,
+                 model: Any = None):
+        """Initialize the reranker.
+
+        Args:
+            model_name: sentence-transformers cross-encoder to load
+            candidate_depth: Number of first-stage candidates to fetch and rescore
+            batch_size: Number of (query, chunk) pairs scored per forward pass
+            score_threshold: Stop scoring once enough candidates reach this score
+            cache_size: Maximum number of cached pair scores
+            model: Preloaded model exposing ``predict(pairs, batch_size=...)``
+        """
+        self.model_name = model_name
+        self.candidate_depth = candidate_depth
+        self.batch_size = batch_size
+        self.score_threshold = score_threshold
+        self.cache_size = cache_size
+        self.model = model
+        self._cache: "OrderedDict[Tuple[str, str], float]" = OrderedDict()
+
+    def _load_model(self):
+        """Load the cross-encoder on first use"""
+        if self.model is None:
+            from sentence_transformers import CrossEncoder
+            self.model = CrossEncoder(self.model_name)
+            logger.info(f"Loaded cross-encoder {self.model_name}")
+        return self.model
+
+    @staticmethod
+    def _pair_key(query: str, candidate: Dict[str, Any]) -> Tuple[str, str]:
+        """Cache key for a (query, chunk) pair"""
+        chunk_key = candidate.get("id") or hashlib.sha1(candidate.get("text", "").encode("utf-8")).hexdigest()
+        return (query, chunk_key)
+
+    def _cache_get(self, key: Tuple[str, str]) -> Optional[float]:
+        score = self._cache.get(key)
+        if score is not None:
+            self._cache.move_to_end(key)
+        return score
+
+    def _cache_put(self, key: Tuple[str, str], score: float) -> None:
+        self._cache[key] = score
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def score(self, query: str, candidates: List[Dict[str, Any]]) -> List[float]:
+        """Score candidates for a query, using cached pair scores where possible"""
+        scores: List[Optional[float]] = []
+        pending = []
+        for i, candidate in enumerate(candidates):
+            cached = self._cache_get(self._pair_key(query, candidate))
+            scores.append(cached)
+            if cached is None:
+                pending.append(i)
+
+        if pending:
+            model = self._load_model()
+            pairs = [(query, candidates[i].get("text", "")) for i in pending]
+            predicted = model.predict(pairs, batch_size=self.batch_size)
+            for i, value in zip(pending, predicted):
+                scores[i] = float(value)
+                self._cache_put(self._pair_key(query, candidates[i]), scores[i])
+
+        return scores
+
+    def rerank(self, query: str, candidates: List[Dict[str, Any]], top_k: int = 5) -> List[Dict[str, Any]]:
+        """Rerank first-stage candidates and return the best ``top_k``.
+
+        Candidates are scored batch by batch in first-stage order. With a score
+        threshold set, scoring stops as soon as ``top_k`` candidates reach it.
+
+        Args:
+            query: Query text
+            candidates: Retrieval results with at least a ``text`` key
+            top_k: Number of results to return
+
+        Returns:
+            Candidates sorted by cross-encoder score, with ``retrieval_score`` keeping the original score
+        """
+        candidates = candidates[:self.candidate_depth]
+        scored = []
+        confident = 0
+
+        for start in range(0, len(candidates), self.batch_size):
+            batch = candidates[start:start + self.batch_size]
+            for candidate, value in zip(batch, self.score(query, batch)):
+                result = dict(candidate)
+                result["retrieval_score"] = candidate.get("score", 0.0)
+                result["score"] = value
+                scored.append(result)
+                if self.score_threshold is not None and value >= self.score_threshold:
+                    confident += 1
+
+            if self.score_threshold is not None and confident >= top_k:
+                logger.debug(f"Rerank cutoff after {len(scored)} of {len(candidates)} candidates")
+                break
+
+        scored.sort(key=lambda r: r["score"], reverse=True)
+        return scored[:top_k]
+
+    def clear_cache(self) -> None:
+        """Drop all cached pair scores"""
+        self._cache.clear()
@@ -0,0 +1,368 @@
+#!/usr/bin/env python3
+# Sharded vector collections for IRS Tax Analysis System
+
+import os
+import json
+import time
+import heapq
+import logging
+import concurrent.futures
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Any
+
+from core.chunking import Chunk
+from core.facets import MetadataExtractor
+from core.rag import CHROMA_DB_PATH, VectorDatabaseManager
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[logging.StreamHandler()]
+)
+logger = logging.getLogger("shards")
+
+SHARD_FACETS = ("tax_year", "publication")
+GENERAL_SHARD = "general"  # Chunks without a shard key (e.g. undated material)
+
+class ShardedVectorDatabase:
+    """Vector database split into one ChromaDB collection per tax year or publication.
+
+    A registry file maps each shard key to its live collection. Shards are
+    rebuilt into a staging collection and swapped in by rewriting the
+    registry, so a yearly IRS refresh replaces one shard while the others keep
+    serving. Queries are routed to the shards their filters name and fanned
+    out in parallel, and the per-shard top-k lists are merged by distance.
+
+    The class exposes the same ``embed``/``query``/``search`` interface as
+    ``VectorDatabaseManager``, so ``HybridRetriever`` works with either.
+    """
+
+    def __init__(self, db_dir: str = None, embedding_model: str = "sentence-transformers/all-mpnet-base-v2",
+                 base_name: str = "tax_documents", shard_by: str = "tax_year",
+                 max_workers: Optional[int] = None, embedding_batch_size: Optional[int] = None):
+        """Initialize the sharded database.
+
+        Args:
+            db_dir: ChromaDB directory (defaults to data/chroma_db)
+            embedding_model: Sentence-transformers model shared by all shards
+            base_name: Prefix of the shard collection names
+            shard_by: Facet the shards are keyed by ("tax_year" or "publication");
+                an existing registry's choice takes precedence
+            max_workers: Threads used to query shards in parallel
+            embedding_batch_size: Batch size for embedding (defaults to one that fits the memory limit)
+        """
+        if shard_by not in SHARD_FACETS:
+            raise ValueError(f"Cannot shard by {shard_by!r}; choose one of {', '.join(SHARD_FACETS)}")
+        self.db_dir = db_dir if db_dir is not None else str(CHROMA_DB_PATH)
+        self.base_name = base_name
+        self.max_workers = max_workers
+        self.registry_path = Path(self.db_dir) / f"{base_name}_shards.json"
+        self.registry = self._load_registry(shard_by)
+        self.shard_by = self.registry["shard_by"]
+        # Holds the shared ChromaDB client and embedding model
+        self.base = VectorDatabaseManager(self.db_dir, embedding_model, collection_name=base_name,
+                                          embedding_batch_size=embedding_batch_size)
+        self._managers: Dict[str, VectorDatabaseManager] = {}
+        self._executor: Optional[concurrent.futures.ThreadPoolExecutor] = None
+
+    @staticmethod
+    def exists(db_dir: str = None, base_name: str = "tax_documents") -> bool:
+        """Whether a shard registry exists in a database directory"""
+        db_dir = db_dir if db_dir is not None else str(CHROMA_DB_PATH)
+        return (Path(db_dir) / f"{base_name}_shards.json").exists()
+
+    def _load_registry(self, shard_by: str) -> Dict[str, Any]:
+        if self.registry_path.exists():
+            with open(self.registry_path, "r", encoding="utf-8") as f:
+                registry = json.load(f)
+            if registry.get("shard_by") != shard_by:
+                logger.warning(f"Shards are keyed by {registry.get('shard_by')}, ignoring shard_by={shard_by}")
+            return registry
+        return {"shard_by": shard_by, "shards": {}}
+
+    def _save_registry(self) -> None:
+        """Write the registry atomically; this is the commit point of a shard swap"""
+        self.registry_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.registry_path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.registry, f, indent=2)
+        os.replace(tmp_path, self.registry_path)
+
+    def initialize(self) -> None:
+        """Initialize the shared ChromaDB client and embedding model"""
+        self.base.initialize()
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        """Embed texts once for all shards"""
+        return self.base.embed(texts)
+
+    def shards(self) -> List[str]:
+        """Keys of the live shards"""
+        return sorted(self.registry["shards"])
+
+    def shard_key(self, metadata: Dict[str, Any]) -> str:
+        """Shard a chunk belongs to, from its facet metadata"""
+        value = metadata.get(self.shard_by)
+        return str(value) if value else GENERAL_SHARD
+
+    def _manager(self, collection_name: str) -> VectorDatabaseManager:
+        """Manager for one physical collection, sharing the base client and model"""
+        if collection_name not in self._managers:
+            if self.base.db_client is None:
+                self.base.initialize()
+            manager = VectorDatabaseManager(self.db_dir, self.base.embedding_model,
+                                            collection_name=collection_name,
+                                            embedding_batch_size=self.base.embedding_batch_size)
+            manager.db_client = self.base.db_client
+            manager.embed = self.base.embed
+            self._managers[collection_name] = manager
+        return self._managers[collection_name]
+
+    def get_shard(self, key: str) -> Optional[VectorDatabaseManager]:
+        """Manager of a live shard, or None if the shard does not exist"""
+        entry = self.registry["shards"].get(key)
+        return self._manager(entry["collection"]) if entry else None
+
+    def route(self, filters: Optional[Dict[str, Any]] = None) -> List[str]:
+        """Shards a query has to search.
+
+        Filters naming the shard facet select those shards plus the general
+        shard; anything else (or a shard that does not exist) searches all.
+        """
+        shards = self.shards()
+        value = (filters or {}).get(self.shard_by)
+        if not value:
+            return shards
+        values = value if isinstance(value, (list, tuple, set)) else [value]
+        selected = [str(v) for v in values if str(v) in self.registry["shards"]]
+        if len(selected) < len(values):
+            return shards
+        if GENERAL_SHARD in self.registry["shards"]:
+            selected.append(GENERAL_SHARD)
+        return selected
+
+    def _fan_out(self, keys: List[str], search: Callable[[VectorDatabaseManager], Dict[str, List]]) -> List[Dict[str, List]]:
+        """Run a search on several shards, in parallel when there is more than one"""
+        managers = [self.get_shard(key) for key in keys]
+        if len(managers) == 1:
+            return [search(managers[0])]
+        if self._executor is None:
+            self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers,
+                                                                   thread_name_prefix="shard")
+        return list(self._executor.map(search, managers))
+
+    @staticmethod
+    def _merge(raws: List[Dict[str, List]], n_queries: int, n_results: int) -> Dict[str, List]:
+        """Merge per-shard results into one top-k list per query by distance"""
+        merged = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        for i in range(n_queries):
+            candidates = []
+            for raw in raws:
+                if not raw.get("ids"):
+                    continue
+                candidates.extend(zip(raw["distances"][i], raw["ids"][i], raw["documents"][i], raw["metadatas"][i]))
+            top = heapq.nsmallest(n_results, candidates, key=lambda candidate: candidate[0])
+            merged["distances"].append([c[0] for c in top])
+            merged["ids"].append([c[1] for c in top])
+            merged["documents"].append([c[2] for c in top])
+            merged["metadatas"].append([c[3] for c in top])
+        return merged
+
+    def query(self, query_embeddings: List[List[float]], n_results: int = 5,
+              where: Optional[Dict[str, Any]] = None) -> Dict[str, List]:
+        """Search every shard and merge the results"""
+        return self._merge(
+            self._fan_out(self.shards(), lambda shard: shard.query(query_embeddings, n_results=n_results, where=where)),
+            len(query_embeddings), n_results
+        )
+
+    def search(self, query_embeddings: List[List[float]], n_results: int = 5,
+               filters: Optional[Dict[str, Any]] = None, exact_search_threshold: int = 2000) -> Dict[str, List]:
+        """Search only the shards the filters route to, pre-filtering each by the remaining facets"""
+        keys = self.route(filters)
+        if not keys:
+            return self._merge([], len(query_embeddings), n_results)
+        # Routing already applied the shard facet
+        shard_filters = {facet: value for facet, value in (filters or {}).items() if facet != self.shard_by}
+        return self._merge(
+            self._fan_out(keys, lambda shard: shard.search(query_embeddings, n_results=n_results, filters=shard_filters,
+                                                           exact_search_threshold=exact_search_threshold)),
+            len(query_embeddings), n_results
+        )
+
+    def get_chunks(self, ids: List[str], where: Optional[Dict[str, Any]] = None) -> Dict[str, List]:
+        """Fetch stored chunks by ID from whichever shards hold them"""
+        merged = {"ids": [], "documents": [], "metadatas": []}
+        if not ids:
+            return merged
+        for raw in self._fan_out(self.shards(), lambda shard: shard.get_chunks(ids, where=where)):
+            for key in merged:
+                merged[key].extend(raw[key])
+        return merged
+
+    def iter_chunks(self, page_size: int = 1000):
+        """Yield (id, text) for every chunk in every shard"""
+        for key in self.shards():
+            yield from self.get_shard(key).iter_chunks(page_size)
+
+    def _create_shard(self, key: str, staging: bool = False) -> VectorDatabaseManager:
+        """Create a new physical collection for a shard"""
+        suffix = f"__{int(time.time() * 1000)}" if staging else ""
+        collection_name = f"{self.base_name}_{key}{suffix}"
+        manager = self._manager(collection_name)
+        manager.get_collection()
+        return manager
+
+    def _register(self, key: str, manager: VectorDatabaseManager, count: int) -> None:
+        self.registry["shards"][key] = {
+            "collection": manager.collection_name,
+            "count": count,
+            "built_at": time.strftime("%Y-%m-%dT%H:%M:%S")
+        }
+
+    def _drop_collection(self, collection_name: str) -> None:
+        """Delete a physical collection and its facet index"""
+        self._managers.pop(collection_name, None)
+        try:
+            self.base.db_client.delete_collection(collection_name)
+        except Exception as e:
+            logger.warning(f"Could not delete collection {collection_name}: {e}")
+        facets_path = Path(self.db_dir) / f"{collection_name}_facets.json"
+        if facets_path.exists():
+            facets_path.unlink()
+
+    @staticmethod
+    def _with_metadata(chunks: Iterable[Chunk], extractor: MetadataExtractor) -> Iterator[Tuple[Chunk, Dict[str, Any]]]:
+        """Pair chunks with their facet metadata, one source file at a time
+
+        The tax year and publication often first appear after a file's opening
+        chunks (cover page, contents), so a file's chunks are held until the
+        file ends and then all get the document-level values found in it.
+        """
+        def finish(items: List[Tuple[Chunk, Dict[str, Any]]]) -> List[Tuple[Chunk, Dict[str, Any]]]:
+            facets = extractor.document_facets(items[0][0].source)
+            for _, metadata in items:
+                metadata.update(facets)
+            return items
+
+        pending: List[Tuple[Chunk, Dict[str, Any]]] = []
+        for chunk in chunks:
+            if pending and chunk.source != pending[0][0].source:
+                yield from finish(pending)
+                pending = []
+            pending.append((chunk, dict(chunk.to_metadata(), **extractor.extract(chunk.text, chunk.source))))
+        if pending:
+            yield from finish(pending)
+
+    def add_chunks(self, chunks: Iterable[Chunk], batch_size: int = 256) -> int:
+        """Upsert chunks into the live shards their metadata routes them to
+
+        Args:
+            chunks: Iterable of Chunk objects
+            batch_size: Chunks embedded and written per shard batch
+
+        Returns:
+            Number of chunks stored
+        """
+        extractor = MetadataExtractor()
+        pending: Dict[str, List[Chunk]] = {}
+        metadatas: Dict[str, List[Dict[str, Any]]] = {}
+        touched = set()
+        stored = 0
+
+        def write(key: str) -> None:
+            shard = self.get_shard(key)
+            if shard is None:
+                shard = self._create_shard(key)
+                self._register(key, shard, 0)
+            shard.upsert(pending[key], metadatas[key])
+            touched.add(key)
+            pending[key], metadatas[key] = [], []
+
+        for chunk, metadata in self._with_metadata(chunks, extractor):
+            key = self.shard_key(metadata)
+            pending.setdefault(key, []).append(chunk)
+            metadatas.setdefault(key, []).append(metadata)
+            stored += 1
+            if len(pending[key]) >= batch_size:
+                write(key)
+        for key in list(pending):
+            if pending[key]:
+                write(key)
+
+        for key in touched:
+            shard = self.get_shard(key)
+            shard.facets.save()
+            self.registry["shards"][key]["count"] = shard.get_collection().count()
+        self._save_registry()
+        logger.info(f"Stored {stored} chunks in shards: {', '.join(sorted(touched))}")
+        return stored
+
+    def build_shard(self, key: str, chunks: Iterable[Chunk], batch_size: int = 256) -> int:
+        """Rebuild one shard from scratch and swap it in.
+
+        The chunks are written to a staging collection; only once every batch
+        has been stored does the registry switch to it and the old collection
+        get dropped. On failure the live shard is left untouched.
+
+        Args:
+            key: Shard key, e.g. "2024" or "p17"
+            chunks: All chunks of the shard
+            batch_size: Chunks embedded and written per batch
+
+        Returns:
+            Number of chunks stored; chunks whose files route them to another
+            shard are skipped and counted in the log
+        """
+        extractor = MetadataExtractor()
+        staging = self._create_shard(key, staging=True)
+        batch: List[Chunk] = []
+        metadatas: List[Dict[str, Any]] = []
+        stored = 0
+        skipped: Dict[str, int] = {}
+        try:
+            for chunk, metadata in self._with_metadata(chunks, extractor):
+                chunk_key = self.shard_key(metadata)
+                if chunk_key != key:
+                    skipped[chunk_key] = skipped.get(chunk_key, 0) + 1
+                    continue
+                batch.append(chunk)
+                metadatas.append(metadata)
+                if len(batch) >= batch_size:
+                    staging.upsert(batch, metadatas)
+                    stored += len(batch)
+                    batch, metadatas = [], []
+            if batch:
+                staging.upsert(batch, metadatas)
+                stored += len(batch)
+            staging.facets.save()
+        except Exception:
+            logger.error(f"Rebuilding shard {key} failed; keeping the live shard")
+            self._drop_collection(staging.collection_name)
+            raise
+
+        if skipped:
+            logger.warning(f"Skipped chunks belonging to other shards while rebuilding {key}: "
+                           + ", ".join(f"{count} for {other}" for other, count in sorted(skipped.items())))
+        previous = self.registry["shards"].get(key)
+        self._register(key, staging, stored)
+        self._save_registry()
+        if previous and previous["collection"] != staging.collection_name:
+            self._drop_collection(previous["collection"])
+        logger.info(f"Swapped in shard {key} ({stored} chunks) as {staging.collection_name}")
+        return stored
+
+    def drop_shard(self, key: str) -> None:
+        """Remove a shard from the registry and delete its collection"""
+        entry = self.registry["shards"].pop(key, None)
+        if entry is None:
+            return
+        self._save_registry()
+        self._drop_collection(entry["collection"])
+
+def open_vector_db(db_dir: str = None, base_name: str = "tax_documents"):
+    """Open the sharded database if a shard registry exists, else the single collection"""
+    if ShardedVectorDatabase.exists(db_dir, base_name):
+        return ShardedVectorDatabase(db_dir, base_name=base_name)
+    return VectorDatabaseManager(db_dir, collection_name=base_name)
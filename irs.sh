@@ -40,7 +40,11 @@ function show_help {
     echo "  --quiet, -q            Reduce verbosity"
     echo "  --optimize, -O         Apply hardware optimization"
     echo "  --feedback, -f         Enable feedback generation (default: enabled)"
-    echo "  --parallel, -p N       Set number of parallel processes"
+    echo "  --parallel, -p N       Parsing processes for chunking and PDF extraction (bulk)"
+    echo "  --ingest PATH          Chunk PATH into the vector database before processing (bulk)"
+    echo "  --answer-workers N     Documents answered at once (bulk, default: 1)"
+    echo "  --enqueue              Queue bulk tasks for workers on other nodes (bulk)"
+    echo "  --worker               Process tasks from the shared work queue (bulk)"
     echo "  --retry                Retry operation (for setup/diagnose)"
     echo
     echo "Examples:"
@@ -168,9 +172,10 @@ case "$COMMAND" in
         echo "Running bulk analysis on all documents in data/docs..."
         activate_venv
         
-        # Always use the default models (llama3:8b, phi4, mixtral:8x7b) for bulk processing.
-        echo "Processing with default models: llama3:8b, phi4, mixtral:8x7b."
-        python "$ROOT_DIR/core/rag.py" --process --models "llama3:8b" "phi4" "mixtral:8x7b" "$@"
+        # Uses the default models (llama3:8b, phi4, mixtral:8x7b) unless --model is given;
+        # --parallel N sizes the parsing pool used by --ingest (default: based on available cores);
+        # model requests are bounded by Ollama's parallel slots and --answer-workers instead
+        python "$ROOT_DIR/apps/bulk/run.py" "$@"
         ;;
     
     web|streamlit)
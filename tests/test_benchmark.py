@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# Unit tests for the retrieval benchmark harness
+
+import sys
+import unittest
+from pathlib import Path
+from unittest.mock import MagicMock
+
+import numpy as np
+
+# Add parent directory to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from apps.benchmark.harness import (BenchmarkConfig, Corpus, FlatIndex, LabeledQuery, RetrievalBenchmark,
+                                    build_grid, recall_at_k, reciprocal_rank, recommend)
+
+class TestRetrievalBenchmark(unittest.TestCase):
+    """Test cases for the retrieval benchmark harness"""
+
+    def setUp(self):
+        """Create a random corpus whose labels are each query's exact neighbours"""
+        rng = np.random.default_rng(0)
+        embeddings = rng.normal(size=(200, 16)).astype(np.float32)
+        embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+        ids = [f"chunk{i}" for i in range(200)]
+        self.corpus = Corpus(ids, [f"text about topic {i % 7}" for i in range(200)], [{}] * 200, embeddings)
+        self.queries = embeddings[:10] + rng.normal(scale=0.05, size=(10, 16)).astype(np.float32)
+        exact = FlatIndex(embeddings)
+        labels = [LabeledQuery(f"topic {i}", [ids[row] for row, _ in exact.search(q / np.linalg.norm(q), 3)])
+                  for i, q in enumerate(self.queries)]
+        self.benchmark = RetrievalBenchmark(self.corpus, labels, self.queries)
+
+    def test_metrics(self):
+        """Test recall@k and reciprocal rank"""
+        self.assertEqual(recall_at_k(["a", "b", "c"], ["b", "d"]), 0.5)
+        self.assertEqual(reciprocal_rank(["a", "b", "c"], ["b", "d"]), 0.5)
+        self.assertEqual(reciprocal_rank(["a"], ["z"]), 0.0)
+
+    def test_quantization_memory_and_recall(self):
+        """Test that quantized flat indexes shrink memory while keeping recall"""
+        results = self.benchmark.sweep(build_grid([3], [], [], ["none", "float16", "int8"], [0.0], [0]))
+        by_quantization = {r["quantization"]: r for r in results}
+
+        # Assertions
+        self.assertEqual(by_quantization["none"]["recall"], 1.0)
+        self.assertEqual(by_quantization["none"]["mrr"], 1.0)
+        self.assertGreaterEqual(by_quantization["int8"]["recall"], 0.9)
+        self.assertAlmostEqual(by_quantization["float16"]["index_mb"] * 2, by_quantization["none"]["index_mb"])
+        self.assertLess(by_quantization["int8"]["index_mb"], by_quantization["float16"]["index_mb"])
+
+    def test_hnsw(self):
+        """Test HNSW configurations run end to end"""
+        results = self.benchmark.sweep([BenchmarkConfig(index="hnsw", m=8, ef=50, k=3)])
+
+        # Assertions
+        self.assertEqual(len(results), 1)
+        self.assertGreaterEqual(results[0]["recall"], 0.8)
+        self.assertGreater(results[0]["p99_ms"], 0.0)
+
+    def test_facet_filter_and_graph_fusion(self):
+        """Test the HybridRetriever knobs: facet filters from the question and graph RRF weight"""
+        metadatas = [{"tax_year": 2023 if i % 2 else 2022} for i in range(200)]
+        corpus = Corpus(self.corpus.ids, self.corpus.documents, metadatas, self.corpus.embeddings)
+        graph = MagicMock()
+        graph.rank_chunks.return_value = [("chunk199", 1.0), ("chunk198", 0.5)]
+        labels = [LabeledQuery("What is owed for tax year 2023?", ["chunk199"])]
+        benchmark = RetrievalBenchmark(corpus, labels, self.queries[:1], graph_retriever=graph)
+        index = benchmark.build_index(BenchmarkConfig(index="flat"))
+        question, query = labels[0].question, benchmark.queries[0]
+
+        filtered = benchmark.retrieve(index, BenchmarkConfig(index="flat", k=3, facet_filter=True), question, query)
+        fused = benchmark.retrieve(index, BenchmarkConfig(index="flat", k=3, facet_filter=True, graph_weight=0.9),
+                                   question, query)
+
+        # Assertions
+        self.assertTrue(all(int(chunk_id[5:]) % 2 for chunk_id in filtered))
+        self.assertEqual(fused[0], "chunk199")
+        # The graph hit outside the 2023 filter is dropped
+        self.assertNotIn("chunk198", fused)
+        self.assertNotIn("chunk199", filtered)
+        graph.rank_chunks.assert_called_with(question, k=3)
+
+    def test_grid_repeats_rrf_k_only_with_a_graph_weight(self):
+        """Test that graph-free configs are not repeated for each RRF k"""
+        grid = build_grid([3], [], [], ["none"], [0.0, 0.3], [0], facet_filters=[False, True], rrf_k_values=[20, 60])
+        self.assertEqual(len(grid), 6)
+        self.assertEqual(len({config.label for config in grid}), 6)
+
+    def test_recommend_cheapest_within_tolerance(self):
+        """Test picking the fastest configuration that keeps recall"""
+        results = [
+            {"config": "slow", "recall": 0.95, "p50_ms": 9.0, "index_mb": 10.0, "k": 5},
+            {"config": "fast", "recall": 0.94, "p50_ms": 2.0, "index_mb": 10.0, "k": 5},
+            {"config": "fastest", "recall": 0.70, "p50_ms": 1.0, "index_mb": 2.0, "k": 3},
+        ]
+        self.assertEqual(recommend(results, tolerance=0.02)["config"], "fast")
+
+if __name__ == "__main__":
+    unittest.main()
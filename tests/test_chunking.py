@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# Unit tests for structure-aware chunking
+
+import sys
+import unittest
+from unittest.mock import MagicMock
+import tempfile
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from core.chunking import StructureAwareChunker
+from core.rag import DocumentProcessor, VectorDatabaseManager
+
+PUBLICATION = """Chapter 1
+Filing Information
+
+This chapter discusses who must file. """ + "You must file if your gross income is over the filing limit. " * 30 + """
+
+Line 1a. Enter the total wages from Form W-2, box 1.
+Line 2b. Enter taxable interest.
+
+Standard Deduction Table
+Filing status       Amount      Age 65 or older
+Single              $14,600     $16,550
+Married jointly     $29,200     $30,750
+
+Chapter 2
+Dependents
+A dependent is either a qualifying child or a qualifying relative.
+"""
+
+class TestStructureAwareChunker(unittest.TestCase):
+    """Test cases for StructureAwareChunker class"""
+
+    def setUp(self):
+        """Create a chunker that estimates tokens from characters"""
+        self.chunker = StructureAwareChunker(chunk_tokens=120, overlap_tokens=20, model_name="none")
+        self.chunks = list(self.chunker.chunk_text(PUBLICATION, source="p17.txt"))
+
+    def test_offsets_point_into_source(self):
+        """Test that every chunk's offsets reproduce its text"""
+        for chunk in self.chunks:
+            self.assertEqual(PUBLICATION[chunk.start:chunk.end], chunk.text)
+
+    def test_windows_are_token_sized_with_overlap(self):
+        """Test that long prose is windowed with overlapping spans"""
+        prose = [c for c in self.chunks if c.section == "Chapter 1 / Filing Information" and c.kind == "text"]
+
+        # Assertions
+        self.assertGreater(len(prose), 2)
+        for chunk in prose:
+            self.assertLessEqual(self.chunker.counter.count(chunk.text), 120)
+        self.assertLess(prose[1].start, prose[0].end)
+
+    def test_structure_boundaries(self):
+        """Test that chapters, headings and tables start their own chunks"""
+        table = [c for c in self.chunks if c.kind == "table"]
+
+        # Assertions
+        self.assertEqual(len(table), 1)
+        self.assertTrue(table[0].text.startswith("Standard Deduction Table"))
+        self.assertIn("$29,200", table[0].text)
+        self.assertEqual(self.chunks[-1].section, "Chapter 2 / Dependents")
+        self.assertTrue(self.chunks[-1].text.startswith("Chapter 2"))
+
+    def test_chunk_lines_is_lazy(self):
+        """Test that chunks are produced before the input is exhausted"""
+        consumed = []
+
+        def lines():
+            for line in PUBLICATION.splitlines(keepends=True):
+                consumed.append(line)
+                yield line
+
+        next(self.chunker.chunk_lines(lines(), source="p17.txt"))
+        self.assertLess(len(consumed), len(PUBLICATION.splitlines()))
+
+    def test_ids_distinguish_same_named_files(self):
+        """Test that chunk IDs differ for files with the same name in different directories"""
+        first = next(self.chunker.chunk_text(PUBLICATION, source="2023/p17.txt"))
+        second = next(self.chunker.chunk_text(PUBLICATION, source="2024/p17.txt"))
+
+        # Assertions
+        self.assertNotEqual(first.id, second.id)
+        self.assertTrue(first.id.startswith("p17.txt-"))
+        self.assertEqual(first.id, next(self.chunker.chunk_text(PUBLICATION, source="2023/p17.txt")).id)
+
+class TestChunkIngestion(unittest.TestCase):
+    """Test cases for chunk ingestion into the vector database"""
+
+    def test_add_chunks_in_batches(self):
+        """Test that chunks from the docs directory are upserted in batches"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            (Path(temp_dir) / "p17.txt").write_text(PUBLICATION, encoding="utf-8")
+            chunker = StructureAwareChunker(chunk_tokens=120, overlap_tokens=20, model_name="none")
+            chunks = DocumentProcessor(temp_dir).iter_chunks(chunker)
+
+            vector_db = VectorDatabaseManager(db_dir=temp_dir)
+            vector_db.get_collection = MagicMock()
+            vector_db.embed = MagicMock(side_effect=lambda texts: [[0.0] for _ in texts])
+            stored = vector_db.add_chunks(chunks, batch_size=3)
+
+        # Assertions
+        upsert = vector_db.get_collection.return_value.upsert
+        self.assertGreater(stored, 3)
+        self.assertEqual(upsert.call_count, -(-stored // 3))
+        metadata = upsert.call_args_list[0].kwargs["metadatas"][0]
+        self.assertEqual(metadata["start"], 0)
+        self.assertIn("section", metadata)
+
+    def test_chunking_in_worker_processes(self):
+        """Test that chunking files in a process pool gives the same chunks in the same order"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            for year in (2022, 2023, 2024):
+                (Path(temp_dir) / f"p17--{year}.txt").write_text(PUBLICATION, encoding="utf-8")
+            chunker = StructureAwareChunker(chunk_tokens=120, overlap_tokens=20, model_name="none")
+            serial = list(DocumentProcessor(temp_dir).iter_chunks(chunker))
+            parallel = list(DocumentProcessor(temp_dir).iter_chunks(chunker, max_workers=2))
+
+        # Assertions
+        self.assertGreater(len(serial), 3)
+        self.assertEqual([(c.id, c.text) for c in parallel], [(c.id, c.text) for c in serial])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# Unit tests for prompt context assembly
+
+import sys
+import unittest
+from unittest.mock import MagicMock
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from core.context import ContextAssembler, TokenCounter, get_context_window
+from core.analysis import TaxAnalyzer
+from core.rag import _answer_prompt
+
+class TestContextWindows(unittest.TestCase):
+    """Test cases for per-model context windows"""
+
+    def test_known_models(self):
+        """Test lookup by model family prefix"""
+        self.assertEqual(get_context_window("phi4"), 16384)
+        self.assertEqual(get_context_window("llama3:8b"), 8192)
+        self.assertEqual(get_context_window("unknown-model"), 2048)
+
+    def test_overrides(self):
+        """Test that configured windows take precedence"""
+        self.assertEqual(get_context_window("phi4:latest", {"phi4": 4096}), 4096)
+        self.assertEqual(get_context_window("llama3:8b", {"phi4": 4096}), 8192)
+
+class TestContextAssembler(unittest.TestCase):
+    """Test cases for ContextAssembler class"""
+
+    def make_assembler(self, window, **kwargs):
+        """Create an assembler that estimates tokens as 4 characters each"""
+        counter = TokenCounter("unknown-model")
+        return ContextAssembler("unknown-model", context_window=window, reserve_tokens=0,
+                                min_chunk_tokens=1, token_counter=counter, **kwargs)
+
+    def test_respects_budget(self):
+        """Test that selected context never exceeds the token budget"""
+        assembler = self.make_assembler(100)
+        contexts = [{"text": f"topic{i} " * 40, "score": 1.0 - i * 0.1} for i in range(5)]
+        selected = assembler.select(contexts, fixed_text="x" * 40)
+
+        # Assertions
+        used = sum(assembler.counter.count(c["text"]) + assembler.counter.count(assembler.separator) for c in selected)
+        self.assertLessEqual(used, assembler.budget("x" * 40))
+        self.assertGreater(len(selected), 0)
+
+    def test_drops_near_duplicates(self):
+        """Test that near-duplicate chunks are dropped by MMR"""
+        assembler = self.make_assembler(10000)
+        text = "The home office deduction is figured on Form 8829 for self-employed taxpayers."
+        contexts = [
+            {"text": text, "score": 0.9},
+            {"text": text + " ", "score": 0.85},
+            {"text": "Schedule C reports profit or loss from a business.", "score": 0.5},
+        ]
+        selected = assembler.select(contexts)
+
+        # Assertions
+        self.assertEqual(len(selected), 2)
+        self.assertIn("Schedule C", selected[1]["text"])
+
+    def test_trims_overlapping_windows(self):
+        """Test that overlapping chunk windows of one source are trimmed"""
+        assembler = self.make_assembler(10000)
+        source = " ".join(f"line{i:02d}" for i in range(17))[:100]
+        contexts = [
+            {"text": source[0:60], "score": 0.9, "metadata": {"source": "p17", "start": 0, "end": 60}},
+            {"text": source[40:100], "score": 0.8, "metadata": {"source": "p17", "start": 40, "end": 100}},
+        ]
+        selected = assembler.select(contexts)
+
+        # Assertions
+        self.assertEqual(selected[1]["text"], source[60:100])
+        self.assertEqual(selected[1]["metadata"]["start"], 60)
+
+    def test_tables_render_only_when_selected(self):
+        """Test that table entries are rendered to markdown only if they are packed"""
+        assembler = self.make_assembler(10000)
+        selected_table, skipped_table = MagicMock(), MagicMock()
+        selected_table.summary.return_value = "Table from p15.pdf (Page 4): percentage method"
+        selected_table.to_markdown.return_value = "| Wages | Rate |"
+        skipped_table.summary.return_value = "Table from p15.pdf (Page 4): percentage method"
+        contexts = [
+            {"table": selected_table, "score": 0.9},
+            {"table": skipped_table, "score": 0.8},
+        ]
+        selected = assembler.select(contexts)
+
+        # Assertions: the second table is a duplicate and is never rendered
+        self.assertEqual([c["text"] for c in selected], ["| Wages | Rate |"])
+        skipped_table.to_markdown.assert_not_called()
+
+class TestTaxAnalyzerBudget(unittest.TestCase):
+    """Test cases for budgeted prompt construction"""
+
+    def test_prompt_fits_model_window(self):
+        """Test that the analyzer passes num_ctx and packs context within it"""
+        model_manager = MagicMock()
+        model_manager.generate.return_value = "Answer"
+        retriever = MagicMock(spec=["retrieve"])
+        retriever.retrieve.return_value = [{"text": "word " * 2000, "score": 1.0, "metadata": {"source": "a"}}]
+
+        analyzer = TaxAnalyzer(model_manager, retriever, context_windows={"tiny": 600}, reserve_tokens=100)
+        analyzer.analyze_question("Scenario", "Question?", "tiny")
+
+        # Assertions
+        prompt = model_manager.generate.call_args.args[1]
+        self.assertLessEqual(TokenCounter("tiny").count(prompt), 500)
+        self.assertEqual(model_manager.generate.call_args.kwargs["options"], {"num_ctx": 600})
+
+    def test_prompts_frame_chunks_as_budgeted(self):
+        """Test that each chunk adds exactly its text plus the assembler's separator to the prompts"""
+        analyzer = TaxAnalyzer(MagicMock(), MagicMock(spec=["retrieve"]))
+        one, two = [{"text": "alpha"}], [{"text": "alpha"}, {"text": "beta"}]
+
+        # Assertions
+        for build in (analyzer._create_prompt, _answer_prompt):
+            added = len(build("Scenario", "Question?", two)) - len(build("Scenario", "Question?", one))
+            self.assertEqual(added, len("beta") + len(ContextAssembler.separator))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# Unit tests for knowledge graph entity extraction
+
+import os
+import sys
+import unittest
+import tempfile
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from core.extraction import AhoCorasick, EntityExtractor, extract_corpus
+from core.knowledge_graph import TaxEntity, TaxKnowledgeGraph
+
+class TestAhoCorasick(unittest.TestCase):
+    """Test cases for AhoCorasick class"""
+
+    def test_overlapping_whole_word_matches(self):
+        """Test that overlapping terms all match, but only on word boundaries"""
+        automaton = AhoCorasick({"tax credit": "short", "child tax credit": "long", "he": "word"})
+        matches = [value for _, _, value in automaton.iter("The Child  Tax\nCredit, then the tax credits.")]
+
+        # Assertions
+        self.assertEqual(matches, ["long", "short"])
+
+class TestEntityExtractor(unittest.TestCase):
+    """Test cases for EntityExtractor class"""
+
+    def test_patterns_and_dictionary(self):
+        """Test one-pass pattern matching together with dictionary lookups"""
+        text = ("The taxpayer John Smith filed Form 1040-sr and form W-2.\n"
+                "He claimed the Standard Deduction and the earned income tax credit.")
+        entities = EntityExtractor().extract(text)
+
+        # Assertions
+        self.assertEqual(entities, [("taxpayer", "John Smith"), ("form", "1040-SR"), ("form", "W-2"),
+                                    ("deduction", "Standard Deduction"), ("credit", "Earned Income Tax Credit")])
+
+    def test_custom_patterns_keep_their_groups(self):
+        """Test that patterns with several groups report their first group"""
+        extractor = EntityExtractor({"schedule": [r"Schedule\s+(([A-Z])(?:-[0-9])?)\b"], "form": [r"Form\s+(\d+)"]},
+                                    dictionary={})
+
+        # Assertions
+        self.assertEqual(extractor.extract("Attach Schedule C-1 to Form 1040."),
+                         [("schedule", "C-1"), ("form", "1040")])
+
+class TestExtractCorpus(unittest.TestCase):
+    """Test cases for corpus extraction in a process pool"""
+
+    def test_corpus_is_extracted_in_parallel_and_deduplicated(self):
+        """Test that entities from many files are inserted once"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            for i in range(6):
+                Path(temp_dir, f"{i}.txt").write_text(
+                    f"Taxpayer Alex Doe{'s' * i} attached Form 8863 for the American Opportunity Credit.")
+            kg = TaxKnowledgeGraph(save_path=os.path.join(temp_dir, "kg.json"))
+            kg.add_entity(TaxEntity("Schedule 3", "form"))
+            Path(temp_dir, "known.txt").write_text("Credits flow through schedule 3.")
+
+            added = extract_corpus(kg, [temp_dir], max_workers=2, chunksize=2)
+
+            # Assertions
+            self.assertEqual(added, 8)
+            self.assertIsNotNone(kg.get_entity("8863", "form"))
+            self.assertIsNotNone(kg.get_entity("Alex Doesss", "taxpayer"))
+            self.assertTrue(os.path.exists(os.path.join(temp_dir, "kg.json")))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+# Unit tests for metadata facets and filtered retrieval
+
+import sys
+import unittest
+from unittest.mock import MagicMock
+import tempfile
+from pathlib import Path
+
+import chromadb
+
+# Add parent directory to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from core.chunking import Chunk
+from core.facets import FacetIndex, MetadataExtractor, build_where, extract_forms, facets_from_query
+from core.rag import HybridRetriever, VectorDatabaseManager
+
+class TestFacetExtraction(unittest.TestCase):
+    """Test cases for facet extraction"""
+
+    def test_query_facets(self):
+        """Test inferring tax year and forms from a scenario"""
+        filters = facets_from_query(
+            "For tax year 2023, Maria received a Form W-2 and reports her bakery on Schedule C (Form 1040)."
+        )
+
+        # Assertions
+        self.assertEqual(filters["tax_year"], 2023)
+        self.assertEqual(filters["forms"], ["W-2", "Schedule C", "1040"])
+        self.assertEqual(facets_from_query("What is a qualifying child?"), {})
+
+    def test_document_facets_are_inherited(self):
+        """Test that a publication's year and ID carry over to later chunks"""
+        extractor = MetadataExtractor()
+        header = extractor.extract("Publication 17 (2023)\nYour Federal Income Tax", "docs/p17.txt")
+        body = extractor.extract("Partnerships file Form 1065 and give partners a Schedule K-1.", "docs/p17.txt")
+
+        # Assertions
+        self.assertEqual(header["tax_year"], 2023)
+        self.assertEqual(body["tax_year"], 2023)
+        self.assertEqual(body["publication"], "p17")
+        self.assertEqual(body["entity_type"], "partnership")
+        self.assertTrue(body["form_1065"])
+        self.assertTrue(body["form_schedule_k_1"])
+
+    def test_build_where(self):
+        """Test translating filters into a ChromaDB where clause"""
+        where = build_where({"tax_year": 2023, "forms": ["1040", "Schedule C"]})
+        self.assertEqual(where, {"$and": [
+            {"tax_year": 2023},
+            {"$or": [{"form_1040": True}, {"form_schedule_c": True}]}
+        ]})
+        self.assertEqual(build_where({"forms": extract_forms("Form 8829")}), {"form_8829": True})
+
+class TestFacetIndex(unittest.TestCase):
+    """Test cases for FacetIndex class"""
+
+    def setUp(self):
+        """Index a few chunks"""
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = Path(self.temp_dir.name) / "facets.json"
+        self.index = FacetIndex(self.path)
+        self.index.add("a", {"tax_year": 2023, "forms": "1040,Schedule C"})
+        self.index.add("b", {"tax_year": 2023, "forms": "1040"})
+        self.index.add("c", {"tax_year": 2022, "forms": "Schedule C"})
+
+    def tearDown(self):
+        """Clean up after tests"""
+        self.temp_dir.cleanup()
+
+    def test_match(self):
+        """Test AND across facets and OR within a facet"""
+        self.assertEqual(self.index.match({"tax_year": 2023}), {"a", "b"})
+        self.assertEqual(self.index.match({"tax_year": 2023, "forms": ["Schedule C"]}), {"a"})
+        self.assertEqual(self.index.match({"forms": ["1040", "Schedule C"]}), {"a", "b", "c"})
+        self.assertIsNone(self.index.match({}))
+
+    def test_relax(self):
+        """Test that forms are dropped before the tax year when too few chunks match"""
+        filters = self.index.relax({"tax_year": 2023, "forms": ["Schedule C"]}, min_matches=2)
+        self.assertEqual(filters, {"tax_year": 2023})
+
+    def test_reindexing_replaces_entries(self):
+        """Test that upserting a chunk again replaces its old facet values and persists"""
+        self.index.add("a", {"tax_year": 2024, "forms": ""})
+        self.index.save()
+        reloaded = FacetIndex(self.path)
+
+        # Assertions
+        self.assertEqual(reloaded.match({"tax_year": 2023}), {"b"})
+        self.assertEqual(reloaded.match({"tax_year": 2024}), {"a"})
+        self.assertEqual(reloaded.match({"forms": ["Schedule C"]}), {"c"})
+
+class TestFilteredRetrieval(unittest.TestCase):
+    """Test cases for filtered retrieval through HybridRetriever"""
+
+    def setUp(self):
+        """Ingest chunks from two tax years into an in-memory collection"""
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.vector_db = VectorDatabaseManager(db_dir=self.temp_dir.name, collection_name="facet_test")
+        self.vector_db.db_client = chromadb.EphemeralClient()
+        self.vector_db.embed = MagicMock(side_effect=lambda texts: [[1.0, float(len(t) % 7)] for t in texts])
+        chunks = []
+        for year in (2022, 2023):
+            source = f"p17--{year}.txt"
+            for i in range(5):
+                text = f"Chunk {i} about Form 1040 line {i}." if i % 2 else f"Chunk {i} about Schedule C expenses."
+                chunks.append(Chunk(text=text, source=source, start=i * 100, end=i * 100 + 50, index=i))
+        self.vector_db.add_chunks(chunks)
+        self.retriever = HybridRetriever(self.vector_db)
+
+    def tearDown(self):
+        """Clean up after tests"""
+        self.vector_db.db_client.delete_collection("facet_test")
+        self.temp_dir.cleanup()
+
+    def test_exact_search_within_filter(self):
+        """Test that small filtered candidate sets are scored exactly"""
+        results = self.retriever.retrieve("Schedule C", n_results=2, filters={"tax_year": 2023, "forms": ["Schedule C"]})
+
+        # Assertions
+        self.assertEqual(len(results), 2)
+        for result in results:
+            self.assertEqual(result["metadata"]["tax_year"], 2023)
+            self.assertIn("Schedule C", result["metadata"]["forms"])
+
+    def test_ann_search_with_where(self):
+        """Test that large candidate sets are filtered inside the ANN search"""
+        self.retriever.exact_search_threshold = 0
+        self.vector_db.query_ids = MagicMock()
+        results = self.retriever.retrieve("Form 1040", n_results=3, filters={"tax_year": 2022})
+
+        # Assertions
+        self.vector_db.query_ids.assert_not_called()
+        self.assertEqual(len(results), 3)
+        self.assertTrue(all(r["metadata"]["tax_year"] == 2022 for r in results))
+
+    def test_relaxes_unknown_year(self):
+        """Test that a filter matching nothing falls back to the unfiltered search"""
+        results = self.retriever.retrieve("Form 1040", n_results=3, filters={"tax_year": 2019})
+        self.assertEqual(len(results), 3)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+# Unit tests for the sparse-matrix knowledge graph export
+
+import os
+import sys
+import unittest
+import tempfile
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from core.knowledge_graph import TaxEntity, TaxKnowledgeGraph
+
+class TestGraphMatrix(unittest.TestCase):
+    """Test cases for GraphMatrix class"""
+
+    def setUp(self):
+        """Build a small graph"""
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.kg = TaxKnowledgeGraph(save_path=os.path.join(self.temp_dir.name, "kg.json"))
+        form_1040 = TaxEntity("1040", "form")
+        schedule_3 = TaxEntity("Schedule 3", "form")
+        form_8863 = TaxEntity("Form 8863", "form")
+        credit = TaxEntity("American Opportunity Credit", "credit")
+        self.kg.add_relation(form_1040, "feeds", schedule_3)
+        self.kg.add_relation(schedule_3, "feeds", form_8863)
+        self.kg.add_relation(form_8863, "feeds", credit)
+        self.kg.add_relation(form_8863, "limits", credit)
+        self.kg.add_relation(TaxEntity("Jane", "taxpayer"), "files", form_1040)
+
+    def tearDown(self):
+        """Clean up"""
+        self.temp_dir.cleanup()
+
+    def test_export_interns_ids_per_relation(self):
+        """Test that each relation gets its own CSR matrix over interned node IDs"""
+        matrix = self.kg.to_matrix()
+
+        # Assertions
+        self.assertEqual(len(matrix), 5)
+        self.assertEqual(matrix.relations, ["feeds", "files", "limits"])
+        self.assertEqual(matrix.adjacency["feeds"].nnz, 3)
+        self.assertEqual(matrix.adjacency["feeds"][matrix.index["form:1040"], matrix.index["form:Schedule 3"]], 1)
+        self.assertIs(self.kg.to_matrix(), matrix)
+
+        # A change invalidates the cached export
+        self.kg.add_entity(TaxEntity("W-2", "form"))
+        self.assertEqual(len(self.kg.to_matrix()), 6)
+
+    def test_reachability_and_neighbors(self):
+        """Test multi-hop reachability via sparse products"""
+        matrix = self.kg.to_matrix()
+
+        # Assertions
+        self.assertEqual(matrix.neighbors(["form:Schedule 3"], "feeds"), ["form:Form 8863"])
+        self.assertEqual(matrix.neighbors(["form:1040"], direction="in"), ["taxpayer:Jane"])
+        reached = matrix.reachable(["form:1040"], "feeds", max_hops=3)
+        self.assertEqual(reached["credit:American Opportunity Credit"], 3)
+        self.assertNotIn("credit:American Opportunity Credit", matrix.reachable(["form:1040"], "feeds", max_hops=2))
+
+    def test_expand_scores_decay_with_distance(self):
+        """Test that neighbourhood expansion favours closer nodes"""
+        scores = self.kg.to_matrix().expand(["form:Schedule 3"], hops=2)
+
+        # Assertions
+        self.assertEqual(scores["form:Schedule 3"], max(scores.values()))
+        self.assertGreater(scores["form:Form 8863"], scores["credit:American Opportunity Credit"])
+        self.assertGreater(scores["form:1040"], scores["taxpayer:Jane"])
+    def test_personalized_pagerank_is_cached_per_seed_set(self):
+        """Test that PageRank mass concentrates near the seeds and repeats hit the cache"""
+        matrix = self.kg.to_matrix()
+        scores = matrix.personalized_pagerank(["form:Form 8863"])
+        index = matrix.index
+
+        # Assertions
+        self.assertAlmostEqual(float(scores.sum()), 1.0, places=4)
+        self.assertEqual(scores.argmax(), index["form:Form 8863"])
+        self.assertGreater(scores[index["form:Schedule 3"]], scores[index["form:1040"]])
+        self.assertGreater(scores[index["form:1040"]], scores[index["taxpayer:Jane"]])
+        self.assertIs(matrix.personalized_pagerank(["form:Form 8863"]), scores)
+        self.assertFalse(matrix.personalized_pagerank(["missing"]).any())
+
+if __name__ == "__main__":
+    unittest.main()
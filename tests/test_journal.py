@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+# Unit tests for the run journal and resumable processing
+
+import sys
+import unittest
+from unittest.mock import patch, MagicMock
+import tempfile
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from core.journal import RunJournal, content_hash
+from core.rag import Document, generate_answers, process_documents_pipelined
+
+class TestRunJournal(unittest.TestCase):
+    """Test cases for RunJournal class"""
+
+    def setUp(self):
+        """Set up a temporary journal"""
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = Path(self.temp_dir.name) / "journal.db"
+
+    def tearDown(self):
+        """Clean up"""
+        self.temp_dir.cleanup()
+
+    def test_resume_latest_unfinished_run(self):
+        """Test that resuming picks up the unfinished run and its completed units"""
+        journal = RunJournal(self.path, models=["phi4"])
+        journal.record("phi4", "a.txt", "answer", 0, output="A1", input_hash="h0")
+        journal.record("phi4", "a.txt", "answer", 1, error="timeout", input_hash="h1")
+        journal.close()
+
+        resumed = RunJournal(self.path, resume=True)
+        self.assertEqual(resumed.run_id, journal.run_id)
+        self.assertEqual(resumed.get_output("phi4", "a.txt", "answer", 0, input_hash="h0"), "A1")
+        self.assertIsNone(resumed.get_output("phi4", "a.txt", "answer", 1, input_hash="h1"))
+        self.assertEqual(resumed.failures()[0]["question"], 1)
+
+        # Retrying the failed unit counts a second attempt; a complete run is not resumed again
+        resumed.record("phi4", "a.txt", "answer", 1, output="A2", input_hash="h1")
+        self.assertEqual(resumed.summary(), {"answer": {"done": 2}})
+        resumed.finish()
+        resumed.close()
+        fresh = RunJournal(self.path, resume=True)
+        self.assertNotEqual(fresh.run_id, journal.run_id)
+        fresh.close()
+
+    def test_changed_input_is_recomputed(self):
+        """Test that stored output is not reused when the input hash changed"""
+        journal = RunJournal(self.path)
+        journal.record("phi4", "a.txt", "feedback", output="[]", input_hash=content_hash("old"))
+
+        # Assertions
+        self.assertTrue(journal.is_done("phi4", "a.txt", "feedback"))
+        self.assertIsNone(journal.get_output("phi4", "a.txt", "feedback", input_hash=content_hash("new")))
+        journal.close()
+
+class TestResumableProcessing(unittest.TestCase):
+    """Test cases for journaled answering and pipelined processing"""
+
+    def setUp(self):
+        """Set up a temporary journal and document"""
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.journal = RunJournal(Path(self.temp_dir.name) / "journal.db")
+        self.doc = Document(content="Scenario\n\nQuestion 1?\n\nQuestion 2?",
+                            metadata={"source": "s.txt", "filename": "s.txt"})
+        self.asked = []
+
+    def tearDown(self):
+        """Clean up"""
+        self.journal.close()
+        self.temp_dir.cleanup()
+
+    def fake_post(self, url, json, timeout):
+        """Ollama stand-in that fails Question 2 on the first attempt"""
+        question = json["prompt"].split("QUESTION:\n")[1].split("\n")[0]
+        self.asked.append(question)
+        if question == "Question 2?" and self.asked.count(question) == 1:
+            raise ConnectionError("server restarted")
+        response = MagicMock(status_code=200)
+        response.json.return_value = {"response": f"answer to {question}"}
+        return response
+
+    def test_resume_only_reasks_failed_questions(self):
+        """Test that a second attempt reuses completed answers"""
+        with patch("requests.post", side_effect=self.fake_post):
+            first = generate_answers(self.doc, "phi4", max_workers=1, journal=self.journal)
+            second = generate_answers(self.doc, "phi4", max_workers=1, journal=self.journal)
+
+        # Assertions
+        self.assertIn("Error: server restarted", first[1])
+        self.assertEqual(self.asked, ["Question 1?", "Question 2?", "Question 2?"])
+        self.assertEqual(second[0], first[0])
+        self.assertIn("answer to Question 2?", second[1])
+
+    def test_persisted_documents_are_skipped(self):
+        """Test that a resumed pipeline run skips documents it already saved"""
+        other = Document(content="Other\n\nQuestion 1?", metadata={"source": "o.txt", "filename": "o.txt"})
+        self.journal.record("phi4", "s.txt", "persist")
+        answered = []
+
+        with tempfile.TemporaryDirectory() as temp_dir, \
+                patch("core.rag.ROOT_DIR", Path(temp_dir)), \
+                patch("core.shards.open_vector_db", side_effect=RuntimeError("no database")), \
+                patch("core.rag.generate_answers",
+                      side_effect=lambda doc, model, contexts, **kwargs: answered.append(doc.id) or ["answer"]), \
+                patch("core.rag.generate_feedback", return_value=["feedback"]), \
+                patch("core.rag.save_answers", return_value="path"), \
+                patch("core.rag.save_feedback", return_value="path"):
+            metrics = process_documents_pipelined([self.doc, other], ["phi4"], journal=self.journal)
+
+        # Assertions
+        self.assertEqual(answered, [other.id])
+        self.assertEqual(metrics["phi4"]["processed"], 1)
+        self.assertEqual(self.journal.get_output("phi4", "o.txt", "feedback"), '["feedback"]')
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# Unit tests for the staged processing pipeline
+
+import sys
+import time
+import unittest
+from unittest.mock import patch
+import tempfile
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from core.pipeline import Pipeline, Stage
+from core.rag import Document, process_documents_pipelined
+
+class TestPipeline(unittest.TestCase):
+    """Test cases for Pipeline class"""
+
+    def test_stages_overlap(self):
+        """Test that item N+1's first stage overlaps item N's second stage"""
+        def slow(item):
+            time.sleep(0.05)
+            return item
+
+        pipeline = Pipeline([Stage("answer", slow), Stage("feedback", slow)])
+        start = time.time()
+        results = pipeline.run(range(6))
+        elapsed = time.time() - start
+
+        # Assertions: 6 items x 2 stages x 50ms would take 0.6s sequentially
+        self.assertEqual(sorted(results), list(range(6)))
+        self.assertLess(elapsed, 0.5)
+        self.assertEqual(pipeline.report()["feedback"]["processed"], 6)
+        self.assertGreater(pipeline.report()["feedback"]["throughput_per_worker_per_min"], 0)
+
+    def test_errors_are_isolated(self):
+        """Test that a failing item is dropped and counted without stopping the others"""
+        def check(item):
+            if item == 2:
+                raise ValueError("bad document")
+            return item * 10
+
+        pipeline = Pipeline([Stage("check", check, workers=2), Stage("skip_odd", lambda x: None if x % 20 else x)])
+        results = pipeline.run(range(5))
+        report = pipeline.report()
+
+        # Assertions
+        self.assertEqual(sorted(results), [0, 40])
+        self.assertEqual(report["check"]["errors"], 1)
+        self.assertEqual(report["check"]["processed"], 4)
+        self.assertGreaterEqual(report["skip_odd"]["utilization"], 0.0)
+
+    def test_queues_are_bounded(self):
+        """Test that a slow stage holds back the stages before it"""
+        produced = []
+
+        def source():
+            for i in range(10):
+                produced.append(i)
+                yield i
+
+        lag = []
+
+        def slow(item):
+            time.sleep(0.02)
+            lag.append(len(produced) - item)
+            return item
+
+        Pipeline([Stage("fast", lambda x: x), Stage("slow", slow)], queue_size=1).run(source())
+
+        # Assertions: the producer is at most a few items (queues plus in-flight) ahead
+        self.assertLessEqual(max(lag), 5)
+
+class TestDocumentPipeline(unittest.TestCase):
+    """Test cases for process_documents_pipelined"""
+
+    def test_documents_flow_through_all_stages(self):
+        """Test that every document is answered, reviewed and saved per model"""
+        docs = [Document(content=f"Scenario {i}\n\nQuestion 1?", metadata={"source": f"{i}.txt", "filename": f"{i}.txt"})
+                for i in range(3)]
+        docs.append(Document(content="", metadata={"source": "empty.txt", "filename": "empty.txt"}))
+        saved = []
+
+        with tempfile.TemporaryDirectory() as temp_dir, \
+                patch("core.rag.ROOT_DIR", Path(temp_dir)), \
+                patch("core.shards.open_vector_db", side_effect=RuntimeError("no database")), \
+                patch("core.rag.generate_answers", side_effect=lambda doc, model, contexts, **kwargs: [f"{model} answer"]), \
+                patch("core.rag.generate_feedback", side_effect=lambda doc, answers, model: ["feedback"]), \
+                patch("core.rag.save_answers", side_effect=lambda doc, answers, model: saved.append((model, doc.id)) or "path"), \
+                patch("core.rag.save_feedback", return_value="path"):
+            metrics = process_documents_pipelined(docs, ["llama3:8b", "phi4"])
+
+        # Assertions
+        self.assertEqual(len(saved), 6)
+        self.assertEqual(metrics["phi4"]["processed"], 3)
+        self.assertEqual(set(metrics["llama3:8b"]["stages"]), {"load", "retrieve", "answer", "feedback", "persist"})
+        self.assertEqual(metrics["llama3:8b"]["stages"]["persist"]["processed"], 3)
+
+    def test_contexts_are_prefetched_once_for_all_documents(self):
+        """Test that retrieval runs as one batch for the whole run, not per document"""
+        docs = [Document(content=f"Scenario {i}\n\nQuestion 1?", metadata={"source": f"{i}.txt", "filename": f"{i}.txt"})
+                for i in range(3)]
+        received = []
+
+        with tempfile.TemporaryDirectory() as temp_dir, \
+                patch("core.rag.ROOT_DIR", Path(temp_dir)), \
+                patch("core.shards.open_vector_db"), \
+                patch("core.rag.prefetch_contexts",
+                      return_value={f"{i}.txt": [[{"text": f"context {i}"}]] for i in range(3)}) as prefetch, \
+                patch("core.rag.generate_answers",
+                      side_effect=lambda doc, model, contexts, **kwargs: received.append(contexts) or ["answer"]), \
+                patch("core.rag.generate_feedback", return_value=["feedback"]), \
+                patch("core.rag.save_answers", return_value="path"), \
+                patch("core.rag.save_feedback", return_value="path"):
+            process_documents_pipelined(docs, ["llama3:8b", "phi4"])
+
+        # Assertions
+        prefetch.assert_called_once()
+        self.assertEqual(prefetch.call_args[0][0], docs)
+        self.assertEqual(len(received), 6)
+        self.assertIn([[{"text": "context 1"}]], received)
+
+if __name__ == "__main__":
+    unittest.main()
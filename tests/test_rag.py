@@ -7,13 +7,18 @@ import sys
 import unittest
 from unittest.mock import patch, MagicMock
 import tempfile
+import threading
+import time
 from pathlib import Path
 import pandas as pd
 
 # Add parent directory to path
 sys.path.append(str(Path(__file__).parent.parent))
 
-from core.rag import DocumentProcessor, Document, TableData, VectorDatabaseManager
+from core.rag import DocumentProcessor, Document, TableData, VectorDatabaseManager, HybridRetriever, prefetch_contexts, generate_answers, _get_assembler
+from core.models import get_model_parallelism
+from core.rerank import CrossEncoderReranker
+from core.pdf_extraction import PDFExtractor, _table_frame
 
 class TestDocument(unittest.TestCase):
     """Test cases for Document class"""
@@ -65,6 +70,14 @@ class TestTableData(unittest.TestCase):
         self.assertIn("col1", md)
         self.assertIn("col2", md)
     
+    def setUp(self):
+        """Set up a directory for table files"""
+        self.temp_dir = tempfile.TemporaryDirectory()
+    
+    def tearDown(self):
+        """Clean up after tests"""
+        self.temp_dir.cleanup()
+    
     def test_to_dict(self):
         """Test converting table to dict"""
         # Create a table
@@ -78,7 +91,7 @@ class TestTableData(unittest.TestCase):
         )
         
         # Convert to dict
-        data_dict = table.to_dict()
+        data_dict = table.to_dict(self.temp_dir.name)
         
         # Assertions
         self.assertEqual(data_dict["page_num"], 1)
@@ -86,6 +99,40 @@ class TestTableData(unittest.TestCase):
         self.assertEqual(data_dict["context_before"], "Before text")
         self.assertEqual(data_dict["context_after"], "After text")
         self.assertIsInstance(data_dict["content"], dict)
+        self.assertEqual(data_dict["content"]["format"], "arrow")
+        self.assertEqual(data_dict["content"]["rows"], 2)
+        self.assertTrue(os.path.exists(data_dict["content"]["path"]))
+    
+    def test_from_dict_loads_lazily(self):
+        """Test that a stored table is only read when its content is needed"""
+        df = pd.DataFrame({"Filing status": ["Single", "Head of household"], "Amount": [14600, 21900]})
+        data_dict = TableData(content=df, page_num=3, source_file="p501.pdf").to_dict(self.temp_dir.name)
+        
+        table = TableData.from_dict(data_dict)
+        
+        # Assertions
+        self.assertIsNone(table.content)
+        self.assertIn("p501.pdf", table.summary())
+        self.assertIsNone(table.content)
+        self.assertIn("Head of household", table.to_markdown())
+        pd.testing.assert_frame_equal(table.content, df)
+    
+    def test_repeated_tables_are_stored_once(self):
+        """Test that identical tables share one Arrow file"""
+        df = pd.DataFrame({"col1": [1, 2], "col2": ["a", "b"]})
+        first = TableData(content=df, page_num=1, source_file="a.pdf").to_dict(self.temp_dir.name)
+        second = TableData(content=df.copy(), page_num=9, source_file="b.pdf").to_dict(self.temp_dir.name)
+        
+        # Assertions
+        self.assertEqual(first["content"]["path"], second["content"]["path"])
+        self.assertEqual(len(os.listdir(self.temp_dir.name)), 1)
+    
+    def test_from_legacy_dict(self):
+        """Test loading tables stored with DataFrame.to_dict()"""
+        df = pd.DataFrame({"col1": [1, 2], "col2": ["a", "b"]})
+        legacy = {"content": df.to_dict(), "page_num": 1, "source_file": "test.txt"}
+        table = TableData.from_dict(legacy)
+        pd.testing.assert_frame_equal(table.content, df)
 
 class TestDocumentProcessor(unittest.TestCase):
     """Test cases for DocumentProcessor class"""
@@ -126,6 +173,18 @@ class TestDocumentProcessor(unittest.TestCase):
         self.assertIn("tax deductions", documents[0].content.lower())
         self.assertEqual(documents[0].metadata["filename"], "test_scenario.txt")
     
+    def test_load_text_files_in_worker_threads(self):
+        """Test that loading with a thread pool gives the same documents"""
+        for i in range(3):
+            (self.docs_dir / f"extra_{i}.txt").write_text(f"Scenario {i}\n\nQuestion 1?", encoding="utf-8")
+        
+        serial = self.processor.load_text_files()
+        parallel = self.processor.load_text_files(max_workers=2)
+        
+        # Assertions
+        self.assertEqual(len(parallel), 4)
+        self.assertEqual([(d.metadata, d.content) for d in parallel], [(d.metadata, d.content) for d in serial])
+    
     def test_parse_scenario_and_questions(self):
         """Test parsing scenario and questions"""
         # Load document first
@@ -141,5 +200,322 @@ class TestDocumentProcessor(unittest.TestCase):
         self.assertIn("business deduction", result["questions"][0].lower())
         self.assertIn("how much", result["questions"][1].lower())
 
+class TestHybridRetriever(unittest.TestCase):
+    """Test cases for HybridRetriever class"""
+    
+    def setUp(self):
+        """Set up a retriever over a mocked vector database"""
+        self.vector_db = MagicMock()
+        self.vector_db.embed.side_effect = lambda texts: [[float(i)] for i, _ in enumerate(texts)]
+        self.vector_db.query.side_effect = lambda embeddings, n_results: {
+            "ids": [[f"q{int(e[0])}-{j}" for j in range(n_results)] for e in embeddings],
+            "documents": [[f"text {int(e[0])}-{j}" for j in range(n_results)] for e in embeddings],
+            "metadatas": [[{"source": "pub17.txt"} for _ in range(n_results)] for _ in embeddings],
+            "distances": [[0.1 * j for j in range(n_results)] for _ in embeddings],
+        }
+        self.retriever = HybridRetriever(self.vector_db)
+    
+    def test_retrieve_many_single_batch(self):
+        """Test that all queries are embedded and searched in one call each"""
+        results = self.retriever.retrieve_many(["a", "b", "c"], k=2)
+        
+        # Assertions
+        self.vector_db.embed.assert_called_once_with(["a", "b", "c"])
+        self.vector_db.query.assert_called_once()
+        self.assertEqual(len(results), 3)
+        self.assertEqual([r["id"] for r in results[1]], ["q1-0", "q1-1"])
+        self.assertAlmostEqual(results[0][1]["score"], 0.9)
+    
+    def test_retrieve_many_duplicate_queries(self):
+        """Test that repeated queries are only embedded once but keep their position"""
+        results = self.retriever.retrieve_many(["a", "b", "a"], k=1)
+        
+        # Assertions
+        self.vector_db.embed.assert_called_once_with(["a", "b"])
+        self.assertEqual(results[0], results[2])
+        self.assertIsNot(results[0], results[2])
+    
+    def test_retrieve_delegates_to_batch(self):
+        """Test that single-query retrieval uses the batched path"""
+        results = self.retriever.retrieve("a", n_results=3)
+        self.assertEqual(len(results), 3)
+        self.assertEqual(results[0]["text"], "text 0-0")
+    
+    def test_prefetch_contexts(self):
+        """Test prefetching context for every question of several documents"""
+        docs = [
+            Document(content="Scenario A\n\nQuestion 1\n\nQuestion 2", metadata={"source": "a.txt"}),
+            Document(content="Scenario B\n\nQuestion 1", metadata={"source": "b.txt"}),
+        ]
+        contexts = prefetch_contexts(docs, self.retriever, n_results=1)
+        
+        # Assertions
+        self.vector_db.query.assert_called_once()
+        self.assertEqual(len(contexts["a.txt"]), 2)
+        self.assertEqual(len(contexts["b.txt"]), 1)
+        self.assertEqual(contexts["b.txt"][0][0]["id"], "q2-0")
+
+class TestGraphRetrieval(unittest.TestCase):
+    """Test cases for knowledge-graph retrieval fused into HybridRetriever"""
+    
+    def setUp(self):
+        """Set up a small graph and a mocked vector database whose chunks mention it"""
+        from core.knowledge_graph import TaxEntity, TaxKnowledgeGraph
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.kg = TaxKnowledgeGraph(save_path=os.path.join(self.temp_dir.name, "kg.json"))
+        self.kg.add_relation(TaxEntity("Home Office Deduction", "deduction"), "claimed_on", TaxEntity("8829", "form"))
+        self.kg.add_relation(TaxEntity("8829", "form"), "attached_to", TaxEntity("Schedule C", "form"))
+        self.chunks = {
+            "c1": "Use Form 8829 to figure the business use of your home.",
+            "c2": "Report profit or loss from a sole proprietorship on Schedule C.",
+            "c3": "Standard mileage rates for the year.",
+        }
+        self.vector_db = MagicMock()
+        self.vector_db.db_dir = self.temp_dir.name
+        self.vector_db.collection_name = "tax_documents"
+        self.vector_db.embed.side_effect = lambda texts: [[0.0] for _ in texts]
+        self.vector_db.query.side_effect = lambda embeddings, n_results: {
+            "ids": [["c3"] for _ in embeddings], "documents": [[self.chunks["c3"]] for _ in embeddings],
+            "metadatas": [[{}] for _ in embeddings], "distances": [[0.2] for _ in embeddings],
+        }
+        self.vector_db.iter_chunks.side_effect = lambda: iter(self.chunks.items())
+        self.vector_db.get_chunks.side_effect = lambda ids, where=None: {
+            "ids": list(ids), "documents": [self.chunks[i] for i in ids], "metadatas": [{} for _ in ids]}
+    
+    def tearDown(self):
+        """Clean up"""
+        self.temp_dir.cleanup()
+    
+    def test_graph_results_are_fused_with_vector_results(self):
+        """Test that chunks mentioning entities linked to the query join the vector results"""
+        retriever = HybridRetriever(self.vector_db, kg_enabled=True, knowledge_graph=self.kg, graph_weight=0.5)
+        results = retriever.retrieve("Can I take the home office deduction?", n_results=3)
+        
+        # Assertions
+        ids = [r["id"] for r in results]
+        self.assertEqual(set(ids), {"c1", "c2", "c3"})
+        self.assertLess(ids.index("c1"), ids.index("c2"))
+        self.assertGreater(results[ids.index("c1")]["graph_score"], 0)
+        self.assertEqual(results[ids.index("c3")]["vector_score"], 0.8)
+        self.assertTrue(os.path.exists(os.path.join(self.temp_dir.name, "tax_documents_mentions.json")))
+        
+        # Queries naming no entity keep the vector results
+        self.assertEqual([r["id"] for r in retriever.retrieve("mileage rates", n_results=3)], ["c3"])
+
+class TestGenerateAnswers(unittest.TestCase):
+    """Test cases for concurrent answer generation"""
+    
+    def setUp(self):
+        """Create a document with several questions"""
+        self.doc = Document(
+            content="Scenario\n\n" + "\n\n".join(f"Question {i}?" for i in range(1, 7)),
+            metadata={"source": "s.txt", "filename": "s.txt"}
+        )
+        self.in_flight = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+    
+    def fake_post(self, url, json, timeout):
+        """Slow Ollama stand-in that answers with the question number"""
+        with self.lock:
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+        try:
+            time.sleep(0.1)
+            question = json["prompt"].split("QUESTION:\n")[1].split("\n")[0]
+            if question == "Question 3?":
+                raise ConnectionError("slot crashed")
+            response = MagicMock(status_code=200)
+            response.json.return_value = {"response": f"answer to {question}"}
+            return response
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+    
+    def test_questions_run_concurrently_in_order(self):
+        """Test that questions are answered in parallel and reassembled in order"""
+        with patch("requests.post", side_effect=self.fake_post):
+            start = time.time()
+            answers = generate_answers(self.doc, "llama3:8b", max_workers=6)
+            elapsed = time.time() - start
+        
+        # Assertions
+        self.assertEqual(len(answers), 6)
+        self.assertEqual(self.peak, 6)
+        self.assertLess(elapsed, 0.5)
+        for i, answer in enumerate(answers, 1):
+            self.assertTrue(answer.startswith(f"Q{i}: Question {i}?"))
+        self.assertIn("answer to Question 2?", answers[1])
+        self.assertIn("Error: slot crashed", answers[2])
+        self.assertIn("answer to Question 4?", answers[3])
+    
+    def test_context_is_packed_into_the_model_window(self):
+        """Test that retrieved context is cut to the context window and num_ctx is sent"""
+        doc = Document(content="Scenario\n\nQuestion 1?", metadata={"source": "s.txt", "filename": "s.txt"})
+        contexts = [[{"text": f"chunk{i} " + "filler " * 2000, "score": 1.0 - i * 0.1} for i in range(10)]]
+        payloads = []
+        
+        def fake_post(url, json, timeout):
+            payloads.append(json)
+            response = MagicMock(status_code=200)
+            response.json.return_value = {"response": "answer"}
+            return response
+        
+        with patch("requests.post", side_effect=fake_post):
+            generate_answers(doc, "llama3:8b", contexts)
+        
+        # Assertions
+        assembler = _get_assembler("llama3:8b")
+        self.assertEqual(payloads[0]["options"], {"num_ctx": assembler.context_window})
+        self.assertIn("chunk0", payloads[0]["prompt"])
+        self.assertLessEqual(assembler.counter.count(payloads[0]["prompt"]),
+                             assembler.context_window - assembler.reserve_tokens)
+    
+    def test_parallelism_follows_model(self):
+        """Test that concurrency defaults to the model's parallel slots"""
+        with patch.dict(os.environ, {}, clear=False):
+            os.environ.pop("OLLAMA_NUM_PARALLEL", None)
+            self.assertEqual(get_model_parallelism("mixtral:8x7b"), 1)
+            with patch("requests.post", side_effect=self.fake_post):
+                generate_answers(self.doc, "phi4")
+            self.assertEqual(self.peak, 2)
+        with patch.dict(os.environ, {"OLLAMA_NUM_PARALLEL": "3"}):
+            self.assertEqual(get_model_parallelism("mixtral:8x7b"), 3)
+            self.assertEqual(get_model_parallelism("mixtral:8x7b", {"mixtral": 2}), 2)
+
+class TestCrossEncoderReranker(unittest.TestCase):
+    """Test cases for CrossEncoderReranker class"""
+    
+    def setUp(self):
+        """Set up a reranker with a mocked cross-encoder"""
+        self.model = MagicMock()
+        # Score a pair by the number encoded at the end of the chunk text
+        self.model.predict.side_effect = lambda pairs, batch_size: [float(text.split()[-1]) for _, text in pairs]
+        self.candidates = [
+            {"id": f"c{i}", "text": f"chunk {score}", "score": 1.0 - i * 0.1}
+            for i, score in enumerate([1, 5, 3, 9, 7, 2])
+        ]
+    
+    def test_rerank_orders_by_cross_encoder(self):
+        """Test that candidates are reordered by cross-encoder score"""
+        reranker = CrossEncoderReranker(model=self.model, batch_size=4)
+        results = reranker.rerank("query", self.candidates, top_k=3)
+        
+        # Assertions
+        self.assertEqual([r["id"] for r in results], ["c3", "c4", "c1"])
+        self.assertAlmostEqual(results[0]["retrieval_score"], 0.7)
+        self.assertEqual(self.model.predict.call_count, 2)
+    
+    def test_score_threshold_stops_early(self):
+        """Test that scoring stops once enough candidates pass the threshold"""
+        reranker = CrossEncoderReranker(model=self.model, batch_size=2, score_threshold=4.0)
+        results = reranker.rerank("query", self.candidates, top_k=2)
+        
+        # Assertions: the third batch is never scored
+        self.assertEqual(self.model.predict.call_count, 2)
+        self.assertEqual([r["id"] for r in results], ["c3", "c1"])
+    
+    def test_pair_scores_are_cached(self):
+        """Test that repeated (query, chunk) pairs are not rescored"""
+        reranker = CrossEncoderReranker(model=self.model, batch_size=10)
+        reranker.rerank("query", self.candidates, top_k=3)
+        reranker.rerank("query", self.candidates, top_k=3)
+        
+        # Assertions
+        self.assertEqual(self.model.predict.call_count, 1)
+    
+    def test_retriever_reranks_deeper_candidates(self):
+        """Test that the retriever fetches candidate_depth results before reranking"""
+        vector_db = MagicMock()
+        vector_db.embed.return_value = [[0.0]]
+        vector_db.query.return_value = {
+            "ids": [[c["id"] for c in self.candidates]],
+            "documents": [[c["text"] for c in self.candidates]],
+            "metadatas": [[{} for _ in self.candidates]],
+            "distances": [[0.0 for _ in self.candidates]],
+        }
+        reranker = CrossEncoderReranker(model=self.model, candidate_depth=6)
+        retriever = HybridRetriever(vector_db, reranker=reranker)
+        results = retriever.retrieve("query", n_results=2)
+        
+        # Assertions
+        self.assertEqual(vector_db.query.call_args.kwargs["n_results"], 6)
+        self.assertEqual([r["id"] for r in results], ["c3", "c4"])
+
+class TestPDFExtractor(unittest.TestCase):
+    """Test cases for PDFExtractor class"""
+    
+    def setUp(self):
+        """Set up a fake PDF and a cache directory"""
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.pdf_path = os.path.join(self.temp_dir.name, "p501.pdf")
+        with open(self.pdf_path, "wb") as f:
+            f.write(b"%PDF-1.4 fake")
+        self.cache_dir = os.path.join(self.temp_dir.name, "cache")
+    
+    def tearDown(self):
+        """Clean up after tests"""
+        self.temp_dir.cleanup()
+    
+    def test_cached_files_are_not_reparsed(self):
+        """Test that an unchanged PDF is served from the hash-keyed cache"""
+        extractor = PDFExtractor(cache_dir=self.cache_dir, max_workers=1)
+        sha = extractor._file_hash(self.pdf_path)
+        pages = ["Standard deduction\nTable 1", "Page two"]
+        frame = pd.DataFrame({"Filing status": ["Single"], "Amount": ["$14,600"]})
+        extractor._store_cached(sha, pages, extractor._build_tables(self.pdf_path, pages, [(1, frame)]))
+        extractor._save_manifest()
+        
+        with patch("concurrent.futures.ProcessPoolExecutor") as pool:
+            docs = PDFExtractor(cache_dir=self.cache_dir).extract([self.pdf_path])
+            pool.assert_not_called()
+        
+        # Assertions
+        self.assertEqual(len(docs), 1)
+        self.assertEqual(docs[0].metadata["pages"], 2)
+        self.assertEqual(docs[0].tables[0].section_title, "Standard deduction")
+        self.assertEqual(docs[0].tables[0].load_content().iloc[0]["Amount"], "$14,600")
+    
+    def test_changed_file_gets_new_hash(self):
+        """Test that modifying a PDF invalidates its cache key"""
+        extractor = PDFExtractor(cache_dir=self.cache_dir)
+        before = extractor._file_hash(self.pdf_path)
+        with open(self.pdf_path, "ab") as f:
+            f.write(b" changed")
+        self.assertNotEqual(before, extractor._file_hash(self.pdf_path))
+    
+    def test_tabula_json_tables_become_frames(self):
+        """Test converting a table from tabula's JSON output, blank rows dropped"""
+        raw = {"page_number": 3, "data": [
+            [{"text": "Filing status"}, {"text": "Amount"}],
+            [{"text": ""}, {"text": " "}],
+            [{"text": "Single"}, {"text": "$14,600"}],
+        ]}
+        frame = _table_frame(raw)
+        
+        # Assertions
+        self.assertEqual(list(frame.columns), ["Filing status", "Amount"])
+        self.assertEqual(frame.iloc[0]["Amount"], "$14,600")
+        self.assertEqual(len(frame), 1)
+        self.assertTrue(_table_frame({"data": []}).empty)
+    
+    def test_tables_with_blank_and_repeated_headers_are_cached(self):
+        """Test that blank or repeated header cells get unique names that survive the cache write"""
+        raw = {"page_number": 1, "data": [
+            [{"text": ""}, {"text": ""}, {"text": "Amount"}, {"text": "Amount"}],
+            [{"text": "Single"}, {"text": "Under 65"}, {"text": "$14,600"}, {"text": "$16,550"}],
+        ]}
+        frame = _table_frame(raw)
+        self.assertEqual(list(frame.columns), ["col_0", "col_1", "Amount", "Amount_1"])
+        
+        extractor = PDFExtractor(cache_dir=self.cache_dir, max_workers=1)
+        sha = extractor._file_hash(self.pdf_path)
+        pages = ["Standard deduction"]
+        extractor._store_cached(sha, pages, extractor._build_tables(self.pdf_path, pages, [(1, frame)]))
+        doc = extractor._load_cached(self.pdf_path, sha)
+        
+        # Assertions
+        self.assertEqual(doc.tables[0].load_content().iloc[0]["Amount_1"], "$16,550")
+
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
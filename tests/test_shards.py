@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+# Unit tests for sharded vector collections
+
+import sys
+import unittest
+from unittest.mock import MagicMock
+import tempfile
+from pathlib import Path
+
+import chromadb
+
+# Add parent directory to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from core.chunking import Chunk
+from core.rag import HybridRetriever
+from core.shards import ShardedVectorDatabase, open_vector_db
+
+def make_chunks(year, count=4, prefix="Wages"):
+    """Chunks of one publication year"""
+    source = f"p17--{year}.txt"
+    return [Chunk(text=f"{prefix} {year} part {i} reported on Form 1040.", source=source,
+                  start=i * 100, end=i * 100 + 40, index=i) for i in range(count)]
+
+def embed(texts):
+    """Deterministic two-dimensional embeddings"""
+    return [[1.0, float(sum(map(ord, t)) % 13)] for t in texts]
+
+class TestShardedVectorDatabase(unittest.TestCase):
+    """Test cases for ShardedVectorDatabase class"""
+
+    def setUp(self):
+        """Create a sharded database over an in-memory ChromaDB client"""
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.client = chromadb.EphemeralClient()
+        self.db = self.open()
+        self.db.add_chunks(make_chunks(2022) + make_chunks(2023) + [
+            Chunk(text="General filing guidance without a year.", source="notes.txt", start=0, end=39, index=0)
+        ])
+
+    def tearDown(self):
+        """Clean up after tests"""
+        for collection in self.client.list_collections():
+            self.client.delete_collection(getattr(collection, "name", collection))
+        self.temp_dir.cleanup()
+
+    def open(self):
+        """Open the database directory with the shared client and a fake embedder"""
+        db = ShardedVectorDatabase(db_dir=self.temp_dir.name, shard_by="tax_year")
+        db.base.db_client = self.client
+        db.base.embed = MagicMock(side_effect=embed)
+        return db
+
+    def test_chunks_are_sharded_by_year(self):
+        """Test that chunks land in per-year shards and a general shard"""
+        self.assertEqual(self.db.shards(), ["2022", "2023", "general"])
+        self.assertEqual(self.db.get_shard("2023").get_collection().count(), 4)
+        self.assertEqual(self.db.registry["shards"]["general"]["count"], 1)
+        self.assertTrue(ShardedVectorDatabase.exists(self.temp_dir.name))
+
+    def test_router_queries_only_relevant_shards(self):
+        """Test that a tax year filter searches that year's shard and the general shard"""
+        self.assertEqual(self.db.route({"tax_year": 2023}), ["2023", "general"])
+        self.assertEqual(self.db.route({"tax_year": 2019}), ["2022", "2023", "general"])
+        self.assertEqual(self.db.route({}), ["2022", "2023", "general"])
+
+        shard_2022 = self.db.get_shard("2022")
+        shard_2022.search = MagicMock()
+        results = HybridRetriever(self.db).retrieve("Form 1040 wages", n_results=3, filters={"tax_year": 2023})
+
+        # Assertions
+        shard_2022.search.assert_not_called()
+        self.assertEqual(len(results), 3)
+        self.assertTrue(all(r["metadata"]["tax_year"] in (2023, 0) for r in results))
+
+    def test_fan_out_merges_top_k(self):
+        """Test that an unfiltered query merges all shards by distance"""
+        query = embed(["Form 1040 wages"])
+        merged = self.db.query(query, n_results=5)
+
+        # Assertions
+        self.assertEqual(len(merged["ids"][0]), 5)
+        self.assertEqual(merged["distances"][0], sorted(merged["distances"][0]))
+        self.assertEqual({m["tax_year"] for m in merged["metadatas"][0]} - {0, 2022, 2023}, set())
+
+    def test_rebuild_swaps_one_shard(self):
+        """Test that rebuilding a shard replaces only that shard's collection"""
+        old_collection = self.db.registry["shards"]["2023"]["collection"]
+        untouched = dict(self.db.registry["shards"]["2022"])
+
+        self.db.build_shard("2023", make_chunks(2023, count=2, prefix="Revised"))
+        reopened = self.open()
+
+        # Assertions
+        self.assertNotEqual(reopened.registry["shards"]["2023"]["collection"], old_collection)
+        self.assertEqual(reopened.registry["shards"]["2022"], untouched)
+        self.assertEqual(reopened.get_shard("2023").get_collection().count(), 2)
+        names = [getattr(c, "name", c) for c in self.client.list_collections()]
+        self.assertNotIn(old_collection, names)
+
+    def test_failed_rebuild_keeps_live_shard(self):
+        """Test that a failing rebuild leaves the live shard in place"""
+        live = self.db.registry["shards"]["2023"]["collection"]
+
+        def failing_chunks():
+            yield from make_chunks(2023, count=1)
+            raise RuntimeError("source unavailable")
+
+        with self.assertRaises(RuntimeError):
+            self.db.build_shard("2023", failing_chunks(), batch_size=1)
+
+        # Assertions
+        self.assertEqual(self.open().registry["shards"]["2023"]["collection"], live)
+        self.assertEqual(len(self.client.list_collections()), 3)
+
+    def test_rebuild_skips_chunks_of_another_shard(self):
+        """Test that a rebuild fed another year's chunks stores only its own"""
+        stored = self.db.build_shard("2023", make_chunks(2023, count=2) + make_chunks(2022, count=1))
+
+        # Assertions
+        self.assertEqual(stored, 2)
+        self.assertEqual(self.db.get_shard("2023").get_collection().count(), 2)
+        self.assertEqual(self.db.get_shard("2022").get_collection().count(), 4)
+
+    def test_year_found_after_the_first_chunk_applies_to_the_whole_file(self):
+        """Test that a file's opening chunks follow the year named later in it"""
+        chunks = [Chunk(text=text, source="pubs/p501.txt", start=i * 100, end=i * 100 + len(text), index=i)
+                  for i, text in enumerate(["Contents. Dependents and filing information.",
+                                            "This publication covers tax year 2024 rules.",
+                                            "Standard deduction amounts by filing status."])]
+
+        stored = self.db.build_shard("2024", chunks)
+        self.db.add_chunks([Chunk(text="Cover page", source="pubs/p596.txt", start=0, end=10, index=0),
+                            Chunk(text="Credits for tax year 2024.", source="pubs/p596.txt", start=10, end=36, index=1)])
+
+        # Assertions
+        self.assertEqual(stored, 3)
+        self.assertEqual(self.db.get_shard("2024").get_collection().count(), 5)
+        self.assertEqual(self.db.registry["shards"]["general"]["count"], 1)
+
+    def test_open_vector_db(self):
+        """Test that the sharded database is opened when a registry exists"""
+        self.assertIsInstance(open_vector_db(self.temp_dir.name), ShardedVectorDatabase)
+        with tempfile.TemporaryDirectory() as empty_dir:
+            self.assertNotIsInstance(open_vector_db(empty_dir), ShardedVectorDatabase)
+
+if __name__ == "__main__":
+    unittest.main()
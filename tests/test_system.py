@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+# Unit tests for cgroup-aware resource detection
+
+import os
+import sys
+import unittest
+from unittest.mock import patch
+import tempfile
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from utils.system import (get_available_cpus, get_available_memory, get_cgroup_limits,
+                          get_embedding_batch_size, get_optimal_worker_count, parse_cpuset)
+
+GB = 1024 ** 3
+
+class TestCgroupLimits(unittest.TestCase):
+    """Test cases for cgroup v1/v2 detection"""
+
+    def setUp(self):
+        """Set up an empty fake cgroup mount"""
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.root = Path(self.temp_dir.name)
+
+    def tearDown(self):
+        """Clean up"""
+        self.temp_dir.cleanup()
+
+    def write(self, relative: str, content: str) -> None:
+        path = self.root / relative
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(content + "\n")
+
+    def test_parse_cpuset(self):
+        """Test counting CPUs in cpuset lists"""
+        self.assertEqual(parse_cpuset("0-3,8,10-11"), 7)
+        self.assertEqual(parse_cpuset("5"), 1)
+
+    def test_cgroup_v2(self):
+        """Test reading quota, cpuset and memory limit from the unified hierarchy"""
+        self.write("cgroup.controllers", "cpuset cpu memory")
+        self.write("cpu.max", "150000 100000")
+        self.write("cpuset.cpus.effective", "0-3")
+        self.write("memory.max", str(4 * GB))
+        self.write("memory.current", str(1 * GB))
+
+        with patch("utils.system._cgroup_v2_dir", side_effect=lambda root: root):
+            limits = get_cgroup_limits(str(self.root))
+
+        # Assertions
+        self.assertEqual(limits["version"], 2)
+        self.assertEqual(limits["cpu_quota"], 1.5)
+        self.assertEqual(limits["cpuset_cpus"], 4)
+        self.assertEqual(limits["memory_limit"], 4 * GB)
+        self.assertEqual(get_available_cpus(limits), min(1.5, float(len(os.sched_getaffinity(0)))))
+        self.assertLessEqual(get_available_memory(limits), 3 * GB)
+
+    def test_cgroup_v2_unlimited(self):
+        """Test that "max" means no limit"""
+        self.write("cgroup.controllers", "cpu memory")
+        self.write("cpu.max", "max 100000")
+        self.write("memory.max", "max")
+
+        with patch("utils.system._cgroup_v2_dir", side_effect=lambda root: root):
+            limits = get_cgroup_limits(str(self.root))
+
+        # Assertions
+        self.assertEqual(limits["version"], 2)
+        self.assertIsNone(limits["cpu_quota"])
+        self.assertIsNone(limits["memory_limit"])
+
+    def test_cgroup_v1(self):
+        """Test reading CFS quota, cpuset and memory limit from v1 controllers"""
+        self.write("cpu/cpu.cfs_quota_us", "200000")
+        self.write("cpu/cpu.cfs_period_us", "100000")
+        self.write("cpuset/cpuset.cpus", "0-7")
+        self.write("memory/memory.limit_in_bytes", str(2 * GB))
+
+        with patch("psutil.virtual_memory") as vm:
+            vm.return_value.total = 64 * GB
+            limits = get_cgroup_limits(str(self.root))
+
+        # Assertions
+        self.assertEqual(limits["version"], 1)
+        self.assertEqual(limits["cpu_quota"], 2.0)
+        self.assertEqual(limits["cpuset_cpus"], 8)
+        self.assertEqual(limits["memory_limit"], 2 * GB)
+
+    def test_cgroup_v1_no_quota(self):
+        """Test that a -1 quota and a page-counter maximum mean no limit"""
+        self.write("cpu/cpu.cfs_quota_us", "-1")
+        self.write("cpu/cpu.cfs_period_us", "100000")
+        self.write("memory/memory.limit_in_bytes", "9223372036854771712")
+
+        limits = get_cgroup_limits(str(self.root))
+
+        # Assertions
+        self.assertIsNone(limits["cpu_quota"])
+        self.assertIsNone(limits["memory_limit"])
+
+    def test_no_cgroup(self):
+        """Test that a missing cgroup mount yields no limits"""
+        self.assertIsNone(get_cgroup_limits(str(self.root / "missing"))["version"])
+
+class TestResourceSizing(unittest.TestCase):
+    """Test cases for worker count and batch size sizing"""
+
+    def test_worker_count_follows_cpu_quota(self):
+        """Test that a container quota caps the worker count below the host's cores"""
+        limits = {"version": 2, "cpu_quota": 2.5, "cpuset_cpus": None, "memory_limit": 8 * GB, "memory_usage": 0}
+        with patch("utils.system.get_cgroup_limits", return_value=limits), \
+                patch("psutil.cpu_count", return_value=32), \
+                patch("os.sched_getaffinity", return_value=set(range(32)), create=True):
+            self.assertEqual(get_optimal_worker_count(), 2)
+
+    def test_worker_count_without_limits(self):
+        """Test that an unconstrained host keeps two cores free"""
+        limits = {"version": None, "cpu_quota": None, "cpuset_cpus": None, "memory_limit": None, "memory_usage": None}
+        with patch("utils.system.get_cgroup_limits", return_value=limits), \
+                patch("psutil.cpu_count", return_value=16), \
+                patch("os.sched_getaffinity", return_value=set(range(16)), create=True), \
+                patch("os.path.exists", return_value=False):
+            self.assertEqual(get_optimal_worker_count(), 14)
+
+    def test_embedding_batch_size_follows_memory_limit(self):
+        """Test that small memory limits shrink the embedding batch"""
+        with patch("utils.system.get_memory_limit", return_value=2 * GB):
+            self.assertEqual(get_embedding_batch_size(), 8)
+        with patch("utils.system.get_memory_limit", return_value=32 * GB):
+            self.assertEqual(get_embedding_batch_size(), 32)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+# Unit tests for the shared bulk work queue
+
+import sys
+import time
+import unittest
+from unittest.mock import patch
+import tempfile
+import threading
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from apps.bulk.workqueue import QueueWorker, WorkQueue
+
+class TestWorkQueue(unittest.TestCase):
+    """Test cases for WorkQueue class"""
+
+    def setUp(self):
+        """Set up a temporary queue"""
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = Path(self.temp_dir.name) / "queue.db"
+        self.queue = WorkQueue(self.path, lease_seconds=60, max_attempts=2)
+
+    def tearDown(self):
+        """Clean up"""
+        self.queue.close()
+        self.temp_dir.cleanup()
+
+    def test_enqueue_is_idempotent(self):
+        """Test that re-enqueueing the same run adds nothing"""
+        self.assertEqual(self.queue.enqueue_all(["a.txt", "b.txt"], ["phi4"]), 2)
+        self.assertEqual(self.queue.enqueue_all(["a.txt", "b.txt"], ["phi4"]), 0)
+        self.assertEqual(self.queue.counts(), {"pending": 2})
+
+    def test_concurrent_claims_are_exclusive(self):
+        """Test that workers on separate connections never lease the same task"""
+        self.queue.enqueue_all([f"{i}.txt" for i in range(20)], ["phi4"])
+        claimed = []
+
+        def work(name):
+            queue = WorkQueue(self.path)
+            while (task := queue.claim(name)) is not None:
+                claimed.append(task.id)
+            queue.close()
+
+        threads = [threading.Thread(target=work, args=(f"w{i}",)) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # Assertions
+        self.assertEqual(sorted(claimed), list(range(1, 21)))
+
+    def test_expired_lease_is_reclaimed(self):
+        """Test that a task whose worker stopped heartbeating goes to another worker"""
+        self.queue.enqueue("a.txt", "phi4")
+        self.queue.lease_seconds = 0.01
+        lost = self.queue.claim("crashed")
+        time.sleep(0.05)
+        self.queue.lease_seconds = 60
+
+        task = self.queue.claim("healthy")
+
+        # Assertions
+        self.assertEqual(task.id, lost.id)
+        self.assertEqual(task.attempts, 2)
+        self.assertFalse(self.queue.heartbeat(lost, "crashed"))
+        self.queue.complete(lost, "crashed", ["stale"])
+        self.assertEqual(self.queue.counts(), {"leased": 1})
+
+    def test_completion_enqueues_next_stage_and_failures_retry(self):
+        """Test stage chaining and the attempt limit"""
+        self.queue.enqueue("a.txt", "phi4")
+        task = self.queue.claim("w")
+        self.queue.complete(task, "w", ["A1"])
+        feedback = self.queue.claim("w")
+        self.assertEqual(feedback.stage, "feedback")
+        self.assertEqual(self.queue.result("a.txt", "phi4", "answer"), ["A1"])
+
+        self.queue.fail(feedback, "w", "timeout")
+        retry = self.queue.claim("w")
+        self.queue.fail(retry, "w", "timeout")
+
+        # Assertions
+        self.assertIsNone(self.queue.claim("w"))
+        self.assertEqual(self.queue.counts(), {"done": 1, "failed": 1})
+
+class TestQueueWorker(unittest.TestCase):
+    """Test cases for QueueWorker class"""
+
+    def test_worker_drains_queue(self):
+        """Test that a worker answers, reviews and saves every queued document"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            doc_path = Path(temp_dir) / "s.txt"
+            doc_path.write_text("Scenario\n\nQuestion 1?", encoding="utf-8")
+            queue = WorkQueue(Path(temp_dir) / "queue.db")
+            queue.enqueue_all([str(doc_path)], ["phi4", "llama3:8b"])
+            saved = []
+
+            with patch("apps.bulk.workqueue.generate_answers_with_errors",
+                       side_effect=lambda doc, model, contexts, **kwargs: ([f"{model} answer"], [None])), \
+                    patch("apps.bulk.workqueue.generate_feedback_with_errors",
+                          side_effect=lambda doc, answers, model: (answers, None)), \
+                    patch("apps.bulk.workqueue.save_answers", return_value="path"), \
+                    patch("apps.bulk.workqueue.save_feedback", side_effect=lambda doc, feedback, model: saved.append(feedback) or "path"), \
+                    patch.object(QueueWorker, "_contexts", return_value=None):
+                stats = QueueWorker(queue, worker_id="test").run()
+            counts = queue.counts()
+            queue.close()
+
+        # Assertions
+        self.assertEqual(stats["done"], 4)
+        self.assertEqual(counts, {"done": 4})
+        self.assertIn(["phi4 answer"], saved)
+
+    def test_error_answers_fail_the_task(self):
+        """Test that failed model requests are retried rather than completed"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            doc_path = Path(temp_dir) / "s.txt"
+            doc_path.write_text("Scenario\n\nQuestion 1?\n\nQuestion 2?", encoding="utf-8")
+            queue = WorkQueue(Path(temp_dir) / "queue.db", max_attempts=2)
+            queue.enqueue_all([str(doc_path)], ["phi4"])
+
+            with patch("requests.post", side_effect=TimeoutError("request timed out")), \
+                    patch("apps.bulk.workqueue.save_answers", return_value="path") as save_answers, \
+                    patch.object(QueueWorker, "_contexts", return_value=None):
+                stats = QueueWorker(queue, worker_id="test", poll_interval=0).run()
+            counts = queue.counts()
+            queue.close()
+
+        # Assertions
+        self.assertEqual(stats["failed"], 2)
+        self.assertEqual(counts, {"failed": 1})
+        save_answers.assert_not_called()
+
+    def test_failed_feedback_is_retried(self):
+        """Test that a feedback stage whose request fails is not completed"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            doc_path = Path(temp_dir) / "s.txt"
+            doc_path.write_text("Scenario\n\nQuestion 1?", encoding="utf-8")
+            queue = WorkQueue(Path(temp_dir) / "queue.db", max_attempts=1)
+            queue.enqueue(str(doc_path), "phi4", "feedback")
+            queue._conn.execute(
+                "INSERT INTO tasks (document, model, stage, status, result, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (str(doc_path), "phi4", "answer", "done", '["Q1: Question 1?\\n\\nA1: answer\\n"]', time.time()))
+
+            with patch("requests.post", side_effect=TimeoutError("request timed out")), \
+                    patch("apps.bulk.workqueue.save_feedback", return_value="path") as save_feedback:
+                stats = QueueWorker(queue, worker_id="test", poll_interval=0).run()
+            counts = queue.counts()
+            queue.close()
+
+        # Assertions
+        self.assertEqual(stats["failed"], 1)
+        self.assertEqual(counts, {"done": 1, "failed": 1})
+        save_feedback.assert_not_called()
+
+if __name__ == "__main__":
+    unittest.main()
@@ -199,9 +199,9 @@ class MemoryOptimizer:
             "quantization": None
         }
         
-        # Check available memory
-        vm = psutil.virtual_memory()
-        available_gb = vm.available / (1024 ** 3)
+        # Check available memory, counting against the container's cgroup limit if there is one
+        from utils.system import get_available_memory
+        available_gb = get_available_memory() / (1024 ** 3)
         
         # Check for GPU
         has_gpu = False
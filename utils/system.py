@@ -31,7 +31,10 @@ def get_system_info() -> Dict[str, Union[str, int, float]]:
         "total_cores": psutil.cpu_count(logical=True),
         "total_memory": round(psutil.virtual_memory().total / (1024**3), 2),  # GB
         "available_memory": round(psutil.virtual_memory().available / (1024**3), 2),  # GB
-        "gpu_info": get_gpu_info()
+        "gpu_info": get_gpu_info(),
+        "cgroup": get_cgroup_limits(),
+        "available_cpus": get_available_cpus(),
+        "memory_limit": round(get_memory_limit() / (1024**3), 2)  # GB
     }
     return info
 
@@ -129,25 +132,154 @@ def clean_memory(model_name: Optional[str] = None) -> bool:
     
     return True
 
+CGROUP_ROOT = "/sys/fs/cgroup"
+
+def _read_cgroup_file(path: str) -> Optional[str]:
+    """Read a cgroup control file, or None if it does not exist"""
+    try:
+        with open(path, "r") as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+def parse_cpuset(spec: str) -> int:
+    """Count the CPUs in a cpuset list such as ``0-3,8,10-11``"""
+    count = 0
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            start, end = part.split("-", 1)
+            count += int(end) - int(start) + 1
+        else:
+            count += 1
+    return count
+
+def _cgroup_v2_dir(root: str) -> str:
+    """Directory of this process's cgroup v2 group (the namespace root inside containers)"""
+    membership = _read_cgroup_file("/proc/self/cgroup") or ""
+    for line in membership.splitlines():
+        if line.startswith("0::"):
+            path = os.path.join(root, line[3:].lstrip("/"))
+            if os.path.exists(os.path.join(path, "cpu.max")) or os.path.exists(os.path.join(path, "memory.max")):
+                return path
+    return root
+
+def get_cgroup_limits(root: str = CGROUP_ROOT) -> Dict[str, Optional[Union[int, float]]]:
+    """Read the CPU quota, cpuset and memory limit of this process's cgroup.
+    
+    Supports cgroup v2 (unified hierarchy) and v1. Limits that are not set
+    are returned as None.
+    
+    Returns:
+        Dictionary with ``version``, ``cpu_quota`` (CPUs, may be fractional),
+        ``cpuset_cpus``, ``memory_limit`` and ``memory_usage`` (bytes)
+    """
+    limits = {"version": None, "cpu_quota": None, "cpuset_cpus": None,
+              "memory_limit": None, "memory_usage": None}
+    
+    if os.path.exists(os.path.join(root, "cgroup.controllers")):
+        limits["version"] = 2
+        group = _cgroup_v2_dir(root)
+        cpu_max = _read_cgroup_file(os.path.join(group, "cpu.max"))
+        if cpu_max:
+            quota, _, period = cpu_max.partition(" ")
+            if quota != "max" and period:
+                limits["cpu_quota"] = int(quota) / int(period)
+        cpuset = _read_cgroup_file(os.path.join(group, "cpuset.cpus.effective"))
+        memory_max = _read_cgroup_file(os.path.join(group, "memory.max"))
+        if memory_max and memory_max != "max":
+            limits["memory_limit"] = int(memory_max)
+        memory_current = _read_cgroup_file(os.path.join(group, "memory.current"))
+    elif os.path.isdir(os.path.join(root, "cpu")) or os.path.isdir(os.path.join(root, "memory")):
+        limits["version"] = 1
+        quota = _read_cgroup_file(os.path.join(root, "cpu", "cpu.cfs_quota_us"))
+        period = _read_cgroup_file(os.path.join(root, "cpu", "cpu.cfs_period_us"))
+        if quota and period and int(quota) > 0:
+            limits["cpu_quota"] = int(quota) / int(period)
+        cpuset = _read_cgroup_file(os.path.join(root, "cpuset", "cpuset.effective_cpus")) or \
+            _read_cgroup_file(os.path.join(root, "cpuset", "cpuset.cpus"))
+        memory_max = _read_cgroup_file(os.path.join(root, "memory", "memory.limit_in_bytes"))
+        # v1 reports "no limit" as a huge page-aligned number
+        if memory_max and int(memory_max) < psutil.virtual_memory().total:
+            limits["memory_limit"] = int(memory_max)
+        memory_current = _read_cgroup_file(os.path.join(root, "memory", "memory.usage_in_bytes"))
+    else:
+        return limits
+    
+    if cpuset:
+        limits["cpuset_cpus"] = parse_cpuset(cpuset)
+    if memory_current:
+        limits["memory_usage"] = int(memory_current)
+    return limits
+
+def get_available_cpus(limits: Optional[Dict] = None) -> float:
+    """CPUs this process may actually use: the least of the host CPUs, CPU
+    affinity, cgroup cpuset and cgroup CPU quota."""
+    limits = limits if limits is not None else get_cgroup_limits()
+    candidates = [float(psutil.cpu_count(logical=True) or 1)]
+    if hasattr(os, "sched_getaffinity"):
+        candidates.append(float(len(os.sched_getaffinity(0))))
+    if limits.get("cpuset_cpus"):
+        candidates.append(float(limits["cpuset_cpus"]))
+    if limits.get("cpu_quota"):
+        candidates.append(limits["cpu_quota"])
+    return max(min(candidates), 0.01)
+
+def get_memory_limit(limits: Optional[Dict] = None) -> int:
+    """Memory this process may use in bytes (cgroup limit or host total)"""
+    limits = limits if limits is not None else get_cgroup_limits()
+    total = psutil.virtual_memory().total
+    return min(total, limits["memory_limit"]) if limits.get("memory_limit") else total
+
+def get_available_memory(limits: Optional[Dict] = None) -> int:
+    """Memory still available in bytes, counting usage against the cgroup limit"""
+    limits = limits if limits is not None else get_cgroup_limits()
+    available = psutil.virtual_memory().available
+    if limits.get("memory_limit"):
+        available = min(available, max(0, limits["memory_limit"] - (limits.get("memory_usage") or 0)))
+    return available
+
 def get_optimal_worker_count() -> int:
-    """Determine optimal number of worker processes based on system resources."""
-    cpu_count = psutil.cpu_count(logical=False) or 1
+    """Determine optimal number of worker processes based on system resources.
+    
+    Inside a container the cgroup CPU quota and cpuset are the budget, so
+    workers are sized to them; on a host a couple of cores are left free.
+    """
+    limits = get_cgroup_limits()
+    cpus = get_available_cpus(limits)
+    physical = psutil.cpu_count(logical=False) or 1
+    
+    if cpus < physical:
+        # Constrained by quota, cpuset or affinity: running more workers only gets them throttled
+        return max(1, int(cpus))
     
     # Check if we're running in a Docker container
-    in_docker = os.path.exists('/.dockerenv')
+    in_docker = os.path.exists('/.dockerenv') or limits.get("memory_limit") is not None
     
     if in_docker:
         # In Docker, be more conservative
-        return max(1, cpu_count - 1)
+        return max(1, physical - 1)
     else:
         # Reserve at least 2 cores for system
-        return max(1, cpu_count - 2)
+        return max(1, physical - 2)
+
+def get_embedding_batch_size(default: int = 32) -> int:
+    """Embedding batch size that fits the memory limit (never above ``default``)"""
+    memory_gb = get_memory_limit() / (1024 ** 3)
+    if memory_gb < 4:
+        return min(default, 8)
+    if memory_gb < 8:
+        return min(default, 16)
+    return default
 
 if __name__ == "__main__":
     # Display system information when run directly
     info = get_system_info()
     print(json.dumps(info, indent=2))
     print(f"Optimal worker count: {get_optimal_worker_count()}")
+    print(f"Embedding batch size: {get_embedding_batch_size()}")
     
     # Test GPU optimization
     optimize_gpu_settings()